@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import sys
+import time
+
+from headers import IPv4Header, UDPHeader, TCPHeader, \
+        IPv4HeaderView, TCPHeaderView
+
+from test_header_codecs import random_ipv4_header, random_udp_header, \
+        random_tcp_header
+
+SEED = 460
+NUM_HEADERS = 1000
+
+def ops_per_sec(func, items, number: int) -> float:
+    '''
+    Call func on every item in items, number times over, and return the
+    number of calls per second.
+    '''
+
+    start = time.perf_counter()
+    for i in range(number):
+        for item in items:
+            func(item)
+    elapsed = time.perf_counter() - start
+    return number * len(items) / elapsed
+
+def benchmarks(rng: random.Random) -> list[tuple[str, callable, list]]:
+    ipv4_hdrs = [random_ipv4_header(rng) for i in range(NUM_HEADERS)]
+    udp_hdrs = [random_udp_header(rng) for i in range(NUM_HEADERS)]
+    tcp_hdrs = [random_tcp_header(rng) for i in range(NUM_HEADERS)]
+    tcp_plain_hdrs = [TCPHeader(h.sport, h.dport, h.seq, h.ack, h.flags,
+        h.checksum, h.window) for h in tcp_hdrs]
+
+    ipv4_bytes = [h.to_bytes() for h in ipv4_hdrs]
+    udp_bytes = [h.to_bytes() for h in udp_hdrs]
+    tcp_bytes = [h.to_bytes() for h in tcp_hdrs]
+    tcp_plain_bytes = [h.to_bytes() for h in tcp_plain_hdrs]
+
+    def tcp_view_fields(b):
+        hdr = TCPHeaderView(b)
+        return hdr.flags, hdr.seq, hdr.ack
+
+    return [
+        ('IPv4Header.from_bytes', IPv4Header.from_bytes, ipv4_bytes),
+        ('IPv4Header.to_bytes', IPv4Header.to_bytes, ipv4_hdrs),
+        ('IPv4HeaderView.protocol', lambda b: IPv4HeaderView(b).protocol,
+            ipv4_bytes),
+        ('UDPHeader.from_bytes', UDPHeader.from_bytes, udp_bytes),
+        ('UDPHeader.to_bytes', UDPHeader.to_bytes, udp_hdrs),
+        ('TCPHeader.from_bytes', TCPHeader.from_bytes, tcp_plain_bytes),
+        ('TCPHeader.to_bytes', TCPHeader.to_bytes, tcp_plain_hdrs),
+        ('TCPHeader.from_bytes (options)', TCPHeader.from_bytes, tcp_bytes),
+        ('TCPHeader.to_bytes (options)', TCPHeader.to_bytes, tcp_hdrs),
+        ('TCPHeaderView flags/seq/ack', tcp_view_fields, tcp_plain_bytes),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Measure header parse/serialize throughput')
+    parser.add_argument('--number', '-n',
+            action='store', type=int, default=20,
+            help='Number of passes over %d random headers' % NUM_HEADERS)
+    parser.add_argument('--min-ops',
+            action='store', type=float, default=0,
+            help='Exit with non-zero status if any benchmark is slower ' + \
+                    'than this many operations/sec')
+    args = parser.parse_args(sys.argv[1:])
+
+    failed = False
+    for name, func, items in benchmarks(random.Random(SEED)):
+        ops = ops_per_sec(func, items, args.number)
+        if ops < args.min_ops:
+            failed = True
+            flag = ' (below --min-ops)'
+        else:
+            flag = ''
+        print(f'{name:35s} {ops:12,.0f} ops/sec{flag}')
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
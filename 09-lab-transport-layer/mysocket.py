@@ -18,15 +18,22 @@ TCP_STATE_LAST_ACK = 8
 TCP_STATE_TIME_WAIT = 9
 TCP_STATE_CLOSED = 10
 
-from headers import IPv4Header, UDPHeader, TCPHeader, \
+from headers import IPv4Header, IPv6Header, UDPHeader, TCPHeader, \
+        IPv4HeaderView, IPv6HeaderView, TCPHeaderView, \
         IP_HEADER_LEN, UDP_HEADER_LEN, TCP_HEADER_LEN, \
-        TCPIP_HEADER_LEN, UDPIP_HEADER_LEN
+        TCPIP_HEADER_LEN, UDPIP_HEADER_LEN, \
+        UDP_CHECKSUM_OFFSET, \
+        create_ip_header, ip_header_len, ip_header_view, \
+        fill_transport_checksum
 
 
 #From /usr/include/linux/in.h:
 IPPROTO_TCP = 6 # Transmission Control Protocol
 IPPROTO_UDP = 17 # User Datagram Protocol
 
+# TTL (or hop limit) for newly-created IP packets
+DEFAULT_TTL = 64
+
 class UDPSocket:
     def __init__(self, local_addr: str, local_port: int,
             send_ip_packet_func: callable,
@@ -40,17 +47,33 @@ class UDPSocket:
         self.buffer = []
 
     def handle_packet(self, pkt: bytes) -> None:
-        self.buffer.append((b'', '0.0.0.0', 0))
+        ip_hdr = ip_header_view(pkt)
+        udp_hdr = UDPHeader.unpack_from(pkt, ip_hdr.header_len)
+        data = pkt[ip_hdr.header_len + UDP_HEADER_LEN:]
+
+        self.buffer.append((data, ip_hdr.src, udp_hdr.sport))
         self._notify_on_data()
 
     @classmethod
     def create_packet(cls, src: str, sport: int, dst: str, dport: int,
             data: bytes=b'') -> bytes:
-        pass
+        length = UDP_HEADER_LEN + len(data)
+        udp_hdr = UDPHeader(sport, dport, length, 0)
+        ip_hdr = create_ip_header(src, dst, IPPROTO_UDP, length, DEFAULT_TTL)
+        ip_hdr_len = ip_hdr.header_len
+
+        pkt = bytearray(ip_hdr_len + length)
+        ip_hdr.pack_into(pkt)
+        udp_hdr.pack_into(pkt, ip_hdr_len)
+        pkt[ip_hdr_len + UDP_HEADER_LEN:] = data
+        fill_transport_checksum(pkt, ip_hdr, UDP_CHECKSUM_OFFSET)
+        return bytes(pkt)
 
     def send_packet(self, remote_addr: str, remote_port: int,
             data: bytes) -> None:
-        pass
+        pkt = self.create_packet(self._local_addr, self._local_port,
+                remote_addr, remote_port, data)
+        self._send_ip_packet(pkt)
 
     def recvfrom(self) -> tuple[bytes, str, int]:
         return self.buffer.pop(0)
@@ -79,9 +102,8 @@ class TCPListenerSocket(TCPSocketBase):
 
 
     def handle_packet(self, pkt: bytes) -> None:
-        ip_hdr = IPv4Header.from_bytes(pkt[:IP_HEADER_LEN])
-        tcp_hdr = TCPHeader.from_bytes(pkt[IP_HEADER_LEN:TCPIP_HEADER_LEN])
-        data = pkt[TCPIP_HEADER_LEN:]
+        ip_hdr = ip_header_view(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr.header_len)
 
         if tcp_hdr.flags & TCP_FLAGS_SYN:
             sock = TCPSocket(self._local_addr, self._local_port,
@@ -140,15 +162,17 @@ class TCPSocket(TCPSocketBase):
 
 
     def handle_packet(self, pkt: bytes) -> None:
-        ip_hdr = IPv4Header.from_bytes(pkt[:IP_HEADER_LEN])
-        tcp_hdr = TCPHeader.from_bytes(pkt[IP_HEADER_LEN:TCPIP_HEADER_LEN])
-        data = pkt[TCPIP_HEADER_LEN:]
+        # Only the TCP header fields are needed here, and they are decoded
+        # lazily; the addresses are never formatted.
+        ip_hdr_len = ip_header_len(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr_len)
+        has_data = len(pkt) > ip_hdr_len + tcp_hdr.header_len
 
         if self.state != TCP_STATE_ESTABLISHED:
             self.continue_connection(pkt)
 
         if self.state == TCP_STATE_ESTABLISHED:
-            if data:
+            if has_data:
                 # handle data
                 self.handle_data(pkt)
             if tcp_hdr.flags & TCP_FLAGS_ACK:
@@ -0,0 +1,270 @@
+import binascii
+import random
+import struct
+import unittest
+
+from cougarnet.util import ip_binary_to_str
+
+from headers import IPv4Header, IPv6Header, UDPHeader, TCPHeader, \
+        IPv4HeaderView, TCPHeaderView, \
+        IP_HEADER_LEN, IPV6_HEADER_LEN, UDPIP_HEADER_LEN, \
+        UDP_CHECKSUM_OFFSET, TCP_MAX_SACK_BLOCKS, checksum, \
+        fill_transport_checksum, ip_header_view
+
+from mysocket import TCP_FLAGS_SYN, TCP_FLAGS_ACK, \
+        IPPROTO_TCP, IPPROTO_UDP
+    
+
+class TestHeaderCodecs(unittest.TestCase):
+    def test_ipv6_header(self):
+        ip_hdr_obj = IPv6Header(28, 64, IPPROTO_UDP, '2001:db8::1', '2001:db8::2')
+
+        actual_value = binascii.hexlify(ip_hdr_obj.to_bytes())
+        correct_value = b'60000000001c1140' + \
+                b'20010db8000000000000000000000001' + \
+                b'20010db8000000000000000000000002'
+
+        self.assertEqual(actual_value, correct_value)
+
+
+        hdr = IPv6Header.from_bytes(ip_hdr_obj.to_bytes())
+
+        actual_value = (hdr.payload_length, hdr.hop_limit, hdr.next_header,
+                hdr.src, hdr.dst, hdr.header_len)
+        correct_value = (28, 64, IPPROTO_UDP, '2001:db8::1', '2001:db8::2',
+                IPV6_HEADER_LEN)
+
+        self.assertEqual(actual_value, correct_value)
+
+
+    def test_ipv4_header_options(self):
+        ip_hdr_obj = IPv4Header(28, 64, IPPROTO_UDP, 0, '10.0.0.1', '10.0.0.2',
+                options=b'\x01\x01\x01')
+        self.assertEqual(ip_hdr_obj.header_len, 24)
+
+        hdr = ip_header_view(ip_hdr_obj.to_bytes())
+        self.assertEqual(hdr.header_len, 24)
+
+        hdr = hdr.to_header()
+        actual_value = (hdr.length, hdr.protocol, hdr.options)
+        correct_value = (28, IPPROTO_UDP, b'\x01\x01\x01\x00')
+
+        self.assertEqual(actual_value, correct_value)
+
+
+    def test_transport_checksum(self):
+        for src, dst in (('10.0.0.1', '10.0.0.2'),
+                ('2001:db8::1', '2001:db8::2')):
+            data = b'abcdefghijklmnop'
+            length = 8 + len(data)
+            if ':' in src:
+                ip_hdr = IPv6Header(length, 64, IPPROTO_UDP, src, dst)
+            else:
+                ip_hdr = IPv4Header(20 + length, 64, IPPROTO_UDP, 0, src, dst)
+
+            pkt = bytearray(ip_hdr.to_bytes() + \
+                    UDPHeader(1067, 7786, length, 0).to_bytes() + data)
+            fill_transport_checksum(pkt, ip_hdr, UDP_CHECKSUM_OFFSET)
+
+            # verifying the checksum of a correct segment yields zero
+            segment = pkt[ip_hdr.header_len:]
+            self.assertNotEqual(UDPHeader.from_bytes(segment).checksum, 0)
+            self.assertEqual(checksum(segment,
+                ip_hdr.pseudo_header_sum(len(segment))), 0)
+
+
+    def test_tcp_header_options(self):
+        tcp_hdr_obj = TCPHeader(4321, 80, 123456789, 0, TCP_FLAGS_SYN, 0,
+                65535, mss=1460, wscale=7, sack_permitted=True,
+                timestamp=(1000, 0))
+
+        actual_value = binascii.hexlify(tcp_hdr_obj.options_to_bytes())
+        correct_value = b'020405b401030307010104020101080a000003e800000000'
+
+        self.assertEqual(actual_value, correct_value)
+        self.assertEqual(tcp_hdr_obj.header_len, 44)
+
+
+        hdr = TCPHeader.from_bytes(tcp_hdr_obj.to_bytes())
+
+        actual_value = (hdr.seq, hdr.flags, hdr.window, hdr.mss,
+                hdr.wscale, hdr.sack_permitted, hdr.timestamp)
+        correct_value = (123456789, TCP_FLAGS_SYN, 65535, 1460,
+                7, True, (1000, 0))
+
+        self.assertEqual(actual_value, correct_value)
+
+        # options are cut short by the data offset
+        with self.assertRaises(ValueError):
+            TCPHeader.from_bytes(tcp_hdr_obj.to_bytes()[:40])
+
+        tcp_hdr_obj = TCPHeader(4321, 80, 123456789, 3000, TCP_FLAGS_ACK, 0,
+                65535, sack_blocks=[(5000, 6000), (8000, 9500)])
+
+        actual_value = binascii.hexlify(tcp_hdr_obj.options_to_bytes())
+        correct_value = b'0101051200001388000017700000' + \
+                b'1f400000251c'
+
+        self.assertEqual(actual_value, correct_value)
+        self.assertEqual(tcp_hdr_obj.header_len, 40)
+
+        hdr = TCPHeader.from_bytes(tcp_hdr_obj.to_bytes())
+        self.assertEqual(hdr.sack_blocks, [(5000, 6000), (8000, 9500)])
+
+        # only three SACK blocks fit alongside a timestamp
+        blocks = [(i * 1000, i * 1000 + 500) for i in range(1, 5)]
+        tcp_hdr_obj = TCPHeader(4321, 80, 123456789, 500, TCP_FLAGS_ACK, 0,
+                65535, timestamp=(1000, 2000), sack_blocks=blocks)
+        self.assertEqual(tcp_hdr_obj.header_len, 60)
+        hdr = TCPHeader.from_bytes(tcp_hdr_obj.to_bytes())
+        self.assertEqual(hdr.sack_blocks, blocks[:3])
+        self.assertEqual(hdr.timestamp, (1000, 2000))
+
+    def test_header_views(self):
+        pkt = IPv4Header(40, 64, IPPROTO_TCP, 0, '10.1.2.3', '10.4.5.6'
+                ).to_bytes() + \
+                TCPHeader(4321, 80, 123456789, 987654, TCP_FLAGS_ACK, 0,
+                    1024).to_bytes()
+
+        hdr = IPv4HeaderView(pkt)
+        actual_value = (hdr.src_bin, hdr.dst_bin)
+        correct_value = (b'\x0a\x01\x02\x03', b'\x0a\x04\x05\x06')
+        self.assertEqual(actual_value, correct_value)
+
+        hdr = hdr.to_header()
+        actual_value = (hdr.length, hdr.ttl, hdr.protocol,
+                hdr.checksum, hdr.src, hdr.dst)
+        correct_value = (40, 64, IPPROTO_TCP, 0, '10.1.2.3', '10.4.5.6')
+        self.assertEqual(actual_value, correct_value)
+
+        hdr = TCPHeaderView(pkt, IP_HEADER_LEN)
+        actual_value = (hdr.sport, hdr.dport, hdr.seq,
+                hdr.ack, hdr.flags, hdr.checksum, hdr.window)
+        correct_value = (4321, 80, 123456789, 987654, TCP_FLAGS_ACK, 0, 1024)
+        self.assertEqual(actual_value, correct_value)
+
+    def test_shared_buffer(self):
+        ip_hdr_obj = IPv4Header(48, 64, IPPROTO_UDP, 0, '10.0.0.1', '10.0.0.2')
+        udp_hdr_obj = UDPHeader(1067, 7786, 28, 0)
+
+        # write both headers into a single buffer, then read them back out
+        # of the same buffer, without slicing
+        buf = bytearray(UDPIP_HEADER_LEN)
+        ip_hdr_obj.pack_into(buf)
+        udp_hdr_obj.pack_into(buf, IP_HEADER_LEN)
+
+        self.assertEqual(bytes(buf),
+                ip_hdr_obj.to_bytes() + udp_hdr_obj.to_bytes())
+
+        hdr = IPv4Header.unpack_from(buf)
+        actual_value = (hdr.length, hdr.ttl, hdr.protocol,
+                hdr.checksum, hdr.src, hdr.dst)
+        correct_value = (48, 64, IPPROTO_UDP, 0, '10.0.0.1', '10.0.0.2')
+        self.assertEqual(actual_value, correct_value)
+
+        hdr = UDPHeader.unpack_from(buf, IP_HEADER_LEN)
+        actual_value = (hdr.sport, hdr.dport, hdr.length, hdr.checksum)
+        correct_value = (1067, 7786, 28, 0)
+        self.assertEqual(actual_value, correct_value)
+
+def random_ipv4_header(rng: random.Random) -> IPv4Header:
+    options = rng.randbytes(rng.randrange(0, 41, 4))
+    return IPv4Header(rng.randrange(1 << 16), rng.randrange(1 << 8),
+            rng.randrange(1 << 8), rng.randrange(1 << 16),
+            ip_binary_to_str(rng.randbytes(4)),
+            ip_binary_to_str(rng.randbytes(4)), options)
+
+def random_udp_header(rng: random.Random) -> UDPHeader:
+    return UDPHeader(*(rng.randrange(1 << 16) for i in range(4)))
+
+def random_tcp_header(rng: random.Random) -> TCPHeader:
+    options = {}
+    if rng.random() < 0.5:
+        options['mss'] = rng.randrange(1 << 16)
+    if rng.random() < 0.5:
+        options['wscale'] = rng.randrange(15)
+    if rng.random() < 0.5:
+        options['sack_permitted'] = True
+    if rng.random() < 0.5:
+        options['timestamp'] = (rng.randrange(1 << 32), rng.randrange(1 << 32))
+    # as many SACK blocks as fit in the remaining option space
+    max_blocks = (40 - len(TCPHeader(0, 0, 0, 0, 0, 0,
+        **options).options_to_bytes()) - 4) // 8
+    if max_blocks > 0 and rng.random() < 0.5:
+        options['sack_blocks'] = [
+                (rng.randrange(1 << 32), rng.randrange(1 << 32))
+                for i in range(rng.randint(1, min(max_blocks,
+                    TCP_MAX_SACK_BLOCKS)))]
+    return TCPHeader(rng.randrange(1 << 16), rng.randrange(1 << 16),
+            rng.randrange(1 << 32), rng.randrange(1 << 32),
+            rng.randrange(1 << 8), rng.randrange(1 << 16),
+            rng.randrange(1 << 16), **options)
+
+IPV4_FIELDS = ('length', 'ttl', 'protocol', 'checksum', 'src', 'dst', 'options')
+UDP_FIELDS = ('sport', 'dport', 'length', 'checksum')
+TCP_FIELDS = ('sport', 'dport', 'seq', 'ack', 'flags', 'checksum', 'window',
+        'mss', 'wscale', 'sack_permitted', 'timestamp', 'sack_blocks')
+
+
+class TestHeadersRoundTrip(unittest.TestCase):
+    '''
+    Randomized round-trip tests: any header that is serialized must parse
+    back to the same fields, whether it stands alone or is embedded at an
+    arbitrary offset in a larger buffer, and any truncated header must be
+    rejected rather than misparsed.
+    '''
+
+    SEED = 460
+    ITERATIONS = 500
+
+    def check_round_trip(self, make_header, cls, fields):
+        rng = random.Random(self.SEED)
+        for i in range(self.ITERATIONS):
+            hdr = make_header(rng)
+            expected = tuple(getattr(hdr, f) for f in fields)
+            hdr_bytes = hdr.to_bytes()
+            self.assertEqual(len(hdr_bytes), getattr(hdr, 'header_len',
+                len(hdr_bytes)))
+
+            actual = cls.from_bytes(hdr_bytes)
+            self.assertEqual(tuple(getattr(actual, f) for f in fields),
+                    expected)
+
+            offset = rng.randrange(64)
+            buf = bytearray(rng.randbytes(offset + len(hdr_bytes) + 16))
+            hdr.pack_into(buf, offset)
+            self.assertEqual(bytes(buf[offset:offset + len(hdr_bytes)]),
+                    hdr_bytes)
+            actual = cls.unpack_from(buf, offset)
+            self.assertEqual(tuple(getattr(actual, f) for f in fields),
+                    expected)
+
+            for cut in range(len(hdr_bytes)):
+                with self.assertRaises((struct.error, ValueError)):
+                    cls.from_bytes(hdr_bytes[:cut])
+
+    def test_ipv4_round_trip(self):
+        self.check_round_trip(random_ipv4_header, IPv4Header, IPV4_FIELDS)
+
+    def test_udp_round_trip(self):
+        self.check_round_trip(random_udp_header, UDPHeader, UDP_FIELDS)
+
+    def test_tcp_round_trip(self):
+        self.check_round_trip(random_tcp_header, TCPHeader, TCP_FIELDS)
+
+    def test_tcp_garbage_options(self):
+        # options that are malformed, unknown, or cut short by the data offset
+        # are skipped, without raising an exception or reading past the header
+        rng = random.Random(self.SEED)
+        for i in range(self.ITERATIONS):
+            opts = rng.randbytes(rng.randrange(0, 41, 4))
+            hdr_bytes = struct.pack('!HHIIBBHHH', 1, 2, 3, 4,
+                    ((20 + len(opts)) >> 2) << 4, 0, 0, 0, 0) + opts
+            hdr = TCPHeader.from_bytes(hdr_bytes + rng.randbytes(8))
+            if hdr.mss is not None:
+                self.assertLess(hdr.mss, 1 << 16)
+            if hdr.wscale is not None:
+                self.assertLessEqual(hdr.wscale, 14)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,10 @@ from cougarnet.util import \
         ip_str_to_binary, ip_binary_to_str
 
 from headers import IPv4Header, UDPHeader, TCPHeader, \
+        TCPHeaderView, \
         IP_HEADER_LEN, UDP_HEADER_LEN, TCP_HEADER_LEN, \
-        TCPIP_HEADER_LEN, UDPIP_HEADER_LEN
+        TCPIP_HEADER_LEN, UDPIP_HEADER_LEN, \
+        ip_header_view
 from host import Host
 from mysocket import UDPSocket, TCPSocketBase
 
@@ -15,10 +17,20 @@ class TransportHost(Host):
         self.socket_mapping_tcp = {}
 
     def handle_tcp(self, pkt: bytes) -> None:
-        pass
+        ip_hdr = ip_header_view(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr.header_len)
+        sock = self.socket_mapping_tcp[(ip_hdr.dst, tcp_hdr.dport,
+                ip_hdr.src, tcp_hdr.sport)]
+        sock.handle_packet(pkt)
 
     def handle_udp(self, pkt: bytes) -> None:
-        pass
+        ip_hdr = ip_header_view(pkt)
+        udp_hdr = UDPHeader.unpack_from(pkt, ip_hdr.header_len)
+        sock = self.socket_mapping_udp.get((ip_hdr.dst, udp_hdr.dport))
+        if sock is None:
+            self.no_socket_udp(pkt)
+        else:
+            sock.handle_packet(pkt)
 
     def install_socket_udp(self, local_addr: str, local_port: int,
             sock: UDPSocket) -> None:
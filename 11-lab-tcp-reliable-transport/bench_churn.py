@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from demux import TCPDemux
+from mysocket import TCPListenerSocket, TCPSocket, TCPSocketBase
+from timerwheel import TimerWheel
+
+SERVER_ADDR = '10.0.0.1'
+SERVER_PORT = 80
+GREETING = b'hello\n' * 100
+
+def client_endpoint(i: int) -> tuple[str, int]:
+    return f'10.{1 + ((i >> 16) & 0x7f)}.{(i >> 8) & 0xff}.{i & 0xff}', \
+            1024 + i % 50000
+
+class Endpoint:
+    '''
+    The TCP half of a host: a TCPDemux and a timer wheel, with segments
+    delivered to the peer endpoint at the end of the current event loop
+    iteration.
+    '''
+
+    def __init__(self, time_wait_timeout: float) -> Endpoint:
+        self.timer_wheel = TimerWheel()
+        self.demux = TCPDemux(self.timer_wheel, time_wait_timeout)
+        self.peer = None
+        self.resets_sent = 0
+        self.released = 0
+
+    def send_ip_packet(self, pkt: bytes) -> None:
+        asyncio.get_event_loop().call_soon(self.peer.handle_tcp, pkt)
+
+    def handle_tcp(self, pkt: bytes) -> None:
+        sock = self.demux.lookup(pkt)
+        if sock is not None:
+            sock.handle_packet(pkt)
+            return
+        rst = TCPSocket.create_reset(pkt)
+        if rst is not None:
+            self.resets_sent += 1
+            self.send_ip_packet(rst)
+
+    def install_socket(self, local_addr: str, local_port: int,
+            remote_addr: str, remote_port: int, sock: TCPSocketBase) -> None:
+        self.demux.add_connection(local_addr, local_port,
+                remote_addr, remote_port, sock)
+        sock.use_timer_wheel(self.timer_wheel)
+        sock.release_func = self.release
+
+    def release(self, sock: TCPSocket) -> None:
+        self.demux.release(sock)
+        self.released += 1
+
+def start_server(server: Endpoint) -> TCPListenerSocket:
+    '''
+    Listen on SERVER_ADDR and SERVER_PORT, sending GREETING to every client
+    and then closing the connection (so that the server side ends up in
+    TIME_WAIT).
+    '''
+
+    def accept_clients():
+        while True:
+            sock = listener.accept()
+            if sock is None:
+                break
+            sock.send(GREETING)
+            sock.close()
+
+    listener = TCPListenerSocket(SERVER_ADDR, SERVER_PORT,
+            server.install_socket, server.send_ip_packet, lambda: None,
+            notify_on_accept_func=accept_clients)
+    listener.use_timer_wheel(server.timer_wheel)
+    server.demux.add_listener(SERVER_ADDR, SERVER_PORT, listener)
+    return listener
+
+def start_client(client: Endpoint, i: int) -> None:
+    '''
+    Connect to the server, read until the server closes the connection, and
+    then close it.
+    '''
+
+    def handle_data():
+        sock.recv_all()
+        if sock.at_eof():
+            sock.close()
+
+    local_addr, local_port = client_endpoint(i)
+    sock = TCPSocket.connect(local_addr, local_port, SERVER_ADDR, SERVER_PORT,
+            client.send_ip_packet, handle_data)
+    client.install_socket(local_addr, local_port,
+            SERVER_ADDR, SERVER_PORT, sock)
+
+def table_sizes(client: Endpoint, server: Endpoint,
+        listener: TCPListenerSocket) -> str:
+    return f'connections {len(client.demux) + len(server.demux):6d}  ' + \
+            f'time_wait {len(server.demux.time_wait):6d}  ' + \
+            f'syn_queue {len(listener.syn_queue):4d}  ' + \
+            f'timers {len(client.timer_wheel) + len(server.timer_wheel):6d}'
+
+async def run(args: argparse.Namespace) -> None:
+    client = Endpoint(args.time_wait)
+    server = Endpoint(args.time_wait)
+    client.peer = server
+    server.peer = client
+    listener = start_server(server)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    baseline = None
+    for i in range(0, args.cycles, args.batch):
+        for j in range(i, min(i + args.batch, args.cycles)):
+            start_client(client, j)
+        while client.released < j + 1:
+            await asyncio.sleep(0.001)
+
+        if (j + 1) % args.report == 0 or j + 1 == args.cycles:
+            gc.collect()
+            current = tracemalloc.get_traced_memory()[0]
+            if baseline is None:
+                baseline = current
+            print(f'{j + 1:7d} cycles  {current / 1e6:7.2f} MB  ' + \
+                    table_sizes(client, server, listener))
+    elapsed = time.perf_counter() - start
+
+    # let TIME_WAIT expire
+    await asyncio.sleep(args.time_wait + 2 * server.timer_wheel.tick)
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    print(f'{"drained":>7s}  {current / 1e6:14.2f} MB  ' + \
+            table_sizes(client, server, listener))
+    print(f'{args.cycles / elapsed:,.0f} connect/close cycles/sec, ' + \
+            f'{(current - baseline) / 1e6:+.2f} MB since the first report, ' + \
+            f'{client.resets_sent + server.resets_sent} resets')
+    tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Measure memory over many TCP connect/close cycles')
+    parser.add_argument('--cycles', '-n',
+            action='store', type=int, default=100000,
+            help='Number of connections opened and closed')
+    parser.add_argument('--batch', '-b',
+            action='store', type=int, default=200,
+            help='Number of connections open at once')
+    parser.add_argument('--report', '-r',
+            action='store', type=int, default=10000,
+            help='Number of cycles between reports')
+    parser.add_argument('--time-wait', '-t',
+            action='store', type=float, default=0.5,
+            help='Duration of TIME_WAIT, in seconds')
+    args = parser.parse_args(sys.argv[1:])
+
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
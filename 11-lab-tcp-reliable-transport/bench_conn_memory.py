@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import sys
+import types
+
+from mysocket import TCPListenerSocket, TCPSocket, TCPSocketBase
+from timerwheel import TimerWheel
+
+SERVER_ADDR = '10.0.0.1'
+SERVER_PORT = 80
+
+# Objects shared by all connections, never counted toward any of them
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType,
+        types.BuiltinFunctionType, TimerWheel, TCPListenerSocket)
+
+def client_endpoint(i: int) -> tuple[str, int]:
+    return f'10.{1 + ((i >> 16) & 0x7f)}.{(i >> 8) & 0xff}.{i & 0xff}', \
+            1024 + i % 50000
+
+def sizeof(obj, seen: set) -> int:
+    '''
+    Return the size, according to sys.getsizeof(), of obj and everything it
+    references (through its __dict__ or __slots__, or as a container) that
+    is not in seen or shared by all connections.  Bound methods are counted,
+    but not the objects to which they are bound, and neither are attribute
+    names.
+    '''
+
+    if id(obj) in seen or obj is None or isinstance(obj, bool) or \
+            isinstance(obj, SHARED_TYPES) or \
+            (isinstance(obj, int) and -5 <= obj <= 256):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, types.MethodType):
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += sizeof(key, seen) + sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+        for item in obj:
+            size += sizeof(item, seen)
+    if hasattr(obj, '__dict__'):
+        # the attribute names are shared by all instances
+        attrs = vars(obj)
+        seen.add(id(attrs))
+        size += sys.getsizeof(attrs)
+        for value in attrs.values():
+            size += sizeof(value, seen)
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if hasattr(obj, name):
+                size += sizeof(getattr(obj, name), seen)
+    return size
+
+def breakdown(sock: TCPSocket) -> dict:
+    '''
+    Return the size of an idle connection's socket, broken down into the
+    objects that hang off it, with the socket itself (and any remaining
+    attributes) last.
+    '''
+
+    # the congestion control object refers back to the socket
+    seen = {id(sock)}
+    sizes = {}
+    for name in ('send_buffer', 'receive_buffer', 'ready_buffer',
+            'scoreboard', 'congestion'):
+        # look past the property that would allocate the send buffer
+        if hasattr(type(sock), '_' + name):
+            name_attr = '_' + name
+        else:
+            name_attr = name
+        sizes[name] = sizeof(getattr(sock, name_attr, None), seen)
+    seen.discard(id(sock))
+    sizes['socket'] = sizeof(sock, seen)
+    return sizes
+
+async def idle_connections(num_conns: int) -> list[TCPSocket]:
+    '''
+    Complete num_conns handshakes with a listener, and return the sockets
+    for both ends of every connection, left idle.
+    '''
+
+    loop = asyncio.get_running_loop()
+    wheel = TimerWheel()
+    socks = {}
+
+    def deliver(pkt: bytes) -> None:
+        # the destination port is all that distinguishes the sockets
+        port = int.from_bytes(pkt[22:24], 'big')
+        loop.call_soon(socks[port].handle_packet, pkt)
+
+    def handle_new_client(local_addr, local_port, remote_addr, remote_port,
+            sock):
+        sock.use_timer_wheel(wheel)
+        servers.append(sock)
+
+    servers = []
+    listener = TCPListenerSocket(SERVER_ADDR, SERVER_PORT,
+            handle_new_client, deliver, lambda: None)
+    listener.use_timer_wheel(wheel)
+    socks[SERVER_PORT] = listener
+
+    clients = []
+    for i in range(num_conns):
+        local_addr, local_port = client_endpoint(i)
+        sock = TCPSocket.connect(local_addr, local_port,
+                SERVER_ADDR, SERVER_PORT, deliver, lambda: None)
+        sock.use_timer_wheel(wheel)
+        socks[local_port] = sock
+        clients.append(sock)
+    while len(servers) < num_conns:
+        await asyncio.sleep(0.001)
+    return clients + servers
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Report the memory used by idle TCP connections')
+    parser.add_argument('--connections', '-c',
+            action='store', type=int, default=1000,
+            help='Number of connections')
+    args = parser.parse_args(sys.argv[1:])
+
+    socks = asyncio.run(idle_connections(args.connections))
+    totals = collections.Counter()
+    for sock in socks:
+        totals.update(breakdown(sock))
+
+    print(f'Bytes per idle connection (sys.getsizeof, average over ' + \
+            f'{len(socks)} sockets):')
+    for name, total in totals.items():
+        print(f'  {name:31s} {total / len(socks):8,.0f}')
+    print(f'  {"total":31s} {sum(totals.values()) / len(socks):8,.0f}')
+
+if __name__ == '__main__':
+    main()
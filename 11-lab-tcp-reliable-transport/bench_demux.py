@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import sys
+import time
+
+from demux import TCPDemux
+from headers import TCPHeaderView, ip_header_view
+from mysocket import TCPSocket, TCP_FLAGS_ACK, TCP_FLAGS_SYN
+
+SEED = 460
+LOCAL_ADDR = '10.0.0.1'
+LOCAL_PORT = 80
+NUM_PACKETS = 10000
+
+def remote_endpoint(i: int) -> tuple[str, int]:
+    return f'10.{(i >> 16) & 0xff}.{(i >> 8) & 0xff}.{i & 0xff}', \
+            1024 + i % 50000
+
+def ops_per_sec(func, items, number: int) -> float:
+    '''
+    Call func on every item in items, number times over, and return the
+    number of calls per second.
+    '''
+
+    start = time.perf_counter()
+    for i in range(number):
+        for item in items:
+            func(item)
+    elapsed = time.perf_counter() - start
+    return number * len(items) / elapsed
+
+def benchmarks(num_conns: int,
+        rng: random.Random) -> list[tuple[str, callable, list]]:
+    # the tables of TransportHost, before and after TCPDemux: string keys
+    # (with None for the remote side of a listener) and packed binary keys
+    listener = object()
+    str_mapping = {(LOCAL_ADDR, LOCAL_PORT, None, None): listener}
+    demux = TCPDemux()
+    demux.add_listener(LOCAL_ADDR, LOCAL_PORT, listener)
+    for i in range(num_conns):
+        remote_addr, remote_port = remote_endpoint(i)
+        sock = object()
+        str_mapping[(LOCAL_ADDR, LOCAL_PORT, remote_addr, remote_port)] = sock
+        demux.add_connection(LOCAL_ADDR, LOCAL_PORT,
+                remote_addr, remote_port, sock)
+
+    established = []
+    for i in range(NUM_PACKETS):
+        remote_addr, remote_port = remote_endpoint(rng.randrange(num_conns))
+        established.append(TCPSocket.create_packet(remote_addr, remote_port,
+            LOCAL_ADDR, LOCAL_PORT, 0, 0, TCP_FLAGS_ACK))
+    syns = []
+    for i in range(NUM_PACKETS):
+        remote_addr, remote_port = remote_endpoint(num_conns + i)
+        syns.append(TCPSocket.create_packet(remote_addr, remote_port,
+            LOCAL_ADDR, LOCAL_PORT, 0, 0, TCP_FLAGS_SYN))
+
+    def str_lookup(pkt):
+        ip_hdr = ip_header_view(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr.header_len)
+        sock = str_mapping.get((ip_hdr.dst, tcp_hdr.dport,
+                ip_hdr.src, tcp_hdr.sport))
+        if sock is None:
+            sock = str_mapping.get((ip_hdr.dst, tcp_hdr.dport, None, None))
+        return sock
+
+    assert all(str_lookup(pkt) is demux.lookup(pkt) for pkt in established)
+    assert all(demux.lookup(pkt) is listener for pkt in syns)
+
+    return [
+        ('string keys (established)', str_lookup, established),
+        ('string keys (listener)', str_lookup, syns),
+        ('TCPDemux.lookup (established)', demux.lookup, established),
+        ('TCPDemux.lookup (listener)', demux.lookup, syns),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Measure TCP demultiplexing throughput')
+    parser.add_argument('--connections', '-c',
+            action='store', type=int, default=100000,
+            help='Number of established connections')
+    parser.add_argument('--number', '-n',
+            action='store', type=int, default=20,
+            help='Number of passes over %d segments' % NUM_PACKETS)
+    args = parser.parse_args(sys.argv[1:])
+
+    print(f'{args.connections} connections')
+    for name, func, items in benchmarks(args.connections,
+            random.Random(SEED)):
+        ops = ops_per_sec(func, items, args.number)
+        print(f'{name:35s} {ops:12,.0f} lookups/sec')
+
+if __name__ == '__main__':
+    main()
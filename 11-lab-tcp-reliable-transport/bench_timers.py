@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from timerwheel import TimerWheel
+
+SEED = 460
+RTO = 1.0
+
+def noop() -> None:
+    pass
+
+def rearm_call_later(loop: asyncio.AbstractEventLoop, num_timers: int,
+        order: list[int]) -> float:
+    '''
+    Re-arm retransmission timers the way a socket without a timer wheel does
+    (cancel the TimerHandle and schedule a new one), once for every index in
+    order, and return the number of re-arms per second.
+    '''
+
+    timers = [loop.call_later(RTO, noop) for i in range(num_timers)]
+    start = time.perf_counter()
+    for i in order:
+        timers[i].cancel()
+        timers[i] = loop.call_later(RTO, noop)
+    elapsed = time.perf_counter() - start
+    for timer in timers:
+        timer.cancel()
+    return len(order) / elapsed
+
+def rearm_wheel(wheel: TimerWheel, num_timers: int,
+        order: list[int]) -> float:
+    '''
+    Re-arm timers on a TimerWheel, once for every index in order, and return
+    the number of re-arms per second.
+    '''
+
+    timers = [wheel.schedule(RTO, noop) for i in range(num_timers)]
+    start = time.perf_counter()
+    for i in order:
+        timers[i].reset(RTO)
+    elapsed = time.perf_counter() - start
+    for timer in timers:
+        timer.cancel()
+    return len(order) / elapsed
+
+async def load(wheel: TimerWheel, num_timers: int, duration: float,
+        rng: random.Random) -> None:
+    '''
+    Keep num_timers timers on the wheel for duration seconds, re-arming a
+    random sample of them every millisecond, as ACKs arriving on many
+    connections would, and letting some of them expire.
+    '''
+
+    timers = [wheel.schedule(rng.uniform(0.2, 1.0), noop)
+            for i in range(num_timers)]
+    loop = asyncio.get_running_loop()
+    end = loop.time() + duration
+    while loop.time() < end:
+        for timer in rng.sample(timers, min(len(timers), 100)):
+            timer.reset(rng.uniform(0.2, 1.0))
+        await asyncio.sleep(0.001)
+    for timer in timers:
+        timer.cancel()
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(SEED)
+    loop = asyncio.get_running_loop()
+    order = [rng.randrange(args.timers) for i in range(args.ops)]
+
+    ops = rearm_call_later(loop, args.timers, order)
+    print(f'{"loop.call_later re-arm":35s} {ops:12,.0f} ops/sec')
+    ops = rearm_wheel(TimerWheel(), args.timers, order)
+    print(f'{"TimerWheel re-arm":35s} {ops:12,.0f} ops/sec')
+
+    wheel = TimerWheel()
+    await load(wheel, args.timers, args.duration, rng)
+    stats = wheel.stats()
+    print(f'Under load ({args.timers} timers, {args.duration} s):')
+    for name in ('scheduled', 'resets', 'cancels', 'expirations'):
+        print(f'  {name:33s} {stats[name]:12,d}')
+    print(f'  {"timer operations":33s} {stats["ops_per_sec"]:12,.0f} ops/sec')
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Measure the cost of re-arming retransmission timers')
+    parser.add_argument('--timers', '-t',
+            action='store', type=int, default=10000,
+            help='Number of concurrent timers (connections)')
+    parser.add_argument('--ops', '-n',
+            action='store', type=int, default=200000,
+            help='Number of re-arms to time')
+    parser.add_argument('--duration', '-d',
+            action='store', type=float, default=2.0,
+            help='Duration of the load test, in seconds')
+    args = parser.parse_args(sys.argv[1:])
+
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
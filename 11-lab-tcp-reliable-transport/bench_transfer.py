@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import os
+import random
+import selectors
+import statistics
+import sys
+import time
+
+from demux import TCPDemux
+from mysocket import TCPListenerSocket, TCPSocket, TCPSocketBase
+from timerwheel import TimerWheel
+
+CLIENT_ADDR = '10.0.0.2'
+CLIENT_PORT = 1234
+SERVER_ADDR = '10.0.0.1'
+SERVER_PORT = 80
+
+# The names of the options that make up a configuration, i.e., those that
+# take a list of values, every combination of which is run
+LINK_OPTIONS = ('delay', 'bandwidth', 'loss', 'reorder', 'queue')
+SOCKET_OPTIONS = ('congestion_control', 'sack', 'receive_window')
+
+class VirtualClockSelector(selectors.DefaultSelector):
+    '''
+    A selector that, rather than waiting for the timeout passed to select(),
+    advances a virtual clock by that much (unless a file descriptor is ready,
+    e.g., the event loop's self-pipe).
+    '''
+
+    def __init__(self) -> VirtualClockSelector:
+        super().__init__()
+        self.time = 0.0
+
+    def select(self, timeout: float=None) -> list:
+        events = super().select(0)
+        if not events:
+            if timeout is None:
+                return super().select(None)
+            self.time += timeout
+        return events
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    '''
+    An event loop on which time only passes when there is nothing to do but
+    wait for the next timer, which then expires immediately.  A transfer
+    takes only as long as it takes to process its segments, however long
+    the delays of the link, and the timing is the same from run to run.
+    '''
+
+    def __init__(self) -> VirtualTimeEventLoop:
+        self._clock = VirtualClockSelector()
+        super().__init__(self._clock)
+
+    def time(self) -> float:
+        return self._clock.time
+
+class SimulatedLink:
+    '''
+    One direction of a link: segments are transmitted one after another at
+    bandwidth bits per second, from a queue of at most queue segments
+    (beyond which they are dropped), and delivered to handle_tcp after a
+    propagation delay of delay seconds.  Each segment is lost with
+    probability loss, and held back for another delay seconds (so that it
+    arrives after those sent after it) with probability reorder.
+    '''
+
+    def __init__(self, handle_tcp: callable, rand: random.Random,
+            delay: float, bandwidth: float, loss: float, reorder: float,
+            queue: int) -> SimulatedLink:
+        self.handle_tcp = handle_tcp
+        self.rand = rand
+        self.delay = delay
+        self.bandwidth = bandwidth
+        self.loss = loss
+        self.reorder = reorder
+        self.queue = queue
+
+        # The time at which the last segment queued will have been
+        # transmitted, and the times at which each segment still queued
+        # will have been
+        self._busy_until = 0.0
+        self._departures = collections.deque()
+
+        self.segments_dropped = 0
+
+    def send(self, pkt: bytes) -> None:
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        while self._departures and self._departures[0] <= now:
+            self._departures.popleft()
+        if len(self._departures) >= self.queue:
+            self.segments_dropped += 1
+            return
+
+        self._busy_until = max(self._busy_until, now) + \
+                len(pkt) * 8 / self.bandwidth
+        self._departures.append(self._busy_until)
+        if self.rand.random() < self.loss:
+            self.segments_dropped += 1
+            return
+        delay = self.delay
+        if self.rand.random() < self.reorder:
+            delay *= 2
+        loop.call_at(self._busy_until + delay, self.handle_tcp, pkt)
+
+class Endpoint:
+    '''
+    The TCP half of a host (like TransportHost, but without the rest of the
+    network stack): a TCPDemux and a timer wheel, with segments sent over a
+    SimulatedLink to the peer endpoint.
+    '''
+
+    def __init__(self) -> Endpoint:
+        self.timer_wheel = TimerWheel()
+        self.demux = TCPDemux(self.timer_wheel)
+        self.link = None
+
+    def send_ip_packet(self, pkt: bytes) -> None:
+        self.link.send(pkt)
+
+    def handle_tcp(self, pkt: bytes) -> None:
+        sock = self.demux.lookup(pkt)
+        if sock is not None:
+            sock.handle_packet(pkt)
+            return
+        rst = TCPSocket.create_reset(pkt)
+        if rst is not None:
+            self.send_ip_packet(rst)
+
+    def install_socket(self, local_addr: str, local_port: int,
+            remote_addr: str, remote_port: int, sock: TCPSocketBase) -> None:
+        self.demux.add_connection(local_addr, local_port,
+                remote_addr, remote_port, sock)
+        sock.use_timer_wheel(self.timer_wheel)
+        sock.release_func = self.demux.release
+
+async def transfer(config: dict, size: int, seed: int,
+        timeout: float) -> dict:
+    '''
+    Connect a client to a server over a pair of SimulatedLinks with the
+    link options in config, send size bytes from the client, and return the
+    completion time (from connect() until the server has received the last
+    byte; None if that took more than timeout seconds) and the client's
+    stats() (see TCPSocket.stats()).
+    '''
+
+    loop = asyncio.get_running_loop()
+    rand = random.Random(seed)
+    client = Endpoint()
+    server = Endpoint()
+    link_options = { name: config[name] for name in LINK_OPTIONS }
+    client.link = SimulatedLink(server.handle_tcp, rand, **link_options)
+    server.link = SimulatedLink(client.handle_tcp, rand, **link_options)
+    socket_options = { name: config[name] for name in SOCKET_OPTIONS }
+
+    done = loop.create_future()
+    received = 0
+
+    def handle_data(sock: TCPSocket) -> None:
+        nonlocal received
+        for data in sock.recv_all():
+            received += len(data)
+        if received >= size and not done.done():
+            done.set_result(loop.time())
+
+    def handle_new_client(local_addr, local_port, remote_addr, remote_port,
+            sock):
+        server.install_socket(local_addr, local_port,
+                remote_addr, remote_port, sock)
+        sock.set_notify_on_data(lambda: handle_data(sock))
+        handle_data(sock)
+
+    listener = TCPListenerSocket(SERVER_ADDR, SERVER_PORT,
+            handle_new_client, server.send_ip_packet, None, **socket_options)
+    listener.use_timer_wheel(server.timer_wheel)
+    server.demux.add_listener(SERVER_ADDR, SERVER_PORT, listener)
+
+    start = loop.time()
+    sock = TCPSocket.connect(CLIENT_ADDR, CLIENT_PORT,
+            SERVER_ADDR, SERVER_PORT, client.send_ip_packet, None,
+            **socket_options)
+    client.install_socket(CLIENT_ADDR, CLIENT_PORT,
+            SERVER_ADDR, SERVER_PORT, sock)
+    # buffered until the handshake has completed
+    sock.send(os.urandom(size))
+
+    try:
+        completion_time = await asyncio.wait_for(done,
+                timeout - (loop.time() - start)) - start
+    except asyncio.TimeoutError:
+        completion_time = None
+    return { 'completion_time': completion_time, 'stats': sock.stats() }
+
+def run_transfer(job: tuple[dict, int, int, float]) -> dict:
+    '''
+    Run a transfer (see transfer()) on a VirtualTimeEventLoop of its own.
+    This is what each worker process is given.
+    '''
+
+    loop = VirtualTimeEventLoop()
+    try:
+        return loop.run_until_complete(transfer(*job))
+    finally:
+        loop.close()
+
+def summarize(results: list[dict], size: int) -> dict:
+    '''
+    Summarize the results of the transfers of a configuration: the median
+    goodput (in Mbit/s) and completion time, the 95th percentile completion
+    time, and the mean retransmissions and RTO expiries per transfer, over
+    the transfers that completed.
+    '''
+
+    completed = [r for r in results if r['completion_time'] is not None]
+    times = sorted(r['completion_time'] for r in completed)
+    if not times:
+        return { 'completed': 0 }
+    return {
+            'completed': len(completed),
+            'goodput': statistics.median(size * 8 / t / 1e6 for t in times),
+            'time_p50': statistics.median(times),
+            'time_p95': times[min(int(len(times) * 0.95), len(times) - 1)],
+            'retransmits': statistics.mean(
+                r['stats']['segments_retransmitted'] for r in completed),
+            'timeouts': statistics.mean(
+                r['stats']['timeouts'] for r in completed),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Measure TCP transfers over simulated links, ' + \
+                    'in virtual time, across a pool of processes.  ' + \
+                    'Every combination of the values given for the ' + \
+                    'link and socket options is a configuration.')
+    parser.add_argument('--delay', '-d',
+            action='store', type=float, nargs='+', default=[0.02],
+            help='One-way propagation delay, in seconds')
+    parser.add_argument('--bandwidth', '-b',
+            action='store', type=float, nargs='+', default=[10e6],
+            help='Link bandwidth, in bits per second')
+    parser.add_argument('--loss', '-l',
+            action='store', type=float, nargs='+', default=[0.0, 0.01],
+            help='Probability that a segment is lost')
+    parser.add_argument('--reorder', '-r',
+            action='store', type=float, nargs='+', default=[0.0],
+            help='Probability that a segment is delayed past later ones')
+    parser.add_argument('--queue', '-q',
+            action='store', type=int, nargs='+', default=[100],
+            help='Number of segments the link can queue')
+    parser.add_argument('--congestion-control', '-c',
+            action='store', nargs='+', default=['reno', 'cubic'],
+            help='Congestion control algorithm')
+    parser.add_argument('--sack',
+            action='store', type=int, nargs='+', default=[0], choices=(0, 1),
+            help='Whether to use SACK (0 or 1)')
+    parser.add_argument('--receive-window', '-w',
+            action='store', type=int, nargs='+', default=[256 * 1024],
+            help='Receive window, in bytes')
+    parser.add_argument('--size', '-s',
+            action='store', type=int, default=200000,
+            help='Bytes sent in each transfer')
+    parser.add_argument('--transfers', '-n',
+            action='store', type=int, default=50,
+            help='Number of transfers (each with its own seed) per ' + \
+                    'configuration')
+    parser.add_argument('--timeout', '-t',
+            action='store', type=float, default=300.0,
+            help='Virtual seconds after which a transfer is abandoned')
+    parser.add_argument('--processes', '-p',
+            action='store', type=int, default=os.cpu_count(),
+            help='Number of worker processes')
+    args = parser.parse_args(sys.argv[1:])
+
+    names = LINK_OPTIONS + SOCKET_OPTIONS
+    configs = [dict(zip(names, values)) for values in itertools.product(
+        *(getattr(args, name) for name in names))]
+    for config in configs:
+        config['sack'] = bool(config['sack'])
+    jobs = [(config, args.size, seed, args.timeout)
+            for config in configs for seed in range(args.transfers)]
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(args.processes) as executor:
+        results = list(executor.map(run_transfer, jobs,
+            chunksize=max(len(jobs) // (4 * args.processes), 1)))
+    elapsed = time.perf_counter() - start
+
+    print(f'{"delay":>6s} {"Mbit/s":>7s} {"loss":>6s} {"reord":>6s} ' + \
+            f'{"queue":>5s} {"cc":>7s} {"sack":>4s} {"rwnd":>7s} | ' + \
+            f'{"done":>5s} {"goodput":>8s} {"t_p50":>7s} {"t_p95":>7s} ' + \
+            f'{"rexmit":>7s} {"rto":>5s}')
+    for i, config in enumerate(configs):
+        summary = summarize(
+                results[i * args.transfers:(i + 1) * args.transfers],
+                args.size)
+        line = f'{config["delay"]:6.3f} {config["bandwidth"] / 1e6:7.1f} ' + \
+                f'{config["loss"]:6.3f} {config["reorder"]:6.3f} ' + \
+                f'{config["queue"]:5d} {config["congestion_control"]:>7s} ' + \
+                f'{config["sack"]:4d} {config["receive_window"]:7d} | ' + \
+                f'{summary["completed"]:5d}'
+        if summary['completed']:
+            line += f' {summary["goodput"]:8.2f} ' + \
+                    f'{summary["time_p50"]:7.3f} ' + \
+                    f'{summary["time_p95"]:7.3f} ' + \
+                    f'{summary["retransmits"]:7.1f} ' + \
+                    f'{summary["timeouts"]:5.1f}'
+        print(line)
+    print(f'{len(jobs)} transfers of {args.size} bytes in ' + \
+            f'{elapsed:.2f} s ({len(jobs) / elapsed:,.1f} transfers/sec, ' + \
+            f'{args.processes} processes)')
+
+if __name__ == '__main__':
+    main()
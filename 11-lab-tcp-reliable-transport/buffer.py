@@ -1,36 +1,470 @@
+import bisect
+import collections
+
+
 class TCPSendBuffer(object):
+    '''
+    A send buffer that holds the bytes between base_seq (the first
+    unacknowledged byte) and last_seq (the byte after the last byte put in
+    the buffer).  Data is kept as the chunks that were passed to put(),
+    rather than one contiguous bytes object, so that put() and slide() never
+    copy buffered data, and get() and get_for_resend() return zero-copy
+    memoryview slices whenever a segment falls within a single chunk.
+    '''
+
+    # Compact the chunk list once more than this many chunks at the front have
+    # been fully acknowledged.
+    COMPACT_THRESHOLD = 64
+
     def __init__(self, seq: int):
-        self.buffer = b''
         self.base_seq = seq
         self.next_seq = self.base_seq
         self.last_seq = self.base_seq
 
+        # _chunks[i] holds bytes beginning at sequence number _starts[i].
+        # Chunks before index _head have been fully acknowledged and are only
+        # waiting to be compacted away.
+        self._chunks = []
+        self._starts = []
+        self._head = 0
+
+    @property
+    def buffer(self) -> bytes:
+        '''
+        All bytes from base_seq up to last_seq, as a single bytes object.  This
+        copies the buffered data and is meant for inspection and testing only.
+        '''
+
+        return bytes(self._read(self.base_seq, self.last_seq - self.base_seq))
+
     def bytes_not_yet_sent(self) -> int:
-        pass
+        return self.last_seq - self.next_seq
 
     def bytes_outstanding(self) -> int:
-        pass
+        return self.next_seq - self.base_seq
 
     def put(self, data: bytes) -> int:
-        pass
+        if not data:
+            return 0
+        if not isinstance(data, bytes):
+            # mutable buffers could change underneath us
+            data = bytes(data)
+        self._chunks.append(data)
+        self._starts.append(self.last_seq)
+        self.last_seq += len(data)
+        return len(data)
+
+    def _read(self, seq: int, size: int) -> bytes:
+        '''
+        Return (at most) size bytes starting at sequence number seq, which must
+        be within the buffer.  The result is a memoryview into a single chunk
+        when possible; otherwise the bytes are joined from consecutive chunks.
+        '''
+
+        size = min(size, self.last_seq - seq)
+        if size <= 0:
+            return b''
+
+        i = bisect.bisect_right(self._starts, seq, self._head) - 1
+        chunk = self._chunks[i]
+        offset = seq - self._starts[i]
+        if offset + size <= len(chunk):
+            return memoryview(chunk)[offset:offset + size]
+
+        parts = [memoryview(chunk)[offset:]]
+        remaining = size - len(parts[0])
+        while remaining > 0:
+            i += 1
+            chunk = self._chunks[i]
+            parts.append(memoryview(chunk)[:remaining])
+            remaining -= len(parts[-1])
+        return b''.join(parts)
 
     def get(self, size: int) -> tuple[bytes, int]:
-        pass
+        seq = self.next_seq
+        data = self._read(seq, size)
+        self.next_seq += len(data)
+        return data, seq
+
+    def peek(self, size: int) -> tuple[bytes, int]:
+        '''
+        Return (at most) size bytes that have not yet been sent, like get(),
+        but without marking them sent, e.g., for a zero-window probe.
+        '''
+
+        return self._read(self.next_seq, size), self.next_seq
 
     def get_for_resend(self, size: int) -> tuple[bytes, int]:
-        pass
+        size = min(size, self.next_seq - self.base_seq)
+        return self._read(self.base_seq, size), self.base_seq
+
+    def get_at(self, sequence: int, size: int) -> tuple[bytes, int]:
+        '''
+        Return (at most) size bytes that have already been sent, starting at
+        the specified sequence number, e.g., to retransmit a hole reported by
+        SACK.
+        '''
+
+        sequence = max(sequence, self.base_seq)
+        size = min(size, self.next_seq - sequence)
+        return self._read(sequence, size), sequence
 
     def slide(self, sequence: int) -> None:
-        pass
+        if sequence <= self.base_seq:
+            return
+        self.base_seq = min(sequence, self.last_seq)
+        self.next_seq = max(self.next_seq, self.base_seq)
+
+        # drop references to chunks that have been fully acknowledged
+        chunks = self._chunks
+        starts = self._starts
+        head = self._head
+        while head < len(chunks) and \
+                starts[head] + len(chunks[head]) <= self.base_seq:
+            chunks[head] = None
+            head += 1
+        if head > self.COMPACT_THRESHOLD and head > len(chunks) // 2:
+            del chunks[:head]
+            del starts[:head]
+            head = 0
+        self._head = head
 
 
 class TCPReceiveBuffer(object):
+    '''
+    A receive buffer that holds segments received out of order until the
+    bytes starting at base_seq are available.  Segments are kept in the
+    buffer dictionary, keyed by starting sequence number, with overlapping
+    bytes trimmed on insert so that the stored segments never overlap.  The
+    starting sequence numbers are also kept in a sorted list, so that a
+    segment is placed with a binary search rather than a scan of every
+    buffered segment, and get() only visits the segments it returns.
+    '''
+
     def __init__(self, seq: int):
         self.buffer = {}
         self.base_seq = seq
+        self._starts = []
+
+        # A sequence number within the most recently buffered segment, which
+        # is reported in the first SACK block
+        self._recent = None
 
     def put(self, data: bytes, sequence: int) -> None:
-        pass
+        end = sequence + len(data)
+        if end <= self.base_seq:
+            # old data
+            return
+        if sequence < self.base_seq:
+            data = data[self.base_seq - sequence:]
+            sequence = self.base_seq
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        starts = self._starts
+        buf = self.buffer
+
+        # trim bytes already covered by the preceding segment
+        i = bisect.bisect_left(starts, sequence)
+        if i > 0:
+            prev_end = starts[i - 1] + len(buf[starts[i - 1]])
+            if prev_end >= end:
+                return
+            if prev_end > sequence:
+                data = data[prev_end - sequence:]
+                sequence = prev_end
+
+        if i < len(starts) and starts[i] == sequence:
+            # keep only the longer of two segments with the same start
+            if len(buf[sequence]) >= len(data):
+                return
+        else:
+            starts.insert(i, sequence)
+        buf[sequence] = data
+        self._recent = sequence
+
+        # trim (or remove) the following segments covered by this one
+        j = i + 1
+        while j < len(starts) and starts[j] < end:
+            nxt = buf.pop(starts[j])
+            nxt_end = starts[j] + len(nxt)
+            if nxt_end > end:
+                buf[end] = nxt[end - starts[j]:]
+                starts[j] = end
+                break
+            j += 1
+        del starts[i + 1:j]
 
     def get(self) -> tuple[bytes, int]:
-        pass
+        start = self.base_seq
+        starts = self._starts
+        buf = self.buffer
+        chunks = []
+        i = 0
+        while i < len(starts) and starts[i] == self.base_seq:
+            chunk = buf.pop(starts[i])
+            chunks.append(chunk)
+            self.base_seq += len(chunk)
+            i += 1
+        del starts[:i]
+        return b''.join(chunks), start
+
+    def _block(self, i: int) -> tuple[int, int]:
+        '''
+        Return the indexes (into _starts) of the first and last of the
+        contiguous segments that include the segment at index i.
+        '''
+
+        starts = self._starts
+        buf = self.buffer
+        lo = i
+        while lo > 0 and \
+                starts[lo - 1] + len(buf[starts[lo - 1]]) == starts[lo]:
+            lo -= 1
+        hi = i
+        while hi < len(starts) - 1 and \
+                starts[hi] + len(buf[starts[hi]]) == starts[hi + 1]:
+            hi += 1
+        return lo, hi
+
+    def sack_blocks(self, max_blocks: int) -> list[tuple[int, int]]:
+        '''
+        Return (at most) max_blocks SACK blocks, as (left edge, right edge)
+        tuples, describing the data buffered beyond base_seq.  The first block
+        contains the most recently received segment; the rest are the highest
+        blocks (RFC 2018, Section 4).
+        '''
+
+        starts = self._starts
+        buf = self.buffer
+        blocks = []
+        if not starts or max_blocks <= 0:
+            return blocks
+
+        first = None
+        if self._recent is not None and self._recent >= starts[0]:
+            i = bisect.bisect_right(starts, self._recent) - 1
+            lo, hi = self._block(i)
+            first = (starts[lo], starts[hi] + len(buf[starts[hi]]))
+            blocks.append(first)
+
+        j = len(starts) - 1
+        while j >= 0 and len(blocks) < max_blocks:
+            lo, hi = self._block(j)
+            block = (starts[lo], starts[hi] + len(buf[starts[hi]]))
+            if block != first:
+                blocks.append(block)
+            j = lo - 1
+        return blocks
+
+
+class TCPScoreboard(object):
+    '''
+    The sender's record of the sequence numbers that the receiver has
+    selectively acknowledged (RFC 6675), kept as sorted, disjoint
+    [left, right) ranges above the cumulative acknowledgment.
+    '''
+
+    def __init__(self):
+        self._lefts = []
+        self._rights = []
+        self.sacked_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._lefts)
+
+    def clear(self) -> None:
+        self._lefts.clear()
+        self._rights.clear()
+        self.sacked_bytes = 0
+
+    def update(self, blocks: list[tuple[int, int]], base_seq: int,
+            next_seq: int) -> None:
+        '''
+        Record the SACK blocks from an ACK, ignoring anything outside the
+        range of data that is outstanding, [base_seq, next_seq).
+        '''
+
+        lefts = self._lefts
+        rights = self._rights
+        for left, right in blocks:
+            left = max(left, base_seq)
+            right = min(right, next_seq)
+            if left >= right:
+                continue
+
+            # merge with every range that overlaps or touches this one
+            i = bisect.bisect_left(rights, left)
+            j = bisect.bisect_right(lefts, right)
+            if i < j:
+                left = min(left, lefts[i])
+                right = max(right, rights[j - 1])
+                for k in range(i, j):
+                    self.sacked_bytes -= rights[k] - lefts[k]
+            lefts[i:j] = [left]
+            rights[i:j] = [right]
+            self.sacked_bytes += right - left
+
+    def slide(self, base_seq: int) -> None:
+        '''
+        Forget everything below base_seq, which is now cumulatively
+        acknowledged.
+        '''
+
+        lefts = self._lefts
+        rights = self._rights
+        i = bisect.bisect_right(rights, base_seq)
+        for k in range(i):
+            self.sacked_bytes -= rights[k] - lefts[k]
+        del lefts[:i]
+        del rights[:i]
+        if lefts and lefts[0] < base_seq:
+            self.sacked_bytes -= base_seq - lefts[0]
+            lefts[0] = base_seq
+
+    def is_sacked(self, sequence: int) -> bool:
+        i = bisect.bisect_right(self._lefts, sequence) - 1
+        return i >= 0 and sequence < self._rights[i]
+
+    def sacked_between(self, start: int, end: int) -> int:
+        '''
+        Return the number of SACKed bytes in [start, end).
+        '''
+
+        lefts = self._lefts
+        rights = self._rights
+        total = 0
+        i = max(bisect.bisect_right(lefts, start) - 1, 0)
+        while i < len(lefts) and lefts[i] < end:
+            total += max(min(rights[i], end) - max(lefts[i], start), 0)
+            i += 1
+        return total
+
+    def lost_boundary(self, mss: int, dup_thresh: int=3) -> int:
+        '''
+        Return the sequence number below which every byte not yet SACKed is
+        considered lost, because either dup_thresh discontiguous ranges, or
+        more than (dup_thresh - 1) * mss bytes, have been SACKed above it
+        (IsLost() in RFC 6675).  Return None if no byte is considered lost.
+        '''
+
+        lefts = self._lefts
+        rights = self._rights
+        sacked = 0
+        for count, i in enumerate(range(len(lefts) - 1, -1, -1), 1):
+            sacked += rights[i] - lefts[i]
+            if count >= dup_thresh or sacked > (dup_thresh - 1) * mss:
+                return lefts[i]
+        return None
+
+    def next_hole(self, sequence: int, end: int) -> tuple[int, int]:
+        '''
+        Return the first range, [start, stop), of bytes that have not been
+        SACKed, at or after sequence and before end, or None if there is none.
+        '''
+
+        lefts = self._lefts
+        rights = self._rights
+        i = bisect.bisect_right(lefts, sequence) - 1
+        if i >= 0 and sequence < rights[i]:
+            sequence = rights[i]
+        i += 1
+        if sequence >= end:
+            return None
+        if i < len(lefts):
+            end = min(end, lefts[i])
+        return sequence, end
+
+
+class TCPReadyBuffer(object):
+    '''
+    A buffer of in-order bytes that are ready to be read by the application.
+    The bytes are kept as the chunks in which they were delivered by the
+    receive buffer, with an offset into the first chunk, so that reading part
+    of the buffer never copies the bytes that remain unread.
+    '''
+
+    def __init__(self):
+        self._chunks = collections.deque()
+        self._offset = 0
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def put(self, data: bytes) -> None:
+        if data:
+            self._chunks.append(data)
+            self._len += len(data)
+
+    def _consume(self, num: int):
+        '''
+        Remove (at most) num bytes from the front of the buffer, yielding them
+        as memoryview slices of the buffered chunks.
+        '''
+
+        chunks = self._chunks
+        while num > 0 and chunks:
+            chunk = chunks[0]
+            end = min(len(chunk), self._offset + num)
+            yield memoryview(chunk)[self._offset:end]
+            num -= end - self._offset
+            self._len -= end - self._offset
+            if end == len(chunk):
+                chunks.popleft()
+                self._offset = 0
+            else:
+                self._offset = end
+
+    def get(self, num: int) -> bytes:
+        '''
+        Remove and return (at most) num bytes from the front of the buffer.
+        '''
+
+        chunks = self._chunks
+        if chunks and self._offset == 0 and len(chunks[0]) == num:
+            # the common case of reading exactly one whole chunk
+            self._len -= num
+            return chunks.popleft()
+        return b''.join(self._consume(num))
+
+    def get_into(self, buffer, nbytes: int=0) -> int:
+        '''
+        Remove (at most) nbytes from the front of the buffer, copying them
+        into the writable bytes-like object buffer.  If nbytes is 0, fill as
+        much of buffer as possible.  Return the number of bytes copied.
+        '''
+
+        view = memoryview(buffer).cast('B')
+        if not nbytes or nbytes > len(view):
+            nbytes = len(view)
+        i = 0
+        for part in self._consume(nbytes):
+            view[i:i + len(part)] = part
+            i += len(part)
+        return i
+
+    def get_exactly(self, num: int) -> bytes:
+        '''
+        Remove and return exactly num bytes from the front of the buffer, or
+        return None, leaving the buffer untouched, if fewer than num bytes are
+        buffered.
+        '''
+
+        if num > self._len:
+            return None
+        return self.get(num)
+
+    def get_all(self) -> list[bytes]:
+        '''
+        Remove and return all buffered bytes, as the list of chunks in which
+        they were delivered.
+        '''
+
+        chunks = list(self._chunks)
+        if chunks and self._offset:
+            chunks[0] = chunks[0][self._offset:]
+        self._chunks.clear()
+        self._offset = 0
+        self._len = 0
+        return chunks
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+
+from cougarnet.util import ip_str_to_binary
+
+from mysocket import TCPTimeWait, TCP_FLAGS_SYN, TCP_STATE_TIME_WAIT, \
+        TCP_TIME_WAIT_TIMEOUT
+from timerwheel import TimerWheel
+
+TCP_PORT_STRUCT = struct.Struct('!H')
+TCP_PORTS_STRUCT = struct.Struct('!HH')
+
+
+class TCPDemux(object):
+    '''
+    The tables that map incoming TCP segments to sockets.  Segments are
+    looked up by their packed addresses and ports, sliced straight from the
+    packet (as in Host.handle_ip()), without decoding any header fields or
+    formatting any addresses as strings:
+
+     - connections: keyed by the remote address, local address, remote
+       port, and local port, in that order, i.e., the order in which they
+       appear in a segment sent by the remote side.
+     - listeners: keyed by the local address and local port, consulted only
+       when no connection matches, so that a SYN (or any other segment for an
+       unknown connection) reaches the listening socket, if any.
+     - time_wait: connections in TIME_WAIT, keyed like connections, each
+       represented by a TCPTimeWait rather than its socket.  They are
+       consulted after connections (for anything but a SYN, which may start a
+       new incarnation of the connection) and reclaimed once time_wait_timeout
+       seconds have passed, on timer_wheel if there is one.
+    '''
+
+    def __init__(self, timer_wheel: TimerWheel=None,
+            time_wait_timeout: float=TCP_TIME_WAIT_TIMEOUT) -> TCPDemux:
+        self.connections = {}
+        self.time_wait = {}
+        self.listeners = {}
+        self.timer_wheel = timer_wheel
+        self.time_wait_timeout = time_wait_timeout
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    @staticmethod
+    def connection_key(local_addr: str, local_port: int,
+            remote_addr: str, remote_port: int) -> bytes:
+        return ip_str_to_binary(remote_addr) + ip_str_to_binary(local_addr) + \
+                TCP_PORTS_STRUCT.pack(remote_port, local_port)
+
+    @staticmethod
+    def listener_key(local_addr: str, local_port: int) -> bytes:
+        return ip_str_to_binary(local_addr) + TCP_PORT_STRUCT.pack(local_port)
+
+    def add_connection(self, local_addr: str, local_port: int,
+            remote_addr: str, remote_port: int, sock: TCPSocketBase) -> None:
+        self.connections[self.connection_key(local_addr, local_port,
+                remote_addr, remote_port)] = sock
+
+    def add_listener(self, local_addr: str, local_port: int,
+            sock: TCPSocketBase) -> None:
+        self.listeners[self.listener_key(local_addr, local_port)] = sock
+
+    def release(self, sock: TCPSocket) -> None:
+        '''
+        Remove the socket for a connection that has been closed.  If it is in
+        TIME_WAIT, a TCPTimeWait takes its place until time_wait_timeout
+        expires.  This is the release_func of installed sockets.
+        '''
+
+        key = self.connection_key(sock._local_addr, sock._local_port,
+                sock._remote_addr, sock._remote_port)
+        if self.connections.get(key) is sock:
+            del self.connections[key]
+        if sock.state != TCP_STATE_TIME_WAIT:
+            return
+
+        entry = TCPTimeWait(sock)
+        self.time_wait[key] = entry
+        if self.timer_wheel is not None:
+            entry.timer = self.timer_wheel.schedule(self.time_wait_timeout,
+                    self.reclaim_time_wait, key, entry)
+        else:
+            loop = asyncio.get_event_loop()
+            entry.timer = loop.call_later(self.time_wait_timeout,
+                    self.reclaim_time_wait, key, entry)
+
+    def stats(self) -> dict:
+        '''
+        Return a snapshot of every socket: the stats() of each connection,
+        keyed by its local address, local port, remote address, and remote
+        port; the stats() of each listener, keyed by its local address and
+        local port; and the number of connections in TIME_WAIT.  Nothing is
+        kept between snapshots, so this costs nothing until it is called.
+        '''
+
+        return {
+                'connections': {
+                    (sock._local_addr, sock._local_port,
+                        sock._remote_addr, sock._remote_port): sock.stats()
+                    for sock in self.connections.values() },
+                'listeners': {
+                    (sock._local_addr, sock._local_port): sock.stats()
+                    for sock in self.listeners.values() },
+                'time_wait': len(self.time_wait),
+        }
+
+    def reclaim_time_wait(self, key: bytes, entry: TCPTimeWait) -> None:
+        # the connection may since have entered TIME_WAIT again
+        if self.time_wait.get(key) is entry:
+            del self.time_wait[key]
+
+    def lookup(self, pkt: bytes) -> TCPSocketBase:
+        '''
+        Return the socket to which the TCP segment in the IP packet pkt
+        belongs: the socket for its connection, if any, or else its entry in
+        time_wait, if any, or else the socket listening on its destination
+        address and port, if any, or else None.
+        '''
+
+        if pkt[0] >> 4 == 6:
+            # addresses at 8-40, followed directly by the ports (and, at 53,
+            # the TCP flags)
+            sock = self.connections.get(pkt[8:44])
+            if sock is None and self.time_wait and \
+                    not pkt[53] & TCP_FLAGS_SYN:
+                sock = self.time_wait.get(pkt[8:44])
+            if sock is None:
+                sock = self.listeners.get(pkt[24:40] + pkt[42:44])
+            return sock
+
+        hdr_len = (pkt[0] & 0x0f) << 2
+        if hdr_len == 20:
+            key = pkt[12:24]
+        else:
+            key = pkt[12:20] + pkt[hdr_len:hdr_len + 4]
+        sock = self.connections.get(key)
+        if sock is None and self.time_wait and \
+                not pkt[hdr_len + 13] & TCP_FLAGS_SYN:
+            sock = self.time_wait.get(key)
+        if sock is None:
+            sock = self.listeners.get(pkt[16:20] + \
+                    pkt[hdr_len + 2:hdr_len + 4])
+        return sock
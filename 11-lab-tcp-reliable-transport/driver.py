@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import argparse
 import os
 import re
 import signal
@@ -10,18 +11,33 @@ LOG_PREFIX = r'^(?P<time>\d+\.\d+)\s+(?P<hostname>\S+)\s+'
 LOG_START_RE = re.compile(LOG_PREFIX + r'START$')
 LOG_TCP_STATUS_RE = re.compile(LOG_PREFIX + \
         r'(?P<pct>\d+)% has been (?P<action>sent|recvd|acked)')
+LOG_TCP_RETRANSMIT_RE = re.compile(LOG_PREFIX + \
+        r'(?P<count>\d+) segments retransmitted')
+
+# The configuration with segment pacing turned on for each configuration that
+# has one
+PACING_CONFIGS = {
+        'scenario1.cfg': 'scenario1-pacing.cfg',
+        'scenario2.cfg': 'scenario2-pacing.cfg',
+}
 
 class Lab5Tester:
     cmd = []
     maxtime = None
     sha1output = None
     downloads_dir = 'downloads'
+    pacing = False
 
     def evaluate(self, lines):
         tcp_status = {}
         starttime = None
         endtime = None
+        retransmits = None
         for line in lines:
+            m = LOG_TCP_RETRANSMIT_RE.search(line)
+            if m is not None and m.group('hostname') == 'a':
+                retransmits = int(m.group('count'))
+                continue
             m = LOG_START_RE.search(line)
             if m is not None:
                 starttime = float(m.group('time'))
@@ -68,15 +84,21 @@ class Lab5Tester:
             return 0, 1
 
         sys.stderr.write('Finished in %f seconds (end time: %f)\n' % (duration, endtime))
+        if retransmits is not None:
+            sys.stderr.write('%d segments retransmitted\n' % retransmits)
 
         return 1, 1
 
     def run(self):
-        sys.stderr.write('running %s\n' % self.cmd)
+        cmd = self.cmd[:]
+        if self.pacing:
+            # the same scenario, with segments paced
+            cmd[-1] = PACING_CONFIGS[cmd[-1]]
+        sys.stderr.write('running %s\n' % cmd)
 
         p = None
         try:
-            p = subprocess.Popen(self.cmd, stdout=subprocess.PIPE)
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
             p.wait()
         except KeyboardInterrupt:
             p.send_signal(signal.SIGINT)
@@ -152,9 +174,23 @@ class Scenario8(Lab5Tester):
     maxtime = 30
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pacing',
+            action='store_const', const=True, default=False,
+            help='Run each scenario with segment pacing enabled')
+    args = parser.parse_args(sys.argv[1:])
+    Lab5Tester.pacing = args.pacing
+
+    scenarios = (Scenario1, Scenario2, Scenario3, Scenario4,
+                 Scenario5, Scenario6, Scenario7, Scenario8)
+    if args.pacing:
+        for scenario in scenarios:
+            if scenario.cmd[-1] not in PACING_CONFIGS:
+                parser.error(f'{scenario.__name__} ({scenario.cmd[-1]}) ' \
+                        'cannot be run with pacing')
+
     try:
-        for scenario in (Scenario1, Scenario2, Scenario3, Scenario4,
-                         Scenario5, Scenario6, Scenario7, Scenario8):
+        for scenario in scenarios:
             print(f'Running {scenario.__name__}...')
             tester = scenario()
             success, total = tester.run()
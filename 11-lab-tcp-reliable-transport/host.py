@@ -12,6 +12,7 @@ from cougarnet.util import \
 # From /usr/include/linux/if_ether.h:
 ETH_P_IP = 0x0800 # Internet Protocol packet
 ETH_P_ARP = 0x0806 # Address Resolution packet
+ETH_P_IPV6 = 0x86DD # IPv6 over bluebook
 
 # From /usr/include/net/if_arp.h:
 ARPHRD_ETHER = 1 # Ethernet 10Mbps
@@ -34,11 +35,18 @@ class Host(BaseHost):
         self.handle_ip(pkt, intf)
 
     def handle_ip(self, pkt: bytes, intf: str) -> None:
-        proto = pkt[9]
-        dst = ip_binary_to_str(pkt[16:20])
-        if not self.ipv4_addresses(intf) or \
-                dst != self.ipv4_address_single(intf):
-            return
+        if pkt[0] >> 4 == 6:
+            # IPv6: next header and destination address
+            proto = pkt[6]
+            dst = ip_binary_to_str(pkt[24:40])
+            if dst not in self.ipv6_addresses(intf):
+                return
+        else:
+            proto = pkt[9]
+            dst = ip_binary_to_str(pkt[16:20])
+            if not self.ipv4_addresses(intf) or \
+                    dst != self.ipv4_address_single(intf):
+                return
         if proto == IPPROTO_TCP:
             self.handle_tcp(pkt)
         elif proto == IPPROTO_UDP:
@@ -53,7 +61,11 @@ class Host(BaseHost):
     def send_packet_on_int(self, pkt: bytes, intf: str, next_hop: str) -> None:
         src = mac_str_to_binary(self.interface_info_single(intf)['address'])
         dst = b'\xff\xff\xff\xff\xff\xff'
-        frame = dst + src + struct.pack('!H', ETH_P_IP) + pkt
+        if pkt[0] >> 4 == 6:
+            ethertype = ETH_P_IPV6
+        else:
+            ethertype = ETH_P_IP
+        frame = dst + src + struct.pack('!H', ethertype) + pkt
         self.send_frame(frame, intf)
 
     def send_packet(self, pkt: bytes) -> None:
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import array
 import asyncio
+import collections
+import hashlib
+import os
 import random
+import struct
 
+TCP_FLAGS_FIN = 0x01
 TCP_FLAGS_SYN = 0x02
 TCP_FLAGS_RST = 0x04
 TCP_FLAGS_ACK = 0x10
@@ -19,60 +25,240 @@ TCP_STATE_LAST_ACK = 8
 TCP_STATE_TIME_WAIT = 9
 TCP_STATE_CLOSED = 10
 
-from buffer import TCPSendBuffer, TCPReceiveBuffer
-
-from headers import IPv4Header, UDPHeader, TCPHeader, \
-        IP_HEADER_LEN, UDP_HEADER_LEN, TCP_HEADER_LEN, \
-        TCPIP_HEADER_LEN, UDPIP_HEADER_LEN
+# The states in which the handshake is complete and the connection is not yet
+# fully closed, i.e., in which segments are checked against the sequence
+# numbers of the connection (the "synchronized" states of RFC 793), except
+# TIME_WAIT
+TCP_SYNCHRONIZED_STATES = frozenset((TCP_STATE_ESTABLISHED,
+        TCP_STATE_FIN_WAIT_1, TCP_STATE_FIN_WAIT_2, TCP_STATE_CLOSE_WAIT,
+        TCP_STATE_CLOSING, TCP_STATE_LAST_ACK))
+
+# Values for the how argument of TCPSocket.shutdown(), as in the socket module
+SHUT_RD = 0
+SHUT_WR = 1
+SHUT_RDWR = 2
+
+from buffer import TCPSendBuffer, TCPReceiveBuffer, TCPReadyBuffer, \
+        TCPScoreboard
+from congestion import create_congestion_control
+from tcptrace import TCP_TRACE_SEND, TCP_TRACE_ACK, TCP_TRACE_DUP_ACK, \
+        TCP_TRACE_FAST_RETRANSMIT, TCP_TRACE_TIMEOUT
+from timerwheel import TimerWheel
+
+from headers import UDPHeader, TCPHeader, \
+        IPv4HeaderView, TCPHeaderView, \
+        UDP_HEADER_LEN, TCP_HEADER_LEN, UDPIP_HEADER_LEN, \
+        TCP_RECEIVE_WINDOW, TCP_MAX_WINDOW_SCALE, TCP_MAX_SACK_BLOCKS, \
+        TCP_CHECKSUM_OFFSET, UDP_CHECKSUM_OFFSET, \
+        create_ip_header, ip_header_len, ip_header_view, \
+        fill_transport_checksum
 
 
 #From /usr/include/linux/in.h:
 IPPROTO_TCP = 6 # Transmission Control Protocol
 IPPROTO_UDP = 17 # User Datagram Protocol
 
+# TTL (or hop limit) for newly-created IP packets
+DEFAULT_TTL = 64
+
+# The number of datagrams a UDPSocket queues for the application, by default,
+# before it drops new ones
+UDP_DEFAULT_QUEUE_LEN = 256
+
+# Bytes we are willing to have in flight toward us, by default.  This is more
+# than the 16-bit window field can hold, so it is advertised using the window
+# scale option (RFC 7323), if the peer supports it.
+TCP_DEFAULT_RECEIVE_WINDOW = 1 << 20
+
+# Retransmission timeout (RFC 6298): the initial value, the bounds within which
+# it is kept, and the clock granularity, G, all in seconds.  The lower bound is
+# well below the 1 second recommended by RFC 6298 (as in Linux), so that losses
+# on short paths are recovered quickly.
+TCP_INITIAL_RTO = 1.0
+TCP_MIN_RTO = 0.2
+TCP_MAX_RTO = 60.0
+TCP_CLOCK_GRANULARITY = 0.001
+
+# How many times a SYN is retransmitted (with the timeout doubled each time)
+# before the connection is given up on, and likewise a listener's SYNACK
+# before the half-open connection is dropped, as with Linux's tcp_syn_retries
+# and tcp_synack_retries; and the retransmission timeout once data
+# transmission begins if the SYN had to be retransmitted (RFC 6298, Section
+# 5.7)
+TCP_SYN_RETRIES = 6
+TCP_SYNACK_RETRIES = 5
+TCP_SYN_LOSS_RTO = 3.0
+
+# The longest an ACK is delayed, in seconds, when delayed ACKs are enabled.
+# RFC 5681 allows up to 500 ms; this is the (minimum) value used by Linux.
+TCP_DELAYED_ACK_TIMEOUT = 0.04
+
+# The pacing rate, as a multiple of cwnd/SRTT, in slow start and in congestion
+# avoidance (the ratios used by Linux).  Pacing slightly faster than one window
+# per RTT keeps the pacer from holding back the growth of the window.
+TCP_PACING_SS_RATIO = 2.0
+TCP_PACING_CA_RATIO = 1.2
+
+# The default limits on the number of half-open connections (SYN received,
+# SYNACK sent) for which a listener keeps state, and on the number of
+# established connections waiting to be accepted
+TCP_DEFAULT_SYN_BACKLOG = 128
+TCP_DEFAULT_BACKLOG = 128
+
+# SYN cookies: the MSS values that a cookie can encode, and the period, in
+# seconds, of the counter that limits how long a cookie is valid
+TCP_SYN_COOKIE_MSS = (536, 1000, 1220, 1440, 1460, 4312, 8960)
+TCP_SYN_COOKIE_PERIOD = 64
+TCP_SYN_COOKIE_STRUCT = struct.Struct('!HHIB')
+
+# How long, in seconds, a connection remains in TIME_WAIT after it is closed:
+# twice the maximum segment lifetime (MSL), with the 30-second MSL of Linux
+TCP_TIME_WAIT_TIMEOUT = 60.0
+
+def _ignore_notification() -> None:
+    pass
+
 class UDPSocket:
     def __init__(self, local_addr: str, local_port: int,
             send_ip_packet_func: callable,
-            notify_on_data_func: callable) -> UDPSocket:
+            notify_on_data_func: callable,
+            queue_len: int=UDP_DEFAULT_QUEUE_LEN,
+            edge_triggered: bool=False) -> UDPSocket:
 
         self._local_addr = local_addr
         self._local_port = local_port
         self._send_ip_packet = send_ip_packet_func
+
+        # The function called when a datagram arrives, so that the
+        # application can read it with recvfrom().  If edge_triggered is
+        # True, it is only called when a datagram arrives to an empty queue,
+        # so the application must then read everything (e.g., with
+        # recvfrom_many()) each time.
         self._notify_on_data = notify_on_data_func
+        self.edge_triggered = edge_triggered
+
+        # The queue of (data, remote address, remote port) tuples not yet
+        # read.  Once it holds queue_len datagrams, new ones are dropped.
+        self.buffer = collections.deque(maxlen=queue_len)
 
-        self.buffer = []
+        # The number of datagrams received, and the number dropped because
+        # the queue was full
+        self.datagrams_received = 0
+        self.datagrams_dropped = 0
 
     def handle_packet(self, pkt: bytes) -> None:
-        self.buffer.append((b'', '0.0.0.0', 0))
-        self._notify_on_data()
+        self.datagrams_received += 1
+        buf = self.buffer
+        if len(buf) == buf.maxlen:
+            self.datagrams_dropped += 1
+            return
+
+        ip_hdr = ip_header_view(pkt)
+        udp_hdr = UDPHeader.unpack_from(pkt, ip_hdr.header_len)
+        data = pkt[ip_hdr.header_len + UDP_HEADER_LEN:]
+
+        buf.append((data, ip_hdr.src, udp_hdr.sport))
+        if len(buf) == 1 or not self.edge_triggered:
+            self._notify_on_data()
 
     @classmethod
     def create_packet(cls, src: str, sport: int, dst: str, dport: int,
             data: bytes=b'') -> bytes:
-        pass
+        length = UDP_HEADER_LEN + len(data)
+        udp_hdr = UDPHeader(sport, dport, length, 0)
+        ip_hdr = create_ip_header(src, dst, IPPROTO_UDP, length, DEFAULT_TTL)
+        ip_hdr_len = ip_hdr.header_len
+
+        pkt = bytearray(ip_hdr_len + length)
+        ip_hdr.pack_into(pkt)
+        udp_hdr.pack_into(pkt, ip_hdr_len)
+        pkt[ip_hdr_len + UDP_HEADER_LEN:] = data
+        fill_transport_checksum(pkt, ip_hdr, UDP_CHECKSUM_OFFSET)
+        return bytes(pkt)
 
     def send_packet(self, remote_addr: str, remote_port: int,
             data: bytes) -> None:
-        pass
+        pkt = self.create_packet(self._local_addr, self._local_port,
+                remote_addr, remote_port, data)
+        self._send_ip_packet(pkt)
 
     def recvfrom(self) -> tuple[bytes, str, int]:
-        return self.buffer.pop(0)
+        '''
+        Remove and return the oldest datagram, as a (data, remote address,
+        remote port) tuple, or None if none is queued.
+        '''
+
+        if not self.buffer:
+            return None
+        return self.buffer.popleft()
+
+    def recvfrom_many(self, num: int) -> list[tuple[bytes, str, int]]:
+        '''
+        Remove and return (at most) num datagrams, oldest first, each as a
+        (data, remote address, remote port) tuple.
+        '''
+
+        buf = self.buffer
+        if num >= len(buf):
+            datagrams = list(buf)
+            buf.clear()
+            return datagrams
+        return [buf.popleft() for _ in range(num)]
 
     def sendto(self, data: bytes, remote_addr: str, remote_port: int) -> None:
         self.send_packet(remote_addr, remote_port, data)
 
 
 class TCPSocketBase:
+    # Subclasses that keep many instances around (see TCPTimeWait) can do
+    # without a per-instance __dict__.
+    __slots__ = ()
+
+    # The host's shared TimerWheel, if any (see use_timer_wheel())
+    timer_wheel = None
+
+    # The function, if any, that the socket calls with itself as its argument
+    # once the connection is closed (or enters TIME_WAIT), so that the host
+    # can remove it from its tables.  This is set by the host when the socket
+    # is installed.
+    release_func = None
+
     def handle_packet(self, pkt: bytes) -> None:
         pass
 
+    def use_timer_wheel(self, timer_wheel: TimerWheel) -> None:
+        '''
+        Schedule this socket's timers on the specified TimerWheel rather than
+        directly on the event loop.  This is called by the host when the
+        socket is installed.
+        '''
+
+        self.timer_wheel = timer_wheel
+
+    def call_later(self, delay: float, callback: callable, *args):
+        '''
+        Schedule callback(*args) to be called delay seconds from now, on the
+        timer wheel if there is one.  Return a handle with a cancel() method.
+        '''
+
+        if self.timer_wheel is not None:
+            return self.timer_wheel.schedule(delay, callback, *args)
+        loop = asyncio.get_event_loop()
+        return loop.call_later(delay, callback, *args)
+
 class TCPListenerSocket(TCPSocketBase):
     def __init__(self, local_addr: str, local_port: int,
             handle_new_client_func: callable, send_ip_packet_func: callable,
             notify_on_data_func: callable,
             fast_retransmit: bool=False, initial_cwnd: int=1000,
             mss: int=1000,
-            congestion_control: str='none') -> TCPListenerSocket:
+            congestion_control: str='none',
+            receive_window: int=TCP_DEFAULT_RECEIVE_WINDOW,
+            nagle: bool=False, sack: bool=False,
+            delayed_ack: bool=False, pacing: bool=False,
+            syn_backlog: int=TCP_DEFAULT_SYN_BACKLOG, syn_cookies: bool=True,
+            backlog: int=TCP_DEFAULT_BACKLOG,
+            notify_on_accept_func: callable=None) -> TCPListenerSocket:
 
         # These are all vars that are saved away for instantiation of TCPSocket
         # objects when new connections are created.
@@ -87,36 +273,326 @@ class TCPListenerSocket(TCPSocketBase):
         self._initial_cwnd = initial_cwnd
         self._mss = mss
         self._congestion_control = congestion_control
+        self._receive_window = receive_window
+        self._nagle = nagle
+        self._sack = sack
+        self._delayed_ack = delayed_ack
+        self._pacing = pacing
+
+        # Half-open connections: for each (remote address, remote port) from
+        # which a SYN was received, our initial sequence number, the time our
+        # SYNACK was sent (None once it has been retransmitted, as its ACK is
+        # then no RTT sample), the decoded header of the SYN, the number of
+        # times the SYNACK has been retransmitted, and the timer that
+        # retransmits it, with backoff, or eventually drops the entry.  No
+        # socket is created until the handshake completes.  At most
+        # syn_backlog are kept; beyond that, SYNs are answered with SYN
+        # cookies, which need no state at all, or, if syn_cookies is False,
+        # the oldest entry is dropped.
+        self.syn_queue = collections.OrderedDict()
+        self.syn_backlog = syn_backlog
+        self.syn_cookies = syn_cookies
+        self._cookie_secret = os.urandom(16)
+
+        # Established connections not yet returned by accept(), and the
+        # function called whenever one is added.  Connections are only queued
+        # if notify_on_accept_func is given; either way, they are passed to
+        # handle_new_client_func (e.g., to be installed by the host) as soon
+        # as they are established.  While backlog connections are waiting,
+        # the final ACK of any other handshake is ignored.
+        self.accept_queue = collections.deque()
+        self.backlog = backlog
+        self._notify_on_accept = notify_on_accept_func
+
+        self.syn_queue_drops = 0
+        self.syn_queue_timeouts = 0
+        self.syn_cookies_sent = 0
+        self.syn_cookies_accepted = 0
+        self.accept_queue_drops = 0
+
+    def accept(self) -> TCPSocket:
+        '''
+        Return the next established connection waiting to be accepted, or
+        None if there is none.
+        '''
+
+        if self.accept_queue:
+            return self.accept_queue.popleft()
+        return None
+
+    def stats(self) -> dict:
+        '''
+        Return the occupancy of the SYN and accept queues, and the number of
+        handshakes dropped (for want of room or of an answer to our SYNACK) or
+        completed with SYN cookies.
+        '''
+
+        return {
+                'syn_queue': len(self.syn_queue),
+                'accept_queue': len(self.accept_queue),
+                'syn_queue_drops': self.syn_queue_drops,
+                'syn_queue_timeouts': self.syn_queue_timeouts,
+                'syn_cookies_sent': self.syn_cookies_sent,
+                'syn_cookies_accepted': self.syn_cookies_accepted,
+                'accept_queue_drops': self.accept_queue_drops,
+        }
+
+    def initialize_seq(self) -> int:
+        return random.randint(0, 65535)
 
     def handle_packet(self, pkt: bytes) -> None:
-        ip_hdr = IPv4Header.from_bytes(pkt[:IP_HEADER_LEN])
-        tcp_hdr = TCPHeader.from_bytes(pkt[IP_HEADER_LEN:TCPIP_HEADER_LEN])
-        data = pkt[TCPIP_HEADER_LEN:]
+        ip_hdr = ip_header_view(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr.header_len)
+
+        flags = tcp_hdr.flags
+        if flags & TCP_FLAGS_SYN:
+            if not flags & TCP_FLAGS_ACK:
+                self.handle_syn(pkt, ip_hdr)
+        elif flags & TCP_FLAGS_ACK and not flags & TCP_FLAGS_RST:
+            self.handle_ack(pkt, ip_hdr, tcp_hdr)
+
+    def handle_syn(self, pkt: bytes, ip_hdr: IPv4HeaderView) -> None:
+        tcp_hdr = TCPHeader.unpack_from(pkt, ip_hdr.header_len)
+        key = (ip_hdr.src, tcp_hdr.sport)
+        entry = self.syn_queue.get(key)
+        if entry is None or entry[2].seq != tcp_hdr.seq:
+            if entry is not None:
+                # a new connection from the same port replaces the old one
+                entry[4].cancel()
+            elif len(self.syn_queue) >= self.syn_backlog:
+                if self.syn_cookies:
+                    self.send_syn_cookie(ip_hdr, tcp_hdr)
+                    return
+                self.syn_queue.popitem(last=False)[1][4].cancel()
+                self.syn_queue_drops += 1
+            timer = self.call_later(TCP_INITIAL_RTO,
+                    self.handle_synack_timeout, key)
+            entry = (self.initialize_seq(),
+                    asyncio.get_event_loop().time(), tcp_hdr, 0, timer)
+        else:
+            # the SYN was retransmitted, and so is the SYNACK, whose ACK then
+            # cannot be timed (Karn's algorithm)
+            entry = (entry[0], None) + entry[2:]
+        self.syn_queue[key] = entry
+
+        self.send_synack(ip_hdr.src, tcp_hdr, entry[0],
+                self.synack_options(tcp_hdr))
+
+    def handle_synack_timeout(self, key: tuple) -> None:
+        '''
+        Retransmit the SYNACK for the half-open connection with the specified
+        key in syn_queue, doubling the timeout, or drop the connection if the
+        SYNACK has been retransmitted TCP_SYNACK_RETRIES times already.
+        '''
+
+        isn, synack_time, syn_hdr, retries, timer = self.syn_queue[key]
+        if retries >= TCP_SYNACK_RETRIES:
+            del self.syn_queue[key]
+            self.syn_queue_timeouts += 1
+            return
+
+        retries += 1
+        timeout = min(TCP_INITIAL_RTO * 2 ** retries, TCP_MAX_RTO)
+        timer = self.call_later(timeout, self.handle_synack_timeout, key)
+        self.syn_queue[key] = (isn, None, syn_hdr, retries, timer)
+        self.send_synack(key[0], syn_hdr, isn, self.synack_options(syn_hdr))
+
+    def synack_options(self, tcp_hdr: TCPHeader) -> dict:
+        '''
+        Return the TCP options for the SYNACK answering the SYN with the
+        specified header, as TCPSocket.syn_options() would for a socket with
+        this listener's settings.
+        '''
+
+        options = { 'mss': self._mss }
+        if tcp_hdr.wscale is not None:
+            options['wscale'] = TCPSocket.window_scale_for(self._receive_window)
+        if self._sack and tcp_hdr.sack_permitted:
+            options['sack_permitted'] = True
+        return options
+
+    def send_synack(self, remote_addr: str, tcp_hdr: TCPHeader,
+            isn: int, options: dict) -> None:
+        pkt = TCPSocket.create_packet(self._local_addr, self._local_port,
+                remote_addr, tcp_hdr.sport, isn, tcp_hdr.seq + 1,
+                TCP_FLAGS_SYN | TCP_FLAGS_ACK,
+                window=min(self._receive_window, 0xffff), **options)
+        self._send_ip_packet_func(pkt)
+
+    def cookie_counter(self) -> int:
+        return int(asyncio.get_event_loop().time() // TCP_SYN_COOKIE_PERIOD)
+
+    def syn_cookie(self, ip_hdr: IPv4HeaderView, sport: int, seq: int,
+            counter: int, mss_index: int) -> int:
+        '''
+        Return the SYN cookie, i.e., our initial sequence number, for a SYN
+        with sequence number seq from port sport of the source of ip_hdr.
+        From the most significant bit: 0 (the cookie is kept below 2**31,
+        since sequence numbers do not wrap around in this implementation),
+        the low 3 bits of the counter, the index of the MSS in
+        TCP_SYN_COOKIE_MSS (3 bits), and 25 bits of a keyed hash of the
+        above and the addresses and ports of the connection.
+        '''
+
+        counter &= 0x7
+        data = bytes(ip_hdr.src_bin) + bytes(ip_hdr.dst_bin) + \
+                TCP_SYN_COOKIE_STRUCT.pack(sport, self._local_port, seq,
+                        counter << 3 | mss_index)
+        digest = hashlib.blake2s(data, key=self._cookie_secret,
+                digest_size=4).digest()
+        return counter << 28 | mss_index << 25 | \
+                int.from_bytes(digest, 'big') & 0x1ffffff
+
+    def send_syn_cookie(self, ip_hdr: IPv4HeaderView,
+            tcp_hdr: TCPHeader) -> None:
+        '''
+        Answer the SYN with the specified header with a SYNACK whose sequence
+        number is a SYN cookie, keeping no state.  A cookie can only encode
+        the MSS, so neither window scaling nor SACK is offered.
+        '''
 
-        if tcp_hdr.flags & TCP_FLAGS_SYN:
-            sock = TCPSocket(self._local_addr, self._local_port,
-                    ip_hdr.src, tcp_hdr.sport,
-                    TCP_STATE_LISTEN,
-                    send_ip_packet_func=self._send_ip_packet_func,
-                    notify_on_data_func=self._notify_on_data_func,
-                    fast_retransmit=self._fast_retransmit,
-                    initial_cwnd=self._initial_cwnd, mss=self._mss,
-                    congestion_control=self._congestion_control)
+        mss = min(self._mss, tcp_hdr.mss or TCP_SYN_COOKIE_MSS[0])
+        mss_index = 0
+        for i, value in enumerate(TCP_SYN_COOKIE_MSS):
+            if value <= mss:
+                mss_index = i
+        isn = self.syn_cookie(ip_hdr, tcp_hdr.sport, tcp_hdr.seq,
+                self.cookie_counter(), mss_index)
+        self.send_synack(ip_hdr.src, tcp_hdr, isn,
+                { 'mss': TCP_SYN_COOKIE_MSS[mss_index] })
+        self.syn_cookies_sent += 1
+
+    def check_syn_cookie(self, ip_hdr: IPv4HeaderView,
+            tcp_hdr: TCPHeaderView) -> int:
+        '''
+        Return the MSS encoded in the SYN cookie acknowledged by the segment
+        with the specified header, or None if it does not acknowledge a valid
+        cookie from this or the previous counter period.
+        '''
 
-            self._handle_new_client(self._local_addr, self._local_port,
-                    ip_hdr.src, tcp_hdr.sport, sock)
+        isn = tcp_hdr.ack - 1
+        counter = isn >> 28
+        mss_index = isn >> 25 & 0x7
+        if isn < 0 or counter > 0x7 or mss_index >= len(TCP_SYN_COOKIE_MSS):
+            return None
+        current = self.cookie_counter()
+        for c in current, current - 1:
+            if c & 0x7 == counter and isn == self.syn_cookie(ip_hdr,
+                    tcp_hdr.sport, tcp_hdr.seq - 1, c, mss_index):
+                return TCP_SYN_COOKIE_MSS[mss_index]
+        return None
+
+    def handle_ack(self, pkt: bytes, ip_hdr: IPv4HeaderView,
+            tcp_hdr: TCPHeaderView) -> None:
+        '''
+        Complete a handshake, if the segment acknowledges our SYNACK (or SYN
+        cookie): create the socket for the connection, pass it to
+        handle_new_client_func, and queue it to be accepted.
+        '''
 
-            sock.handle_packet(pkt)
+        key = (ip_hdr.src, tcp_hdr.sport)
+        entry = self.syn_queue.get(key)
+        if entry is not None and tcp_hdr.ack == entry[0] + 1:
+            isn, synack_time, syn_hdr = entry[:3]
+        elif self.syn_cookies:
+            mss = self.check_syn_cookie(ip_hdr, tcp_hdr)
+            if mss is None:
+                self._send_ip_packet_func(TCPSocket.create_reset(pkt))
+                return
+            isn = tcp_hdr.ack - 1
+            synack_time = None
+            syn_hdr = TCPHeader(tcp_hdr.sport, tcp_hdr.dport, tcp_hdr.seq - 1,
+                    0, TCP_FLAGS_SYN, 0, tcp_hdr.window, mss=mss)
+            entry = None
+        else:
+            # not part of any connection that we know of
+            self._send_ip_packet_func(TCPSocket.create_reset(pkt))
+            return
+
+        if self._notify_on_accept is not None and \
+                len(self.accept_queue) >= self.backlog:
+            # leave the handshake to be completed by a later segment
+            self.accept_queue_drops += 1
+            return
+        if entry is None:
+            self.syn_cookies_accepted += 1
+        else:
+            entry[4].cancel()
+            del self.syn_queue[key]
+
+        sock = self.create_socket(ip_hdr.src, tcp_hdr.sport)
+        sock.resume_handshake(isn, syn_hdr, synack_time)
+        sock.continue_connection(pkt)
+        if sock.state != TCP_STATE_ESTABLISHED:
+            return
+
+        self._handle_new_client(self._local_addr, self._local_port,
+                ip_hdr.src, tcp_hdr.sport, sock)
+        if self._notify_on_accept is not None:
+            self.accept_queue.append(sock)
+            self._notify_on_accept()
+
+        # any data (or other information) carried by the final ACK
+        sock.handle_packet(pkt)
+
+    def create_socket(self, remote_addr: str, remote_port: int) -> TCPSocket:
+        sock = TCPSocket(self._local_addr, self._local_port,
+                remote_addr, remote_port,
+                TCP_STATE_LISTEN,
+                send_ip_packet_func=self._send_ip_packet_func,
+                notify_on_data_func=self._notify_on_data_func,
+                fast_retransmit=self._fast_retransmit,
+                initial_cwnd=self._initial_cwnd, mss=self._mss,
+                congestion_control=self._congestion_control,
+                receive_window=self._receive_window,
+                nagle=self._nagle, sack=self._sack,
+                delayed_ack=self._delayed_ack, pacing=self._pacing)
+        sock.use_timer_wheel(self.timer_wheel)
+        return sock
 
 
 class TCPSocket(TCPSocketBase):
+    # The state of a connection is kept in slots rather than in a
+    # per-instance __dict__ (see __init__() for what each one holds), and its
+    # buffers are only allocated once they are needed, so that an idle
+    # connection takes as little memory as possible (see
+    # bench_conn_memory.py).
+    __slots__ = ('_local_addr', '_local_port', '_remote_addr', '_remote_port',
+            '_state', '_state_since', '_state_times',
+            '_open_state', '_open_time',
+            '_send_ip_packet', '_notify_on_data',
+            '_notify_on_write_space',
+            'base_seq_self', 'base_seq_other', 'seq', 'ack',
+            'ssthresh', 'mss', 'cwnd', 'cwnd_inc',
+            'congestion_control', 'congestion',
+            '_send_buffer', 'receive_buffer', 'ready_buffer',
+            'num_dup_acks', 'last_ack', 'timeout',
+            'srtt', 'rttvar', 'latest_rtt', 'min_rtt', '_rtt_seq', '_rtt_start',
+            'timer', 'fast_retransmit', 'receive_window',
+            '_wscale_offer', '_offer_wscale', 'rcv_wscale', 'snd_wscale',
+            'remote_window', 'sack', '_offer_sack', 'sack_permitted',
+            'scoreboard', 'recovery_point', 'high_rxt',
+            'delayed_ack', '_unacked_bytes', '_delayed_ack_timer',
+            'nagle', 'corked', '_flush_handle',
+            'write_segments', 'data_segments_sent',
+            'pacing', '_pacing_next', '_pacing_handle',
+            'segments_retransmitted', 'bytes_retransmitted',
+            'dup_acks_received', 'fast_retransmits', 'timeouts', 'tracer',
+            '_rcv_edge', '_persist_timer', '_persist_timeout', 'window_probes',
+            'fin_pending', 'fin_seq', 'fin_acked', 'remote_fin_seq',
+            'shut_rd', 'was_reset', 'timed_out',
+            'timer_wheel', 'release_func')
+
     def __init__(self, local_addr: str, local_port: int,
             remote_addr: str, remote_port: int, state: int,
             send_ip_packet_func: callable,
             notify_on_data_func: callable,
             fast_retransmit: bool=False, initial_cwnd: int=1000,
             mss: int=1000,
-            congestion_control: str='none') -> TCPSocket:
+            congestion_control: str='none',
+            receive_window: int=TCP_DEFAULT_RECEIVE_WINDOW,
+            nagle: bool=False, sack: bool=False,
+            delayed_ack: bool=False, pacing: bool=False) -> TCPSocket:
 
         # The local/remote address/port information associated with this
         # TCPConnection
@@ -125,13 +601,26 @@ class TCPSocket(TCPSocketBase):
         self._remote_addr = remote_addr
         self._remote_port = remote_port
 
-        # The current state (TCP_STATE_LISTEN, TCP_STATE_CLOSED, etc.)
-        self.state = state
+        # The current state (TCP_STATE_LISTEN, TCP_STATE_CLOSED, etc.; see
+        # the state property), the time (loop.time()) at which it was
+        # entered, and the seconds spent in each earlier state, indexed by
+        # state.  That array is only allocated once the connection leaves
+        # ESTABLISHED (or fails to get there); until then, the handshake is
+        # timed as a whole, and its time (_open_time) is credited to the
+        # state from which ESTABLISHED was entered (_open_state).
+        self._state = state
+        self._state_since = asyncio.get_event_loop().time()
+        self._state_times = None
+        self._open_state = None
+        self._open_time = None
 
         # Helpful methods for helping us send IP packets and
-        # notifying the application that we have received data.
+        # notifying the application that we have received data (or that the
+        # peer has closed or reset the connection) and, if it asks (see
+        # set_notify_on_write_space()), that sent data was acknowledged.
         self._send_ip_packet = send_ip_packet_func
-        self._notify_on_data = notify_on_data_func
+        self._notify_on_data = notify_on_data_func or _ignore_notification
+        self._notify_on_write_space = None
 
         # Base sequence number
         self.base_seq_self = self.initialize_seq()
@@ -157,24 +646,44 @@ class TCPSocket(TCPSocketBase):
         # The congestion window (cwnd), which represents the total number of
         # bytes that may be outstanding (unacknowledged) at one time
         self.cwnd = initial_cwnd
-        self.cwnd_inc = self.cwnd
+        self.cwnd_inc = 0
 
+        # The name of the congestion control algorithm, and the instance of
+        # it that adjusts cwnd and ssthresh (see congestion.py)
         self.congestion_control = congestion_control
+        self.congestion = create_congestion_control(congestion_control, self)
 
-        # Send, receive, and ready buffers.  The send buffer is initialized
-        # with our base sequence number.  The receive buffer is initialized
-        # with the base sequence number of the remote side.  The ready buffer
+        # Send, receive, and ready buffers, each None until it is first
+        # needed.  The send buffer (see the send_buffer property) starts at
+        # the first sequence number after our SYN.  The receive buffer is
+        # allocated when the first data arrives, starting at the next
+        # sequence number expected from the remote side.  The ready buffer
         # is what is tapped into when recv() is called on the socket.
-        self.send_buffer = TCPSendBuffer(self.base_seq_self + 1) 
+        self._send_buffer = None
         self.receive_buffer = None
-        self.ready_buffer = b''
+        self.ready_buffer = None
 
         # The number of duplicate acknowledgments
         self.num_dup_acks = 0
         self.last_ack = 0
 
-        # Timeout duration in seconds
-        self.timeout = 1
+        # Timeout duration in seconds, i.e., the retransmission timeout (RTO)
+        self.timeout = TCP_INITIAL_RTO
+
+        # RTT estimates (RFC 6298), in seconds: the smoothed RTT, the RTT
+        # variation, and the latest and smallest samples.  All are None until
+        # the first sample.
+        self.srtt = None
+        self.rttvar = None
+        self.latest_rtt = None
+        self.min_rtt = None
+
+        # One segment at a time is timed: the sequence number that must be
+        # acknowledged to complete the sample, and the time it was sent.
+        # Timing is abandoned when anything is retransmitted (Karn's
+        # algorithm).
+        self._rtt_seq = None
+        self._rtt_start = None
 
         # Active time instance (Event instance or None)
         self.timer = None
@@ -182,6 +691,148 @@ class TCPSocket(TCPSocketBase):
         # Whether or not we support fast_retransmit (boolean)
         self.fast_retransmit = fast_retransmit
 
+        # The number of bytes we are willing to buffer, whether ready to be
+        # read or received out of order.  What is advertised to the peer in
+        # the window field is what remains of it once the ready data that the
+        # application has not yet read is taken out (see receive_space()).
+        self.receive_window = receive_window
+
+        # The right edge of the window last advertised (the ack number plus
+        # the window), beyond which received data is discarded, or None if no
+        # window has been advertised since the handshake.  It never moves to
+        # the left (RFC 7323, Section 2.4).
+        self._rcv_edge = None
+
+        # The window scale shifts (RFC 7323) applied to the windows that we
+        # advertise (rcv_wscale) and to those advertised by the peer
+        # (snd_wscale).  Both remain 0 unless both sides include the window
+        # scale option in their SYNs.
+        self._wscale_offer = self.window_scale_for(receive_window)
+        self._offer_wscale = True
+        self.rcv_wscale = 0
+        self.snd_wscale = 0
+
+        # The most recent window advertised by the peer, in bytes
+        self.remote_window = None
+
+        # While the peer's window is closed, the persist timer (TimerHandle or
+        # None) sends zero-window probes, backing off from the RTO to
+        # TCP_MAX_RTO (_persist_timeout, None when not persisting).
+        # window_probes is the number of probes sent.
+        self._persist_timer = None
+        self._persist_timeout = None
+        self.window_probes = 0
+
+        # Selective acknowledgment (RFC 2018): whether we offer it, and
+        # whether both sides have agreed to use it.  When it is in use, the
+        # scoreboard (allocated with the first ACK of data) records what the
+        # peer has SACKed, and loss recovery follows RFC 6675: recovery_point
+        # is the highest sequence number sent when recovery began (None when
+        # not in recovery), and high_rxt is the sequence number following the
+        # last byte retransmitted.
+        self.sack = sack
+        self._offer_sack = sack
+        self.sack_permitted = False
+        self.scoreboard = None
+        self.recovery_point = None
+        self.high_rxt = None
+
+        # Whether ACKs for in-order data are delayed (RFC 5681, Section 4.2),
+        # the number of bytes received but not yet acknowledged, and the
+        # timer (TimerHandle or None) that sends the ACK if no second segment
+        # arrives first
+        self.delayed_ack = delayed_ack
+        self._unacked_bytes = 0
+        self._delayed_ack_timer = None
+
+        # Whether small segments are held back while data is outstanding
+        # (Nagle's algorithm), and whether all segments smaller than MSS are
+        # held back until uncork() is called (like TCP_CORK).  In either mode,
+        # transmission is deferred until the end of the current event loop
+        # iteration, so that consecutive calls to send() are coalesced.
+        self.nagle = nagle
+        self.corked = False
+        self._flush_handle = None
+
+        # The number of data segments the writes passed to send() would have
+        # taken if each had been sent on its own, and the number of new
+        # (i.e., not retransmitted) data segments actually sent
+        self.write_segments = 0
+        self.data_segments_sent = 0
+
+        # Whether new segments are paced, i.e., spread out over the RTT at
+        # pacing_rate() instead of being sent back-to-back, the earliest time
+        # (loop.time()) at which the next one may be sent, and the TimerHandle
+        # that resumes sending at that time
+        self.pacing = pacing
+        self._pacing_next = 0.0
+        self._pacing_handle = None
+
+        # The number of data segments retransmitted, and the bytes they
+        # carried; the number of duplicate ACKs received in all; and the
+        # number of times loss recovery was entered on duplicate ACKs (or
+        # SACKs) and on the expiry of the retransmission timer
+        self.segments_retransmitted = 0
+        self.bytes_retransmitted = 0
+        self.dup_acks_received = 0
+        self.fast_retransmits = 0
+        self.timeouts = 0
+
+        # The TCPTracer that samples cwnd, the bytes in flight, and the RTT
+        # as the connection progresses, or None if it is not traced
+        self.tracer = None
+
+        # Connection teardown.  Our FIN is sent once close() or shutdown()
+        # has been called (fin_pending) and all buffered data has been sent;
+        # fin_seq is its sequence number (None until it is sent), and
+        # fin_acked is whether it has been acknowledged.  remote_fin_seq is
+        # the sequence number of the peer's FIN (None until it is received),
+        # which is processed only once all data preceding it has been
+        # received.  Data received after shutdown(SHUT_RD) is discarded.
+        # was_reset is whether the connection was reset by the peer, and
+        # timed_out whether it was given up on because the peer never
+        # answered our SYN.
+        self.fin_pending = False
+        self.fin_seq = None
+        self.fin_acked = False
+        self.remote_fin_seq = None
+        self.shut_rd = False
+        self.was_reset = False
+        self.timed_out = False
+
+        # The slots hide the defaults of TCPSocketBase, so they are set here.
+        self.timer_wheel = None
+        self.release_func = None
+
+
+    @property
+    def state(self) -> int:
+        return self._state
+
+    @state.setter
+    def state(self, state: int) -> None:
+        if state == self._state:
+            return
+        now = asyncio.get_event_loop().time()
+        if self._state_times is None:
+            if state == TCP_STATE_SYN_SENT or \
+                    state == TCP_STATE_SYN_RECEIVED:
+                # still opening; the handshake is timed from when it began
+                self._state = state
+                return
+            if state == TCP_STATE_ESTABLISHED and self._open_state is None:
+                self._open_state = self._state
+                self._open_time = now - self._state_since
+                self._state = state
+                self._state_since = now
+                return
+            self._state_times = array.array('d',
+                    bytes(8 * (TCP_STATE_CLOSED + 1)))
+            if self._open_state is not None:
+                self._state_times[self._open_state] = self._open_time
+        self._state_times[self._state] += now - self._state_since
+        self._state = state
+        self._state_since = now
 
     @classmethod
     def connect(cls, local_addr: str, local_port: int,
@@ -190,14 +841,19 @@ class TCPSocket(TCPSocketBase):
             notify_on_data_func: callable,
             fast_retransmit: bool=False, initial_cwnd: int=1000,
             mss: int=1000,
-            congestion_control='none') -> TCPSocket:
+            congestion_control: str='none',
+            receive_window: int=TCP_DEFAULT_RECEIVE_WINDOW,
+            nagle: bool=False, sack: bool=False,
+            delayed_ack: bool=False, pacing: bool=False) -> TCPSocketBase:
         sock = cls(local_addr, local_port,
                 remote_addr, remote_port,
                 TCP_STATE_CLOSED,
                 send_ip_packet_func, notify_on_data_func,
                 fast_retransmit=fast_retransmit,
                 initial_cwnd=initial_cwnd, mss=mss,
-                congestion_control=congestion_control)
+                congestion_control=congestion_control,
+                receive_window=receive_window, nagle=nagle, sack=sack,
+                delayed_ack=delayed_ack, pacing=pacing)
 
         sock.initiate_connection()
 
@@ -205,9 +861,9 @@ class TCPSocket(TCPSocketBase):
 
     def bypass_handshake(self, base_seq_self: int, base_seq_other: int):
         '''
-        Bypass the TCP three-way handshake.  Allocate a TCPReceiveBuffer
-        instance, and initialize it with the base sequence number of the peer
-        on the other side of the connection.
+        Bypass the TCP three-way handshake.  Record the base sequence number
+        of the peer on the other side of the connection, from which the
+        receive buffer starts once data arrives.
 
         Normally this is done in in handle_syn() (after the SYN is received)
         for the server and in handle_synack() (after the SYNACK is received) in
@@ -215,42 +871,296 @@ class TCPSocket(TCPSocketBase):
         '''
         self.base_seq_self = base_seq_self
         self.seq = base_seq_self + 1
-        self.send_buffer = TCPSendBuffer(self.base_seq_self + 1)
+        self._send_buffer = None
 
         self.base_seq_other = base_seq_other
         self.ack = base_seq_other + 1
-        self.receive_buffer = TCPReceiveBuffer(self.base_seq_other + 1)
+        self.receive_buffer = None
+
+        # with no SYNs, both sides are assumed to be configured alike
+        self.sack_permitted = self.sack
+        self.remote_window = self.receive_window
 
     def handle_packet(self, pkt: bytes) -> None:
-        ip_hdr = IPv4Header.from_bytes(pkt[:IP_HEADER_LEN])
-        tcp_hdr = TCPHeader.from_bytes(pkt[IP_HEADER_LEN:TCPIP_HEADER_LEN])
-        data = pkt[TCPIP_HEADER_LEN:]
+        # Only the TCP header fields are needed here, and they are decoded
+        # lazily; the addresses are never formatted.
+        ip_hdr_len = ip_header_len(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr_len)
+        flags = tcp_hdr.flags
+        data_len = len(pkt) - ip_hdr_len - tcp_hdr.header_len
+
+        if flags & TCP_FLAGS_RST:
+            self.handle_rst(tcp_hdr)
+            return
 
-        if self.state != TCP_STATE_ESTABLISHED:
+        if self.state in (TCP_STATE_LISTEN, TCP_STATE_SYN_SENT,
+                TCP_STATE_SYN_RECEIVED):
             self.continue_connection(pkt)
 
-        if self.state == TCP_STATE_ESTABLISHED:
-            if data:
-                # handle data
-                self.handle_data(pkt)
-            if tcp_hdr.flags & TCP_FLAGS_ACK:
+        if self.state in TCP_SYNCHRONIZED_STATES:
+            if data_len > 0 and (self.remote_fin_seq is None or \
+                    self.ack < self.remote_fin_seq):
+                # handle data, unless the peer's FIN has been processed
+                self.handle_data(pkt, tcp_hdr)
+            if flags & TCP_FLAGS_ACK:
                 # handle ACK
-                self.handle_ack(pkt)
+                seq = self.seq
+                if self.fin_outstanding() and tcp_hdr.ack > self.fin_seq:
+                    self.handle_ack(pkt, tcp_hdr)
+                    self.handle_fin_ack()
+                else:
+                    self.handle_ack(pkt, tcp_hdr)
+                if self.seq > seq and self._notify_on_write_space is not None:
+                    self._notify_on_write_space()
+            if flags & TCP_FLAGS_FIN and self.remote_fin_seq is None:
+                self.remote_fin_seq = tcp_hdr.seq + data_len
+            if self.remote_fin_seq is not None and \
+                    self.ack == self.remote_fin_seq:
+                # all data preceding the peer's FIN has been received
+                self.handle_fin()
+            elif flags & TCP_FLAGS_FIN and self.remote_fin_seq is not None \
+                    and self.ack > self.remote_fin_seq:
+                # the peer did not receive our ACK of its FIN
+                self.send_ack()
+
+        elif self.state == TCP_STATE_TIME_WAIT and flags & TCP_FLAGS_FIN:
+            self.send_ack()
 
     def initialize_seq(self) -> int:
         return random.randint(0, 65535)
 
+    @classmethod
+    def window_scale_for(cls, window: int) -> int:
+        '''
+        Return the smallest window scale shift with which the specified
+        window (in bytes) fits in the 16-bit window field.
+        '''
+
+        shift = 0
+        while window >> shift > 0xffff and shift < TCP_MAX_WINDOW_SCALE:
+            shift += 1
+        return shift
+
+    def syn_options(self) -> dict:
+        '''
+        Return the TCP options to be included with our SYN or SYNACK: our MSS
+        and, unless the peer has declined them, our window scale and SACK
+        permitted.
+        '''
+
+        options = { 'mss': self.mss }
+        if self._offer_wscale:
+            options['wscale'] = self._wscale_offer
+        if self._offer_sack:
+            options['sack_permitted'] = True
+        return options
+
+    def negotiate_options(self, tcp_hdr: TCPHeader) -> None:
+        '''
+        Apply the options from the peer's SYN or SYNACK.  The MSS is lowered
+        to what the peer is willing to receive, and window scaling and SACK
+        are each enabled only if both sides offered them.
+
+        tcp_hdr: The fully-decoded TCPHeader of the SYN or SYNACK.
+        '''
+
+        if tcp_hdr.mss is not None:
+            self.mss = min(self.mss, tcp_hdr.mss)
+
+        if tcp_hdr.wscale is not None and self._offer_wscale:
+            self.rcv_wscale = self._wscale_offer
+            self.snd_wscale = tcp_hdr.wscale
+        else:
+            self._offer_wscale = False
+            self.rcv_wscale = 0
+            self.snd_wscale = 0
+
+        self.sack_permitted = self._offer_sack and tcp_hdr.sack_permitted
+
+        # the window in a SYN or SYNACK is never scaled
+        self.remote_window = tcp_hdr.window
+
+    def receive_space(self) -> int:
+        '''
+        Return the number of bytes beyond the ack number that we can accept:
+        the receive window, less the ready data not yet read.
+        '''
+
+        if self.ready_buffer is None:
+            return self.receive_window
+        return max(self.receive_window - len(self.ready_buffer), 0)
+
+    def receive_edge(self) -> int:
+        '''
+        Return the sequence number beyond which received data is discarded:
+        the right edge of the window last advertised, if any.
+        '''
+
+        if self._rcv_edge is None:
+            return self.ack + self.receive_space()
+        return self._rcv_edge
+
+    def advertised_window(self, flags: int) -> int:
+        '''
+        Return the value for the window field of an outgoing segment with the
+        specified flags, and record the right edge of the window advertised.
+        To avoid the silly window syndrome (RFC 1122, Section 4.2.3.3), the
+        right edge only advances once it can do so by min(receive_window / 2,
+        MSS) bytes; until then, the window shrinks as data arrives.
+        '''
+
+        if flags & TCP_FLAGS_SYN:
+            window = min(self.receive_window, 0xffff)
+            if self.ack is not None:
+                self._rcv_edge = self.ack + window
+            return window
+
+        edge = self.ack + self.receive_space()
+        if self._rcv_edge is not None and edge < self._rcv_edge + \
+                min(self.receive_window // 2, self.mss):
+            edge = max(self._rcv_edge, self.ack)
+        window = min((edge - self.ack) >> self.rcv_wscale, 0xffff)
+        self._rcv_edge = self.ack + (window << self.rcv_wscale)
+        return window
+
+    def window_update(self) -> None:
+        '''
+        Send an ACK to advertise the space freed by the application reading
+        ready data, if the window has (at least) doubled and its right edge
+        can advance by min(receive_window / 2, MSS) bytes.  Otherwise, the
+        peer learns of the space with the next ACK for its data.
+        '''
+
+        if self._rcv_edge is None or \
+                self.state not in TCP_SYNCHRONIZED_STATES:
+            return
+        # only as much space as the window field can express
+        space = min(self.receive_space(), 0xffff << self.rcv_wscale)
+        if space >= 2 * (self._rcv_edge - self.ack) and \
+                self.ack + space >= self._rcv_edge + \
+                    min(self.receive_window // 2, self.mss):
+            self.send_ack()
+
     def initiate_connection(self) -> None:
-        pass
+        self.state = TCP_STATE_SYN_SENT
+        self.send_packet(self.base_seq_self, 0, TCP_FLAGS_SYN)
+        self.start_handshake_rtt()
+        self.start_timer()
+
+    def retransmit_syn(self) -> None:
+        '''
+        Resend our SYN, after its retransmission timer has expired, or give
+        up on the connection if it has been resent TCP_SYN_RETRIES times
+        already.  The application learns of the latter as it would of a
+        reset: the socket is at EOF, with timed_out set.
+        '''
+
+        if self.timeouts > TCP_SYN_RETRIES:
+            self.timed_out = True
+            self.state = TCP_STATE_CLOSED
+            self.release()
+            self._notify_on_data()
+            return
+
+        # a retransmitted SYN cannot be timed (Karn's algorithm)
+        self._rtt_seq = None
+        self.send_packet(self.base_seq_self, 0, TCP_FLAGS_SYN)
+        self.start_timer()
 
     def handle_syn(self, pkt: bytes) -> None:
-        pass
+        tcp_hdr = TCPHeader.unpack_from(pkt, ip_header_len(pkt))
+        if not tcp_hdr.flags & TCP_FLAGS_SYN:
+            return
+
+        self.receive_syn(tcp_hdr)
+        self.send_packet(self.base_seq_self, self.ack,
+                TCP_FLAGS_SYN | TCP_FLAGS_ACK)
+        self.start_handshake_rtt()
+        self.state = TCP_STATE_SYN_RECEIVED
+
+    def receive_syn(self, tcp_hdr: TCPHeader) -> None:
+        '''
+        Record the peer's initial sequence number and options from its SYN,
+        offering window scaling and SACK in return only if the SYN did.
+        '''
+
+        self.base_seq_other = tcp_hdr.seq
+        self.ack = tcp_hdr.seq + 1
+
+        self._offer_wscale = tcp_hdr.wscale is not None
+        self._offer_sack = self.sack and tcp_hdr.sack_permitted
+        self.negotiate_options(tcp_hdr)
+
+    def resume_handshake(self, isn: int, syn_hdr: TCPHeader,
+            synack_time: float) -> None:
+        '''
+        Enter the SYN_RECEIVED state, as if this socket had received the SYN
+        with header syn_hdr and answered it with a SYNACK with sequence number
+        isn, at synack_time (loop.time(), or None if not known).  This is how
+        a TCPListenerSocket, which answers SYNs itself, creates the socket
+        for a connection when the handshake completes.
+        '''
+
+        self.base_seq_self = isn
+        self.seq = isn + 1
+        self._send_buffer = None
+        self.receive_syn(syn_hdr)
+        if synack_time is not None:
+            self._rtt_seq = isn + 1
+            self._rtt_start = synack_time
+        self.state = TCP_STATE_SYN_RECEIVED
 
     def handle_synack(self, pkt: bytes) -> None:
-        pass
+        tcp_hdr = TCPHeader.unpack_from(pkt, ip_header_len(pkt))
+        if tcp_hdr.flags & (TCP_FLAGS_SYN | TCP_FLAGS_ACK) != \
+                TCP_FLAGS_SYN | TCP_FLAGS_ACK or \
+                tcp_hdr.ack != self.base_seq_self + 1:
+            return
+
+        self.base_seq_other = tcp_hdr.seq
+        self.ack = tcp_hdr.seq + 1
+
+        self.negotiate_options(tcp_hdr)
+        self.finish_handshake_rtt(tcp_hdr.ack)
+        self.cancel_timer()
+        if self.timeouts:
+            self.timeout = max(self.timeout, TCP_SYN_LOSS_RTO)
+
+        self.send_ack()
+        self.enter_established()
 
     def handle_ack_after_synack(self, pkt: bytes) -> None:
-        pass
+        tcp_hdr = TCPHeaderView(pkt, ip_header_len(pkt))
+        if tcp_hdr.flags & TCP_FLAGS_ACK and \
+                tcp_hdr.ack == self.base_seq_self + 1:
+            self.finish_handshake_rtt(tcp_hdr.ack)
+            self.enter_established()
+
+    def enter_established(self) -> None:
+        '''
+        Complete the handshake: send anything written while it was in
+        progress, and let the application know, as with a non-blocking
+        connect(), that the socket has become writable.
+        '''
+
+        self.state = TCP_STATE_ESTABLISHED
+        self.send_if_possible()
+        if self._notify_on_write_space is not None:
+            self._notify_on_write_space()
+
+    def start_handshake_rtt(self) -> None:
+        '''
+        Time our SYN, so that the RTT is known (e.g., for pacing) before any
+        data is sent.
+        '''
+
+        self._rtt_seq = self.base_seq_self + 1
+        self._rtt_start = asyncio.get_event_loop().time()
+
+    def finish_handshake_rtt(self, ack: int) -> None:
+        if self._rtt_seq is not None and ack == self._rtt_seq:
+            self.update_rto(asyncio.get_event_loop().time() - self._rtt_start)
+        self._rtt_seq = None
 
     def continue_connection(self, pkt: bytes) -> None:
         if self.state == TCP_STATE_LISTEN:
@@ -260,17 +1170,47 @@ class TCPSocket(TCPSocketBase):
         elif self.state == TCP_STATE_SYN_RECEIVED:
             self.handle_ack_after_synack(pkt)
 
-    def send_data(self, data: bytes, flags: int=0) -> None:
-        pass
-
     @classmethod
     def create_packet(cls, src: str, sport: int, dst: str, dport: int,
-            seq: int, ack: int, flags: int, data: bytes=b'') -> bytes:
-        return b''
+            seq: int, ack: int, flags: int, data: bytes=b'',
+            window: int=TCP_RECEIVE_WINDOW, **options) -> bytes:
+        '''
+        Create a TCP/IP packet.  Any keyword arguments beyond window are TCP
+        options, as accepted by TCPHeader (e.g., mss, wscale).
+        '''
+
+        tcp_hdr = TCPHeader(sport, dport, seq, ack, flags, 0, window,
+                **options)
+        opts = tcp_hdr.options_to_bytes()
+        tcp_hdr_len = TCP_HEADER_LEN + len(opts)
+        length = tcp_hdr_len + len(data)
+        ip_hdr = create_ip_header(src, dst, IPPROTO_TCP, length, DEFAULT_TTL)
+        ip_hdr_len = ip_hdr.header_len
+
+        pkt = bytearray(ip_hdr_len + length)
+        ip_hdr.pack_into(pkt)
+        tcp_hdr.pack_into(pkt, ip_hdr_len, opts)
+        pkt[ip_hdr_len + tcp_hdr_len:] = data
+        fill_transport_checksum(pkt, ip_hdr, TCP_CHECKSUM_OFFSET)
+        return bytes(pkt)
 
     def send_packet(self, seq: int, ack: int, flags: int,
             data: bytes=b'') -> None:
-        pass
+        if flags & TCP_FLAGS_SYN:
+            options = self.syn_options()
+        elif self.sack_permitted and self.receive_buffer is not None:
+            options = { 'sack_blocks':
+                    self.receive_buffer.sack_blocks(TCP_MAX_SACK_BLOCKS) }
+        else:
+            options = {}
+        if flags & TCP_FLAGS_ACK:
+            # this acknowledges everything received, so no ACK is pending
+            self.cancel_delayed_ack()
+        pkt = self.create_packet(self._local_addr, self._local_port,
+                self._remote_addr, self._remote_port,
+                seq, ack, flags, data,
+                window=self.advertised_window(flags), **options)
+        self._send_ip_packet(pkt)
 
     def relative_seq_other(self, seq: int) -> int:
         '''
@@ -293,30 +1233,904 @@ class TCPSocket(TCPSocketBase):
 
         return seq - self.base_seq_self
 
+    @property
+    def send_buffer(self) -> TCPSendBuffer:
+        '''
+        The send buffer, allocated on first use, starting at the first
+        sequence number not yet acknowledged.
+        '''
+
+        if self._send_buffer is None:
+            self._send_buffer = TCPSendBuffer(self.seq)
+        return self._send_buffer
+
     def send_if_possible(self) -> int:
-        pass
+        '''
+        Send as many new segments as the congestion window allows, and return
+        the number of bytes sent.  A segment smaller than MSS that is not
+        limited by the window is held back if the socket is corked, or if
+        Nagle's algorithm is enabled and data is outstanding.  If pacing is
+        enabled, segments are only sent as fast as pacing_rate() allows, and
+        sending resumes when the next one is due.  Until the handshake has
+        completed, data is only buffered.
+        '''
+
+        if self.state == TCP_STATE_SYN_SENT or \
+                self.state == TCP_STATE_SYN_RECEIVED:
+            return 0
+        if self._send_buffer is None and not self.fin_pending:
+            # nothing has been written, so don't allocate the send buffer
+            return 0
+
+        rate = self.pacing_rate()
+        loop = asyncio.get_event_loop()
+        sent = 0
+        while self.send_buffer.bytes_not_yet_sent() > 0:
+            size = min(self.mss, self.usable_window())
+            if size <= 0:
+                break
+            if self.send_buffer.bytes_not_yet_sent() < size and \
+                    (self.corked or (self.nagle and \
+                        self.send_buffer.bytes_outstanding() > 0)):
+                break
+
+            if rate is not None:
+                now = loop.time()
+                if now < self._pacing_next:
+                    self._schedule_paced_send()
+                    break
+                size = self.send_new_segment(size)
+                self._pacing_next = max(now, self._pacing_next) + size / rate
+                sent += size
+            else:
+                sent += self.send_new_segment(size)
+
+        if self.fin_pending and self.fin_seq is None and \
+                self.send_buffer.bytes_not_yet_sent() == 0:
+            self.send_fin()
+        elif self.remote_window == 0 and \
+                self.send_buffer.bytes_not_yet_sent() > 0 and \
+                self.send_buffer.bytes_outstanding() == 0:
+            # no ACK is coming to open the window, so probe it
+            self.start_persist_timer()
+        return sent
+
+    def usable_window(self) -> int:
+        '''
+        Return the number of bytes of new data that may be sent: what remains
+        of the congestion window and of the peer's advertised window once the
+        bytes outstanding are taken out.
+        '''
+
+        window = self.cwnd
+        if self.remote_window is not None and self.remote_window < window:
+            window = self.remote_window
+        return window - self.send_buffer.bytes_outstanding()
+
+    def start_persist_timer(self) -> None:
+        if self._persist_timer is None:
+            if self._persist_timeout is None:
+                self._persist_timeout = self.timeout
+            self._persist_timer = self.call_later(self._persist_timeout,
+                    self.handle_persist_timeout)
+
+    def cancel_persist_timer(self) -> None:
+        '''
+        Stop probing the peer's window, which has opened.
+        '''
+
+        if self._persist_timer is not None:
+            self._persist_timer.cancel()
+            self._persist_timer = None
+        self._persist_timeout = None
+
+    def handle_persist_timeout(self) -> None:
+        '''
+        Send a zero-window probe: the next byte of data, which is not marked
+        sent.  The peer discards it and acknowledges it with its window, or,
+        if the window has opened, accepts it and acknowledges it with the ack
+        number following it.  The interval doubles with every probe.
+        '''
+
+        self._persist_timer = None
+        if self.remote_window != 0 or \
+                self.send_buffer.bytes_not_yet_sent() == 0:
+            self._persist_timeout = None
+            return
+        data, seq = self.send_buffer.peek(1)
+        self.send_packet(seq, self.ack, TCP_FLAGS_ACK, data)
+        self.window_probes += 1
+        self._persist_timeout = min(self._persist_timeout * 2, TCP_MAX_RTO)
+        self.start_persist_timer()
+
+    def pacing_rate(self) -> float:
+        '''
+        Return the rate (bytes per second) at which new segments are sent, or
+        None if they are not paced, because pacing is disabled or there is
+        no RTT estimate yet.
+        '''
+
+        if not self.pacing or self.srtt is None:
+            return None
+        if self.cwnd < self.ssthresh:
+            ratio = TCP_PACING_SS_RATIO
+        else:
+            ratio = TCP_PACING_CA_RATIO
+        return ratio * self.cwnd / max(self.srtt, TCP_CLOCK_GRANULARITY)
+
+    def _schedule_paced_send(self) -> None:
+        # The gaps between paced segments are typically well under a tick of
+        # the timer wheel, so they are timed by the event loop itself.
+        if self._pacing_handle is None:
+            loop = asyncio.get_event_loop()
+            self._pacing_handle = loop.call_at(self._pacing_next,
+                    self._paced_send)
+
+    def _paced_send(self) -> None:
+        self._pacing_handle = None
+        self.send_if_possible()
+
+    def send_new_segment(self, size: int) -> int:
+        '''
+        Send (at most) size bytes of data that have not been sent before, and
+        return the number of bytes sent.
+        '''
+
+        data, seq = self.send_buffer.get(size)
+        self.send_packet(seq, self.ack, TCP_FLAGS_ACK, data)
+        self.data_segments_sent += 1
+        if self._rtt_seq is None:
+            self._rtt_seq = seq + len(data)
+            self._rtt_start = asyncio.get_event_loop().time()
+        if self.timer is None:
+            self.start_timer()
+        if self.tracer is not None:
+            self.trace(TCP_TRACE_SEND)
+        return len(data)
 
     def send(self, data: bytes) -> None:
+        if self.fin_pending:
+            raise BrokenPipeError('The socket has been shut down for writing')
         self.send_buffer.put(data)
+        self.write_segments += -(-len(data) // self.mss)
+        if self.nagle or self.corked:
+            self._schedule_flush()
+        else:
+            self.send_if_possible()
+
+    @property
+    def segments_saved(self) -> int:
+        '''
+        The number of data segments saved by coalescing writes.
+        '''
+
+        return max(self.write_segments - self.data_segments_sent, 0)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            loop = asyncio.get_event_loop()
+            self._flush_handle = loop.call_soon(self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
         self.send_if_possible()
 
+    def cork(self) -> None:
+        '''
+        Hold back segments smaller than MSS until uncork() is called.
+        '''
+
+        self.corked = True
+
+    def uncork(self) -> None:
+        '''
+        Stop holding back small segments, and send any buffered data that the
+        congestion window allows.
+        '''
+
+        self.corked = False
+        self.send_if_possible()
+
+    def set_notify_on_data(self, notify_on_data_func: callable) -> None:
+        '''
+        Replace the function called when data is ready to be read, or the
+        peer has closed or reset the connection, e.g., once a socket returned
+        by TCPListenerSocket.accept() is handed to the code that reads it.
+        '''
+
+        self._notify_on_data = notify_on_data_func or _ignore_notification
+
+    def set_notify_on_write_space(self,
+            notify_on_write_space_func: callable) -> None:
+        '''
+        Set the function (or None) called whenever sent data is acknowledged,
+        which shrinks send_buffer_size(), and once the handshake completes.
+        '''
+
+        self._notify_on_write_space = notify_on_write_space_func
+
+    def send_buffer_size(self) -> int:
+        '''
+        Return the number of bytes passed to send() that have not yet been
+        acknowledged.
+        '''
+
+        if self._send_buffer is None:
+            return 0
+        return self._send_buffer.last_seq - self._send_buffer.base_seq
+
+    def state_times(self) -> dict:
+        '''
+        Return the seconds spent in each state the connection has been in,
+        including the current one up to now, keyed by state.
+        '''
+
+        times = {}
+        if self._state_times is not None:
+            for state, secs in enumerate(self._state_times):
+                if secs > 0:
+                    times[state] = secs
+        elif self._open_state is not None:
+            times[self._open_state] = self._open_time
+        times[self._state] = times.get(self._state, 0.0) + \
+                asyncio.get_event_loop().time() - self._state_since
+        return times
+
+    def trace(self, event: int) -> None:
+        '''
+        Record a sample of cwnd, the bytes in flight, and the smoothed RTT
+        with tracer, at the event (TCP_TRACE_SEND, TCP_TRACE_ACK, etc.) that
+        prompted it.  Callers check that the connection is traced first, so
+        that tracing costs nothing when it is off.
+        '''
+
+        if self._send_buffer is None:
+            inflight = 0
+        else:
+            inflight = self._send_buffer.bytes_outstanding()
+        self.tracer.record(asyncio.get_event_loop().time(), self.cwnd,
+                inflight, self.srtt or 0.0, event)
+
+    def stats(self) -> dict:
+        '''
+        Return a snapshot of the connection (much like Linux's TCP_INFO): the
+        data sent, acknowledged, and received, in bytes; the retransmission
+        and loss recovery counters; the current congestion control and RTT
+        estimates (RTTs and the RTO in seconds, None until measured); the
+        occupancy of the buffers; and the time spent in each state (see
+        state_times()).
+        '''
+
+        send_buffer = self._send_buffer
+        if send_buffer is None:
+            bytes_sent = bytes_acked = in_flight = 0
+        else:
+            bytes_sent = send_buffer.next_seq - (self.base_seq_self + 1)
+            bytes_acked = send_buffer.base_seq - (self.base_seq_self + 1)
+            in_flight = send_buffer.bytes_outstanding()
+        if self.receive_buffer is None:
+            bytes_received = 0
+            out_of_order = 0
+        else:
+            bytes_received = self.receive_buffer.base_seq - \
+                    (self.base_seq_other + 1)
+            out_of_order = len(self.receive_buffer.buffer)
+
+        return {
+                'state': self._state,
+                'bytes_sent': bytes_sent,
+                'bytes_acked': bytes_acked,
+                'bytes_received': bytes_received,
+                'data_segments_sent': self.data_segments_sent,
+                'segments_retransmitted': self.segments_retransmitted,
+                'bytes_retransmitted': self.bytes_retransmitted,
+                'dup_acks_received': self.dup_acks_received,
+                'fast_retransmits': self.fast_retransmits,
+                'timeouts': self.timeouts,
+                'window_probes': self.window_probes,
+                'cwnd': self.cwnd,
+                'ssthresh': self.ssthresh,
+                'srtt': self.srtt,
+                'rttvar': self.rttvar,
+                'min_rtt': self.min_rtt,
+                'latest_rtt': self.latest_rtt,
+                'rto': self.timeout,
+                'remote_window': self.remote_window,
+                'send_buffered': self.send_buffer_size(),
+                'in_flight': in_flight,
+                'out_of_order_segments': out_of_order,
+                'ready': 0 if self.ready_buffer is None else \
+                        len(self.ready_buffer),
+                'state_times': self.state_times(),
+        }
+
     def recv(self, num: int) -> bytes:
-        data = self.ready_buffer[:num]
-        self.ready_buffer = self.ready_buffer[num:]
+        if self.ready_buffer is None:
+            return b''
+        data = self.ready_buffer.get(num)
+        self.window_update()
         return data
 
-    def handle_data(self, pkt: bytes) -> None:
-        pass
+    def recv_into(self, buffer, nbytes: int=0) -> int:
+        '''
+        Read (up to) nbytes of ready data into the writable bytes-like object
+        buffer, or as much as fits if nbytes is 0.  Return the number of bytes
+        read.
+        '''
 
-    def handle_ack(self, pkt: bytes) -> None:
-        pass
+        if self.ready_buffer is None:
+            return 0
+        num = self.ready_buffer.get_into(buffer, nbytes)
+        self.window_update()
+        return num
+
+    def readexactly(self, num: int) -> bytes:
+        '''
+        Read exactly num bytes of ready data, or return None, reading nothing,
+        if fewer than num bytes are ready.
+        '''
+
+        if self.ready_buffer is None:
+            return b'' if num == 0 else None
+        data = self.ready_buffer.get_exactly(num)
+        if data is not None:
+            self.window_update()
+        return data
+
+    def recv_all(self) -> list[bytes]:
+        '''
+        Read all ready data, returned as a list of the chunks in which it was
+        received.
+        '''
+
+        if self.ready_buffer is None:
+            return []
+        chunks = self.ready_buffer.get_all()
+        self.window_update()
+        return chunks
+
+    def at_eof(self) -> bool:
+        '''
+        Return True if all data has been read and no more will arrive,
+        because the peer has closed its side of the connection (or reset it),
+        or because the connection could not be established.
+        '''
+
+        if self.ready_buffer:
+            return False
+        if self.was_reset or self.timed_out:
+            return True
+        return self.remote_fin_seq is not None and \
+                self.ack > self.remote_fin_seq
+
+    def close(self) -> None:
+        '''
+        Close the connection, like shutdown(SHUT_RDWR).  The socket is removed
+        from the host's tables once the connection is fully closed (or after
+        TIME_WAIT).
+        '''
+
+        self.shutdown(SHUT_RDWR)
+
+    def shutdown(self, how: int) -> None:
+        '''
+        Shut down one or both halves of the connection.  With SHUT_RD (or
+        SHUT_RDWR), data that has been received but not read, and any that is
+        received later, is discarded.  With SHUT_WR (or SHUT_RDWR), a FIN is
+        sent once all data passed to send() has been sent, and send() may no
+        longer be called.  A connection whose handshake is still under way is
+        aborted instead.
+        '''
+
+        if how != SHUT_WR:
+            self.shut_rd = True
+            self.ready_buffer = None
+        if how == SHUT_RD or self.fin_pending or \
+                self.state == TCP_STATE_CLOSED:
+            return
+
+        if self.state not in TCP_SYNCHRONIZED_STATES:
+            self.abort()
+            return
+
+        self.fin_pending = True
+        if self.state == TCP_STATE_ESTABLISHED:
+            self.state = TCP_STATE_FIN_WAIT_1
+        elif self.state == TCP_STATE_CLOSE_WAIT:
+            self.state = TCP_STATE_LAST_ACK
+        # there is no more data to wait for
+        self.corked = False
+        self.send_if_possible()
+
+    def abort(self) -> None:
+        '''
+        Reset the connection: send an RST (unless the handshake has not gotten
+        as far as a SYN from the peer), discard all buffered data, and close
+        the socket immediately.
+        '''
+
+        if self.state in (TCP_STATE_CLOSED, TCP_STATE_TIME_WAIT):
+            return
+        if self.state == TCP_STATE_SYN_RECEIVED or \
+                self.state in TCP_SYNCHRONIZED_STATES:
+            if self.fin_seq is not None:
+                seq = self.fin_seq + 1
+            else:
+                seq = self.send_buffer.next_seq
+            self.send_packet(seq, self.ack, TCP_FLAGS_RST | TCP_FLAGS_ACK)
+        self.state = TCP_STATE_CLOSED
+        self.release()
+
+    def send_fin(self) -> None:
+        '''
+        Send our FIN, which takes the sequence number following the last byte
+        of data, and time it like any other segment.
+        '''
+
+        self.fin_seq = self.send_buffer.last_seq
+        self.send_packet(self.fin_seq, self.ack,
+                TCP_FLAGS_FIN | TCP_FLAGS_ACK)
+        if self.timer is None:
+            self.start_timer()
+
+    def fin_outstanding(self) -> bool:
+        '''
+        Return True if our FIN has been sent but not acknowledged.
+        '''
+
+        return self.fin_seq is not None and not self.fin_acked
+
+    def handle_fin_ack(self) -> None:
+        '''
+        Handle the acknowledgment of our FIN, after handle_ack() has handled
+        that of all preceding data.
+        '''
+
+        self.fin_acked = True
+        self.seq = self.fin_seq + 1
+        self.cancel_timer()
+        if self.state == TCP_STATE_FIN_WAIT_1:
+            self.state = TCP_STATE_FIN_WAIT_2
+        elif self.state == TCP_STATE_CLOSING:
+            self.state = TCP_STATE_TIME_WAIT
+            self.release()
+        elif self.state == TCP_STATE_LAST_ACK:
+            self.state = TCP_STATE_CLOSED
+            self.release()
+
+    def handle_fin(self) -> None:
+        '''
+        Handle the peer's FIN, once all data preceding it has been received:
+        acknowledge it, and notify the application, which sees the end of
+        the stream (see at_eof()).
+        '''
+
+        self.ack = self.remote_fin_seq + 1
+        self.send_ack()
+        if self.state == TCP_STATE_ESTABLISHED:
+            self.state = TCP_STATE_CLOSE_WAIT
+        elif self.state == TCP_STATE_FIN_WAIT_1:
+            self.state = TCP_STATE_CLOSING
+        elif self.state == TCP_STATE_FIN_WAIT_2:
+            self.state = TCP_STATE_TIME_WAIT
+            self.release()
+        self._notify_on_data()
+
+    def handle_rst(self, tcp_hdr: TCPHeaderView) -> None:
+        '''
+        Close the connection if the RST is acceptable: in SYN_SENT, if it
+        acknowledges our SYN; otherwise, if its sequence number is within our
+        receive window (RFC 793, Section 3.4).
+        '''
+
+        if self.state == TCP_STATE_SYN_SENT:
+            if not tcp_hdr.flags & TCP_FLAGS_ACK or \
+                    tcp_hdr.ack != self.base_seq_self + 1:
+                return
+        elif self.state == TCP_STATE_SYN_RECEIVED or \
+                self.state in TCP_SYNCHRONIZED_STATES:
+            if not self.ack <= tcp_hdr.seq < \
+                    self.ack + max(self.receive_window, 1):
+                return
+        else:
+            return
+
+        self.was_reset = True
+        self.state = TCP_STATE_CLOSED
+        self.release()
+        self._notify_on_data()
+
+    def release(self) -> None:
+        '''
+        Stop all of the socket's timers, and hand it to release_func, if any,
+        once the connection is closed or has entered TIME_WAIT.
+        '''
+
+        self.cancel_timer()
+        self.cancel_delayed_ack()
+        self.cancel_persist_timer()
+        for handle in self._pacing_handle, self._flush_handle:
+            if handle is not None:
+                handle.cancel()
+        self._pacing_handle = None
+        self._flush_handle = None
+        if self.release_func is not None:
+            self.release_func(self)
+
+    @classmethod
+    def create_reset(cls, pkt: bytes) -> bytes:
+        '''
+        Create an RST in response to the TCP segment in the IP packet pkt,
+        which belongs to no connection (RFC 793, Section 3.4), or return None
+        if the segment is itself an RST.
+        '''
+
+        ip_hdr = ip_header_view(pkt)
+        tcp_hdr = TCPHeaderView(pkt, ip_hdr.header_len)
+        flags = tcp_hdr.flags
+        if flags & TCP_FLAGS_RST:
+            return None
+        if flags & TCP_FLAGS_ACK:
+            seq, ack = tcp_hdr.ack, 0
+            flags = TCP_FLAGS_RST
+        else:
+            seg_len = len(pkt) - ip_hdr.header_len - tcp_hdr.header_len
+            if flags & TCP_FLAGS_SYN:
+                seg_len += 1
+            if flags & TCP_FLAGS_FIN:
+                seg_len += 1
+            seq, ack = 0, tcp_hdr.seq + seg_len
+            flags = TCP_FLAGS_RST | TCP_FLAGS_ACK
+        return cls.create_packet(ip_hdr.dst, tcp_hdr.dport,
+                ip_hdr.src, tcp_hdr.sport, seq, ack, flags, window=0)
+
+    def handle_data(self, pkt: bytes, tcp_hdr: TCPHeaderView=None) -> None:
+        '''
+        Handle the data in the segment in the IP packet pkt.  tcp_hdr is the
+        view of its TCP header that handle_packet() has already decoded, if
+        any.
+        '''
+
+        ip_hdr_len = ip_header_len(pkt)
+        if tcp_hdr is None:
+            tcp_hdr = TCPHeaderView(pkt, ip_hdr_len)
+        data = memoryview(pkt)[ip_hdr_len + tcp_hdr.header_len:]
+
+        seg_len = len(data)
+        if self.receive_buffer is None:
+            self.receive_buffer = TCPReceiveBuffer(self.ack)
+        # data beyond the window is discarded, and acknowledged immediately
+        # (below), so that a zero-window probe is answered with our window
+        edge = self.receive_edge()
+        if tcp_hdr.seq + seg_len > edge:
+            data = data[:max(edge - tcp_hdr.seq, 0)]
+        self.receive_buffer.put(data, tcp_hdr.seq)
+        data, start = self.receive_buffer.get()
+        self.ack = self.receive_buffer.base_seq
+
+        # the data is made ready before it is acknowledged, so that the ACK
+        # advertises only the space that remains
+        ready = data and not self.shut_rd
+        if ready:
+            if self.ready_buffer is None:
+                self.ready_buffer = TCPReadyBuffer()
+            self.ready_buffer.put(data)
+
+        if not self.delayed_ack or tcp_hdr.seq != start or \
+                len(data) != seg_len or self.receive_buffer.buffer:
+            # Out-of-order or duplicate data, and data that fills a hole,
+            # are acknowledged immediately, so the sender learns of any loss
+            # without delay.
+            self.send_ack()
+        else:
+            # otherwise acknowledge every second full-sized segment
+            self._unacked_bytes += seg_len
+            if self._unacked_bytes >= 2 * self.mss:
+                self.send_ack()
+            elif self._delayed_ack_timer is None:
+                self._delayed_ack_timer = self.call_later(
+                        TCP_DELAYED_ACK_TIMEOUT, self.send_delayed_ack)
+
+        if ready:
+            self._notify_on_data()
+
+    def update_remote_window(self, tcp_hdr: TCPHeaderView) -> bool:
+        '''
+        Record the window advertised by the peer with an ACK, unless the ACK
+        is older than one already received, and return True if it changed.
+        The window of a SYNACK is never scaled, and it was already recorded by
+        negotiate_options().
+        '''
+
+        if tcp_hdr.flags & TCP_FLAGS_SYN or tcp_hdr.ack < self.seq:
+            return False
+        window = tcp_hdr.window << self.snd_wscale
+        if window == self.remote_window:
+            return False
+        self.remote_window = window
+        if window > 0:
+            self.cancel_persist_timer()
+        return True
+
+    def handle_ack(self, pkt: bytes, tcp_hdr: TCPHeaderView=None) -> None:
+        '''
+        Handle the acknowledgment in the segment in the IP packet pkt, as
+        handle_data() does its data.
+        '''
+
+        ip_hdr_len = ip_header_len(pkt)
+        if tcp_hdr is None:
+            tcp_hdr = TCPHeaderView(pkt, ip_hdr_len)
+        window_changed = self.update_remote_window(tcp_hdr)
+        if self._send_buffer is None:
+            # nothing has been sent, so there is nothing to acknowledge
+            return
+
+        ack = tcp_hdr.ack
+        if self.fin_seq is not None:
+            # the FIN is not in the send buffer (see handle_fin_ack())
+            ack = min(ack, self.fin_seq)
+        base_seq = self.send_buffer.base_seq
+        is_dup = False
+
+        if ack > base_seq:
+            # new data acknowledged
+            acked_bytes = ack - base_seq
+            self.send_buffer.slide(ack)
+            self.seq = ack
+            self.last_ack = ack
+            self.num_dup_acks = 0
+
+            rtt = None
+            if self._rtt_seq is not None and ack >= self._rtt_seq:
+                rtt = asyncio.get_event_loop().time() - self._rtt_start
+                self._rtt_seq = None
+                self.update_rto(rtt)
+
+            if self.send_buffer.bytes_outstanding() > 0 or \
+                    self.fin_outstanding():
+                self.restart_timer()
+            else:
+                self.cancel_timer()
+
+        elif ack == base_seq and not window_changed and \
+                self.send_buffer.bytes_outstanding() > 0 and \
+                len(pkt) == ip_hdr_len + tcp_hdr.header_len:
+            # (an ACK that only updates the window is not a duplicate)
+            is_dup = True
+            self.num_dup_acks += 1
+            self.dup_acks_received += 1
+
+        if self.sack_permitted:
+            if self.scoreboard is None:
+                self.scoreboard = TCPScoreboard()
+            if tcp_hdr.header_len > TCP_HEADER_LEN:
+                blocks = TCPHeader.unpack_from(pkt, ip_hdr_len).sack_blocks
+            else:
+                blocks = None
+            self.scoreboard.slide(self.send_buffer.base_seq)
+            if blocks:
+                self.scoreboard.update(blocks, self.send_buffer.base_seq,
+                        self.send_buffer.next_seq)
+            if self.recovery_point is not None or self.sack_loss_detected():
+                self.sack_recovery(ack)
+                if self.tracer is not None:
+                    self.trace(TCP_TRACE_DUP_ACK if is_dup else TCP_TRACE_ACK)
+                return
+
+        if ack > base_seq:
+            self.congestion.on_ack(acked_bytes, rtt)
+            if self.tracer is not None:
+                self.trace(TCP_TRACE_ACK)
+            self.send_if_possible()
+
+        elif is_dup:
+            if self.tracer is not None:
+                self.trace(TCP_TRACE_DUP_ACK)
+            # duplicate ACK; fast retransmit on the third duplicate only
+            if self.congestion.in_recovery:
+                self.congestion.on_dup_ack()
+                self.send_if_possible()
+            elif self.num_dup_acks == 3 and (self.fast_retransmit or \
+                    self.congestion.FAST_RETRANSMIT):
+                self.congestion.on_loss('dupack')
+                self.fast_retransmits += 1
+                if self.tracer is not None:
+                    self.trace(TCP_TRACE_FAST_RETRANSMIT)
+                self.retransmit()
+
+        elif window_changed:
+            # a window update, e.g., in response to a zero-window probe
+            self.send_if_possible()
+
+    def sack_lost_boundary(self) -> int:
+        '''
+        Return the sequence number below which all data not SACKed is
+        considered lost (see TCPScoreboard.lost_boundary()), but no lower than
+        the first unacknowledged byte.
+        '''
+
+        base_seq = self.send_buffer.base_seq
+        lost = self.scoreboard.lost_boundary(self.mss)
+        if lost is None:
+            return base_seq
+        return max(lost, base_seq)
+
+    def sack_loss_detected(self) -> bool:
+        '''
+        Return True if loss recovery should begin: after three duplicate ACKs,
+        or once the first unacknowledged byte is considered lost.
+        '''
+
+        if self.send_buffer.bytes_outstanding() == 0:
+            return False
+        return self.num_dup_acks >= 3 or \
+                self.sack_lost_boundary() > self.send_buffer.base_seq
+
+    def sack_pipe(self) -> int:
+        '''
+        Return the number of bytes estimated to be in flight: those neither
+        SACKed nor considered lost, plus those retransmitted but not yet
+        acknowledged (SetPipe() in RFC 6675).
+        '''
+
+        base_seq = self.send_buffer.base_seq
+        next_seq = self.send_buffer.next_seq
+        lost = self.sack_lost_boundary()
+        rxt = min(max(self.high_rxt, base_seq), lost)
+        return (next_seq - lost) - \
+                self.scoreboard.sacked_between(lost, next_seq) + \
+                (rxt - base_seq) - \
+                self.scoreboard.sacked_between(base_seq, rxt)
+
+    def sack_retransmit(self, start: int, end: int) -> None:
+        '''
+        Retransmit (at most) one segment from the hole [start, end).
+        '''
+
+        data, seq = self.send_buffer.get_at(start, min(self.mss, end - start))
+        if data:
+            self.send_packet(seq, self.ack, TCP_FLAGS_ACK, data)
+            self.segments_retransmitted += 1
+            self.bytes_retransmitted += len(data)
+            self.high_rxt = seq + len(data)
+        # a retransmitted segment cannot be timed (Karn's algorithm)
+        self._rtt_seq = None
+
+    def sack_send_next_segment(self) -> bool:
+        '''
+        Send the next segment during loss recovery: the next hole considered
+        lost or, failing that, new data (NextSeg() in RFC 6675).  Return False
+        if there was nothing to send.
+        '''
+
+        base_seq = self.send_buffer.base_seq
+        hole = self.scoreboard.next_hole(max(self.high_rxt, base_seq),
+                self.sack_lost_boundary())
+        if hole is not None:
+            self.sack_retransmit(*hole)
+            return True
+        if self.send_buffer.bytes_not_yet_sent() > 0:
+            # cwnd is applied to the pipe by the caller, but new data must
+            # still fit in the peer's window
+            size = self.mss
+            if self.remote_window is not None:
+                size = min(size, self.remote_window - \
+                        self.send_buffer.bytes_outstanding())
+            if size > 0:
+                self.send_new_segment(size)
+                return True
+        return False
+
+    def sack_recovery(self, ack: int) -> None:
+        '''
+        Enter, continue, or leave SACK-based loss recovery (RFC 6675,
+        Section 5) in response to an ACK.
+        '''
+
+        if self.recovery_point is None:
+            self.recovery_point = self.send_buffer.next_seq
+            self.high_rxt = self.send_buffer.base_seq
+            self.congestion.on_loss('sack')
+            self.fast_retransmits += 1
+            if self.tracer is not None:
+                self.trace(TCP_TRACE_FAST_RETRANSMIT)
+
+            # the first hole is retransmitted regardless of cwnd
+            hole = self.scoreboard.next_hole(self.send_buffer.base_seq,
+                    self.send_buffer.next_seq)
+            if hole is not None:
+                self.sack_retransmit(*hole)
+
+        elif ack >= self.recovery_point:
+            self.recovery_point = None
+            self.num_dup_acks = 0
+            self.send_if_possible()
+            return
+
+        while self.cwnd - self.sack_pipe() >= self.mss:
+            if not self.sack_send_next_segment():
+                break
+
+    def update_rto(self, rtt: float) -> None:
+        '''
+        Update the RTT estimates and the retransmission timeout with a new RTT
+        sample, as described in RFC 6298.  This also undoes any backoff.
+
+        rtt: The RTT sample, in seconds.
+        '''
+
+        self.latest_rtt = rtt
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+        rto = self.srtt + max(TCP_CLOCK_GRANULARITY, 4 * self.rttvar)
+        self.timeout = min(max(rto, TCP_MIN_RTO), TCP_MAX_RTO)
 
     def retransmit(self) -> None:
-        pass
+        # a retransmitted segment cannot be timed (Karn's algorithm)
+        self._rtt_seq = None
+
+        data, seq = self.send_buffer.get_for_resend(self.mss)
+        if data:
+            self.send_packet(seq, self.ack, TCP_FLAGS_ACK, data)
+            self.segments_retransmitted += 1
+            self.bytes_retransmitted += len(data)
+        elif self.fin_outstanding():
+            self.send_packet(self.fin_seq, self.ack,
+                    TCP_FLAGS_FIN | TCP_FLAGS_ACK)
+
+        if self.send_buffer.bytes_outstanding() > 0 or \
+                self.fin_outstanding():
+            self.restart_timer()
+        else:
+            self.cancel_timer()
+
+    def handle_timeout(self) -> None:
+        self.timer = None
+        # back off the timer until a new RTT sample is taken
+        self.timeout = min(self.timeout * 2, TCP_MAX_RTO)
+        if self.state == TCP_STATE_SYN_SENT:
+            self.timeouts += 1
+            self.retransmit_syn()
+            return
+        # the receiver may have discarded data that it SACKed, so start over
+        if self.scoreboard is not None:
+            self.scoreboard.clear()
+        self.recovery_point = None
+        self.timeouts += 1
+        self.congestion.on_timeout()
+        if self.tracer is not None:
+            self.trace(TCP_TRACE_TIMEOUT)
+        self.retransmit()
+
+    def use_timer_wheel(self, timer_wheel: TimerWheel) -> None:
+        super().use_timer_wheel(timer_wheel)
+        if self.timer is not None:
+            self.cancel_timer()
+            self.start_timer()
 
     def start_timer(self) -> None:
-        loop = asyncio.get_event_loop()
-        self.timer = loop.call_later(self.timeout, self.retransmit)
+        self.timer = self.call_later(self.timeout, self.handle_timeout)
+
+    def restart_timer(self) -> None:
+        '''
+        Restart the timer, so that it expires timeout seconds from now.  On a
+        timer wheel this just moves the deadline of the running timer.
+        '''
+
+        if self.timer is not None and self.timer_wheel is not None:
+            self.timer.reset(self.timeout)
+        else:
+            self.cancel_timer()
+            self.start_timer()
 
     def cancel_timer(self):
         if not self.timer:
@@ -326,3 +2140,45 @@ class TCPSocket(TCPSocketBase):
 
     def send_ack(self):
         self.send_packet(self.seq, self.ack, TCP_FLAGS_ACK)
+
+    def send_delayed_ack(self) -> None:
+        self._delayed_ack_timer = None
+        self.send_ack()
+
+    def cancel_delayed_ack(self) -> None:
+        self._unacked_bytes = 0
+        if self._delayed_ack_timer is not None:
+            self._delayed_ack_timer.cancel()
+            self._delayed_ack_timer = None
+
+
+class TCPTimeWait(TCPSocketBase):
+    '''
+    What remains of a connection in TIME_WAIT once its TCPSocket has been
+    released: just enough to acknowledge the peer's FIN again, should our ACK
+    of it have been lost.  The host keeps one of these (rather than the
+    socket, with its buffers) until TIME_WAIT expires.
+    '''
+
+    __slots__ = ('_local_addr', '_local_port', '_remote_addr', '_remote_port',
+            'seq', 'ack', '_send_ip_packet', 'timer')
+
+    def __init__(self, sock: TCPSocket) -> TCPTimeWait:
+        self._local_addr = sock._local_addr
+        self._local_port = sock._local_port
+        self._remote_addr = sock._remote_addr
+        self._remote_port = sock._remote_port
+        self.seq = sock.seq
+        self.ack = sock.ack
+        self._send_ip_packet = sock._send_ip_packet
+
+        # The timer that ends TIME_WAIT (set by the host)
+        self.timer = None
+
+    def handle_packet(self, pkt: bytes) -> None:
+        tcp_hdr = TCPHeaderView(pkt, ip_header_len(pkt))
+        if tcp_hdr.flags & TCP_FLAGS_FIN:
+            self._send_ip_packet(TCPSocket.create_packet(
+                self._local_addr, self._local_port,
+                self._remote_addr, self._remote_port,
+                self.seq, self.ack, TCP_FLAGS_ACK))
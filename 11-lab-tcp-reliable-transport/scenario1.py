@@ -29,7 +29,7 @@ class FileSenderReceiver:
             remote_addr, remote_port,
             local_initial_seq, remote_initial_seq,
             fast_retransmit, window, filename,
-            send_ip_packet_func, log):
+            send_ip_packet_func, log, pacing=False):
 
         self.filename = filename
         size = os.stat(filename).st_size
@@ -50,7 +50,7 @@ class FileSenderReceiver:
                 except:
                     traceback.print_exc()
 
-            def handle_ack(self1, pkt):
+            def handle_ack(self1, pkt, tcp_hdr=None):
                 try:
                     ip = IP(pkt)
                     tcp = ip.getlayer(TCP)
@@ -61,10 +61,12 @@ class FileSenderReceiver:
                             self1.__acked_step_index = STEPS
                         pct = int(self1.__acked_step_index*100/STEPS)
                         log(f'{pct}% has been acked')
+                        if pct == 100:
+                            log(f'{self1.segments_retransmitted} segments retransmitted')
                         self1.__acked_step_index += 1
                 except:
                     traceback.print_exc()
-                super(SimTCPSocket, self1).handle_ack(pkt)
+                super(SimTCPSocket, self1).handle_ack(pkt, tcp_hdr)
 
             def send_packet(self1, seq, ack, flags, data=b''):
                 try:
@@ -80,7 +82,7 @@ class FileSenderReceiver:
                     traceback.print_exc()
                 super(SimTCPSocket, self1).send_packet(seq, ack, flags, data=data)
 
-            def handle_data(self1, pkt):
+            def handle_data(self1, pkt, tcp_hdr=None):
                 try:
                     ip = IP(pkt)
                     tcp = ip.getlayer(TCP)
@@ -95,12 +97,13 @@ class FileSenderReceiver:
                         self1.__recvd_step_index += 1
                 except:
                     traceback.print_exc()
-                super(SimTCPSocket, self1).handle_data(pkt)
+                super(SimTCPSocket, self1).handle_data(pkt, tcp_hdr)
 
         self.sock = SimTCPSocket(local_addr, local_port,
                 remote_addr, remote_port, TCP_STATE_ESTABLISHED,
                 send_ip_packet_func, self.store_file_data,
-                fast_retransmit=fast_retransmit, initial_cwnd=window)
+                fast_retransmit=fast_retransmit, initial_cwnd=window,
+                pacing=pacing)
         self.sock.bypass_handshake(local_initial_seq, remote_initial_seq)
         self.fh = None
 
@@ -127,16 +130,18 @@ class FileSenderReceiver:
 
 
 class SimHost(TransportHost):
-    def schedule_items(self, window, fast_retransmit, filename):
+    def schedule_items(self, window, fast_retransmit, filename,
+            pacing=False):
         pass
 
 class SimHostA(SimHost):
-    def schedule_items(self, window, fast_retransmit, filename):
+    def schedule_items(self, window, fast_retransmit, filename,
+            pacing=False):
         app = FileSenderReceiver('10.0.0.1', A_PORT,
                 '10.0.0.2', B_PORT,
                 A_INITIAL_SEQ, B_INITIAL_SEQ,
                 window, fast_retransmit, filename,
-                self.send_packet, self.log)
+                self.send_packet, self.log, pacing=pacing)
 
         self.install_socket_tcp('10.0.0.1', A_PORT, '10.0.0.2', B_PORT, app.sock)
         loop = asyncio.get_event_loop()
@@ -144,12 +149,13 @@ class SimHostA(SimHost):
         loop.call_later(START_TIME + 2, app.send_file)
 
 class SimHostB(SimHost):
-    def schedule_items(self, window, fast_retransmit, filename):
+    def schedule_items(self, window, fast_retransmit, filename,
+            pacing=False):
         app = FileSenderReceiver('10.0.0.2', B_PORT,
                 '10.0.0.1', A_PORT,
                 B_INITIAL_SEQ, A_INITIAL_SEQ,
                 window, fast_retransmit, filename,
-                self.send_packet, self.log)
+                self.send_packet, self.log, pacing=pacing)
 
         self.install_socket_tcp('10.0.0.2', B_PORT, '10.0.0.1', A_PORT, app.sock)
         loop = asyncio.get_event_loop()
@@ -171,6 +177,10 @@ def main():
             action='store', type=str, choices=('on', 'off'),
             default='off',
             help='Congestion window size (bytes)')
+    parser.add_argument('--pacing',
+            action='store', type=str, choices=('on', 'off'),
+            default='off',
+            help='Pace segments at a rate derived from cwnd/SRTT')
     args = parser.parse_args(sys.argv[1:])
 
     hostname = socket.gethostname()
@@ -185,10 +195,12 @@ def main():
         fast_retransmit = True
     else:
         fast_retransmit = False
+    pacing = args.pacing == 'on'
 
 
     host = cls(args.router)
-    host.schedule_items(fast_retransmit, args.window, args.file)
+    host.schedule_items(fast_retransmit, args.window, args.file,
+            pacing=pacing)
     host.run()
 
 if __name__ == '__main__':
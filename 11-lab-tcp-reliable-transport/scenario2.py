@@ -12,6 +12,7 @@ from scapy.all import IP, Raw, TCP
 from scapy.data import IP_PROTOS
 from scapy.layers.inet import ETH_P_IP
 
+from congestion import CONGESTION_CONTROL
 from mysocket import TCPSocket, TCP_STATE_ESTABLISHED
 from transporthost import TransportHost
 
@@ -30,7 +31,7 @@ class FileSenderReceiver:
             local_initial_seq, remote_initial_seq,
             fast_retransmit, window,
             congestion_control, filename,
-            send_ip_packet_func, log):
+            send_ip_packet_func, log, pacing=False):
 
         self.filename = filename
         size = os.stat(filename).st_size
@@ -51,7 +52,7 @@ class FileSenderReceiver:
                 except:
                     traceback.print_exc()
 
-            def handle_ack(self1, pkt):
+            def handle_ack(self1, pkt, tcp_hdr=None):
                 try:
                     ip = IP(pkt)
                     tcp = ip.getlayer(TCP)
@@ -62,10 +63,12 @@ class FileSenderReceiver:
                             self1.__acked_step_index = STEPS
                         pct = int(self1.__acked_step_index*100/STEPS)
                         log(f'{pct}% has been acked')
+                        if pct == 100:
+                            log(f'{self1.segments_retransmitted} segments retransmitted')
                         self1.__acked_step_index += 1
                 except:
                     traceback.print_exc()
-                super(SimTCPSocket, self1).handle_ack(pkt)
+                super(SimTCPSocket, self1).handle_ack(pkt, tcp_hdr)
 
             def send_packet(self1, seq, ack, flags, data=b''):
                 try:
@@ -81,7 +84,7 @@ class FileSenderReceiver:
                     traceback.print_exc()
                 super(SimTCPSocket, self1).send_packet(seq, ack, flags, data=data)
 
-            def handle_data(self1, pkt):
+            def handle_data(self1, pkt, tcp_hdr=None):
                 try:
                     ip = IP(pkt)
                     tcp = ip.getlayer(TCP)
@@ -96,13 +99,14 @@ class FileSenderReceiver:
                         self1.__recvd_step_index += 1
                 except:
                     traceback.print_exc()
-                super(SimTCPSocket, self1).handle_data(pkt)
+                super(SimTCPSocket, self1).handle_data(pkt, tcp_hdr)
 
         self.sock = SimTCPSocket(local_addr, local_port,
                 remote_addr, remote_port, TCP_STATE_ESTABLISHED,
                 send_ip_packet_func, self.store_file_data,
                 fast_retransmit=fast_retransmit, initial_cwnd=window,
-                congestion_control=congestion_control)
+                congestion_control=congestion_control,
+                pacing=pacing)
         self.sock.bypass_handshake(local_initial_seq, remote_initial_seq)
         self.fh = None
 
@@ -130,17 +134,19 @@ class FileSenderReceiver:
 
 class SimHost(TransportHost):
     def schedule_items(self, window, congestion_control,
-            fast_retransmit, filename):
+            fast_retransmit, filename,
+            pacing=False):
         pass
 
 class SimHostA(SimHost):
     def schedule_items(self, window, congestion_control,
-            fast_retransmit, filename):
+            fast_retransmit, filename,
+            pacing=False):
         app = FileSenderReceiver('10.0.0.1', A_PORT,
                 '10.0.0.2', B_PORT,
                 A_INITIAL_SEQ, B_INITIAL_SEQ,
                 window, congestion_control, fast_retransmit, filename,
-                self.send_packet, self.log)
+                self.send_packet, self.log, pacing=pacing)
 
         self.install_socket_tcp('10.0.0.1', A_PORT, '10.0.0.2', B_PORT, app.sock)
         loop = asyncio.get_event_loop()
@@ -149,12 +155,13 @@ class SimHostA(SimHost):
 
 class SimHostB(SimHost):
     def schedule_items(self, window, congestion_control,
-            fast_retransmit, filename):
+            fast_retransmit, filename,
+            pacing=False):
         app = FileSenderReceiver('10.0.0.2', B_PORT,
                 '10.0.0.1', A_PORT,
                 B_INITIAL_SEQ, A_INITIAL_SEQ,
                 window, congestion_control, fast_retransmit, filename,
-                self.send_packet, self.log)
+                self.send_packet, self.log, pacing=pacing)
 
         self.install_socket_tcp('10.0.0.2', B_PORT, '10.0.0.1', A_PORT, app.sock)
         loop = asyncio.get_event_loop()
@@ -177,9 +184,13 @@ def main():
             default='off',
             help='Congestion window size (bytes)')
     parser.add_argument('--congestion-control',
-            action='store', type=str, choices=('none', 'tahoe'),
-            default='off',
+            action='store', type=str, choices=tuple(CONGESTION_CONTROL),
+            default='none',
             help='Congestion control algorithm to use')
+    parser.add_argument('--pacing',
+            action='store', type=str, choices=('on', 'off'),
+            default='off',
+            help='Pace segments at a rate derived from cwnd/SRTT')
     args = parser.parse_args(sys.argv[1:])
 
     hostname = socket.gethostname()
@@ -194,10 +205,12 @@ def main():
         fast_retransmit = True
     else:
         fast_retransmit = False
+    pacing = args.pacing == 'on'
 
     host = cls(args.router)
     host.schedule_items(fast_retransmit, args.window,
-            args.congestion_control, args.file)
+            args.congestion_control, args.file,
+            pacing=pacing)
     host.run()
 
 if __name__ == '__main__':
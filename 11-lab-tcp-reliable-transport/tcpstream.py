@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+
+from mysocket import TCPSocket, SHUT_WR, \
+        TCP_STATE_SYN_SENT, TCP_STATE_SYN_RECEIVED
+
+# The default limits, in bytes, on data passed to write() but not yet
+# acknowledged: writing is paused (i.e., drain() blocks) above the high-water
+# mark, until the peer has acknowledged enough that no more than the low-water
+# mark remains.  These are the defaults of the asyncio transports.
+TCP_STREAM_HIGH_WATER = 64 * 1024
+TCP_STREAM_LOW_WATER = TCP_STREAM_HIGH_WATER // 4
+
+# The most bytes passed to Protocol.data_received() at once
+TCP_STREAM_READ_SIZE = 64 * 1024
+
+class TCPTransport(asyncio.Transport):
+    '''
+    An asyncio Transport for a TCPSocket, so that any asyncio Protocol (e.g.,
+    the one behind a StreamReader and StreamWriter; see open_tcp_stream()) can
+    run over it.  The transport takes over the socket's notifications: ready
+    data is passed to the protocol's data_received(), unless reading is
+    paused, in which case it stays in the socket, and the window advertised
+    to the peer shrinks.  Writing is paused (pause_writing()) once more than
+    the high-water mark is waiting to be acknowledged.
+
+    The transport may be created before the socket's handshake completes:
+    what is written is buffered by the socket until then, and write_eof()
+    and close() are put off until then too, since they would otherwise
+    abort the connection.
+    '''
+
+    def __init__(self, sock: TCPSocket, protocol: asyncio.BaseProtocol,
+            loop: asyncio.AbstractEventLoop=None) -> TCPTransport:
+
+        super().__init__(extra={
+            'sockname': (sock._local_addr, sock._local_port),
+            'peername': (sock._remote_addr, sock._remote_port),
+            'socket': sock })
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._loop = loop
+        self._sock = sock
+        self._protocol = protocol
+
+        self._reading_paused = False
+        self._writing_paused = False
+        self._high_water = TCP_STREAM_HIGH_WATER
+        self._low_water = TCP_STREAM_LOW_WATER
+        self._eof_received = False
+        self._closing = False
+        self._conn_lost = False
+
+        # Whether the handshake was under way when the transport was created
+        # and has not completed since, and whether write_eof() was called in
+        # the meantime
+        self._connecting = sock.state in \
+                (TCP_STATE_SYN_SENT, TCP_STATE_SYN_RECEIVED)
+        self._eof_pending = False
+
+        sock.set_notify_on_data(self._data_ready)
+        sock.set_notify_on_write_space(self._write_space)
+        protocol.connection_made(self)
+        # anything received before the transport was created
+        loop.call_soon(self._data_ready)
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        return self._protocol
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        '''
+        Close the connection.  Data already written is still sent, followed
+        by our FIN, and the protocol's connection_lost() is called soon.
+        '''
+
+        if self._closing:
+            return
+        self._closing = True
+        if self._connecting:
+            # closed by _connected()
+            return
+        self._sock.close()
+        self._loop.call_soon(self._connection_lost, None)
+
+    def abort(self) -> None:
+        '''
+        Reset the connection, discarding any data not yet sent.
+        '''
+
+        self._closing = True
+        self._sock.abort()
+        self._loop.call_soon(self._connection_lost, None)
+
+    def is_reading(self) -> bool:
+        return not self._reading_paused and not self._closing
+
+    def pause_reading(self) -> None:
+        self._reading_paused = True
+
+    def resume_reading(self) -> None:
+        if self._reading_paused:
+            self._reading_paused = False
+            self._loop.call_soon(self._data_ready)
+
+    def write(self, data: bytes) -> None:
+        if self._closing or not data:
+            return
+        self._sock.send(data)
+        if not self._writing_paused and \
+                self.get_write_buffer_size() > self._high_water:
+            self._writing_paused = True
+            self._protocol.pause_writing()
+
+    def write_eof(self) -> None:
+        if self._connecting:
+            self._eof_pending = True
+        else:
+            self._sock.shutdown(SHUT_WR)
+
+    def can_write_eof(self) -> bool:
+        return True
+
+    def get_write_buffer_size(self) -> int:
+        return self._sock.send_buffer_size()
+
+    def get_write_buffer_limits(self) -> tuple[int, int]:
+        return self._low_water, self._high_water
+
+    def set_write_buffer_limits(self, high: int=None, low: int=None) -> None:
+        if high is None:
+            if low is None:
+                high = TCP_STREAM_HIGH_WATER
+            else:
+                high = 4 * low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError(f'high ({high!r}) must be >= low ({low!r}) ' + \
+                    'must be >= 0')
+        self._high_water = high
+        self._low_water = low
+        self._write_space()
+
+    def _write_space(self) -> None:
+        if self._connecting:
+            self._connected()
+        if self._writing_paused and \
+                self.get_write_buffer_size() <= self._low_water:
+            self._writing_paused = False
+            self._protocol.resume_writing()
+
+    def _connected(self) -> None:
+        '''
+        Carry out a close() or write_eof() that was put off until the
+        handshake completed.
+        '''
+
+        if self._sock.state == TCP_STATE_SYN_SENT or \
+                self._sock.state == TCP_STATE_SYN_RECEIVED:
+            return
+        self._connecting = False
+        if self._closing:
+            self._sock.close()
+            self._loop.call_soon(self._connection_lost, None)
+        elif self._eof_pending:
+            self._sock.shutdown(SHUT_WR)
+
+    def _data_ready(self) -> None:
+        if self._conn_lost:
+            return
+        sock = self._sock
+        while not self._reading_paused:
+            data = sock.recv(TCP_STREAM_READ_SIZE)
+            if not data:
+                break
+            self._protocol.data_received(data)
+
+        if sock.was_reset:
+            self._closing = True
+            self._connection_lost(ConnectionResetError(
+                    'Connection reset by peer'))
+        elif sock.timed_out:
+            self._closing = True
+            self._connection_lost(TimeoutError('Connection timed out'))
+        elif not self._eof_received and sock.at_eof():
+            self._eof_received = True
+            if not self._protocol.eof_received():
+                self.close()
+
+    def _connection_lost(self, exc: Exception) -> None:
+        if self._conn_lost:
+            return
+        self._conn_lost = True
+        self._sock.set_notify_on_data(None)
+        self._sock.set_notify_on_write_space(None)
+        self._protocol.connection_lost(exc)
+
+def open_tcp_stream(sock: TCPSocket, limit: int=TCP_STREAM_READ_SIZE) -> \
+        tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    '''
+    Return a StreamReader and StreamWriter for the connection of sock (e.g.,
+    one returned by TCPSocket.connect() or TCPListenerSocket.accept()).  The
+    reader buffers up to limit bytes (twice that before reading is paused),
+    and the writer's drain() waits while more than TCP_STREAM_HIGH_WATER
+    bytes are waiting to be acknowledged.
+    '''
+
+    loop = asyncio.get_event_loop()
+    reader = asyncio.StreamReader(limit=limit, loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport = TCPTransport(sock, protocol, loop)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import array
+import csv
+import json
+
+# The number of samples a tracer keeps by default; once it is full, each new
+# sample overwrites the oldest
+TCP_TRACE_DEFAULT_CAPACITY = 4096
+
+# The events at which a sample is taken
+TCP_TRACE_SEND = 0
+TCP_TRACE_ACK = 1
+TCP_TRACE_DUP_ACK = 2
+TCP_TRACE_FAST_RETRANSMIT = 3
+TCP_TRACE_TIMEOUT = 4
+
+TCP_TRACE_EVENT_NAMES = ('send', 'ack', 'dup_ack', 'fast_retransmit',
+        'timeout')
+
+TCP_TRACE_FIELDS = ('time', 'cwnd', 'inflight', 'srtt', 'event')
+
+class TCPTracer(object):
+    '''
+    A ring of fixed-size samples of one connection, taken by the socket (see
+    TCPSocket.trace()) whenever a segment is sent, an ACK arrives, or loss is
+    detected: the time (loop.time()), cwnd and bytes in flight, in bytes, the
+    smoothed RTT, in seconds (0.0 until it is measured), and the event.  Each
+    field is kept in an array allocated up front, so that recording a sample
+    allocates nothing and formats nothing; samples are only turned into
+    Python objects when they are read (see samples(), export_csv(), and
+    export_json()), after the run.
+    '''
+
+    __slots__ = ('capacity', 'count', '_next',
+            'times', 'cwnds', 'inflights', 'srtts', 'events')
+
+    def __init__(self, capacity: int=TCP_TRACE_DEFAULT_CAPACITY) -> TCPTracer:
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+
+        # The number of samples ever recorded, and the index at which the
+        # next one is written
+        self.count = 0
+        self._next = 0
+
+        self.times = array.array('d', bytes(8 * capacity))
+        self.cwnds = array.array('q', bytes(8 * capacity))
+        self.inflights = array.array('q', bytes(8 * capacity))
+        self.srtts = array.array('d', bytes(8 * capacity))
+        self.events = array.array('B', bytes(capacity))
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def dropped(self) -> int:
+        '''
+        Return the number of samples that have been overwritten.
+        '''
+
+        return max(self.count - self.capacity, 0)
+
+    def record(self, time: float, cwnd: int, inflight: int, srtt: float,
+            event: int) -> None:
+        i = self._next
+        self.times[i] = time
+        self.cwnds[i] = cwnd
+        self.inflights[i] = inflight
+        self.srtts[i] = srtt
+        self.events[i] = event
+        i += 1
+        self._next = i if i < self.capacity else 0
+        self.count += 1
+
+    def clear(self) -> None:
+        self.count = 0
+        self._next = 0
+
+    def samples(self) -> list[tuple[float, int, int, float, str]]:
+        '''
+        Return the samples held, oldest first, as (time, cwnd, inflight,
+        srtt, event name) tuples.
+        '''
+
+        if self.count > self.capacity:
+            order = list(range(self._next, self.capacity)) + \
+                    list(range(self._next))
+        else:
+            order = range(self.count)
+        return [(self.times[i], self.cwnds[i], self.inflights[i],
+                self.srtts[i], TCP_TRACE_EVENT_NAMES[self.events[i]])
+                for i in order]
+
+def export_csv(tracers: dict, f) -> None:
+    '''
+    Write the samples of tracers, a dictionary mapping (local address, local
+    port, remote address, remote port) to TCPTracer (e.g.,
+    TransportHost.tcp_tracers), to the text file f, one row per sample.
+    '''
+
+    writer = csv.writer(f)
+    writer.writerow(('local_addr', 'local_port', 'remote_addr',
+        'remote_port') + TCP_TRACE_FIELDS)
+    for conn, tracer in tracers.items():
+        for sample in tracer.samples():
+            writer.writerow(conn + sample)
+
+def export_json(tracers: dict, f) -> None:
+    '''
+    Write the samples of tracers (see export_csv()) to the text file f as a
+    JSON list with an object for each connection, in which each field of the
+    samples is a list (i.e., a column), ready to be plotted.
+    '''
+
+    conns = []
+    for (local_addr, local_port, remote_addr, remote_port), tracer in \
+            tracers.items():
+        columns = zip(*tracer.samples())
+        conn = {
+                'local_addr': local_addr,
+                'local_port': local_port,
+                'remote_addr': remote_addr,
+                'remote_port': remote_port,
+                'dropped': tracer.dropped(),
+        }
+        for field in TCP_TRACE_FIELDS:
+            conn[field] = list(next(columns, ()))
+        conns.append(conn)
+    json.dump(conns, f)
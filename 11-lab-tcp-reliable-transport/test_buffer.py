@@ -1,7 +1,9 @@
 import binascii
+import random
 import unittest
 
-from buffer import TCPSendBuffer, TCPReceiveBuffer
+from buffer import TCPSendBuffer, TCPReceiveBuffer, TCPReadyBuffer, \
+        TCPScoreboard
 
 
 class TestBuffer(unittest.TestCase):
@@ -77,6 +79,13 @@ class TestBuffer(unittest.TestCase):
         self.assertEqual(buf.bytes_not_yet_sent(), 3)
 
 
+        data, seq = buf.peek(1)
+        self.assertEqual(data, b'i')
+        self.assertEqual(seq, 1065)
+        self.assertEqual(buf.next_seq, 1065)
+        self.assertEqual(buf.bytes_not_yet_sent(), 3)
+
+
         data, seq = buf.get(4)
         self.assertEqual(data, b'ijk')
         self.assertEqual(seq, 1065)
@@ -88,6 +97,45 @@ class TestBuffer(unittest.TestCase):
         self.assertEqual(buf.bytes_not_yet_sent(), 0)
 
 
+    def test_send_buffer_chunks(self):
+        buf = TCPSendBuffer(0)
+        for i in range(200):
+            buf.put(bytes([i]) * 10)
+        self.assertEqual(buf.last_seq, 2000)
+
+        # a segment within a single chunk is a view, not a copy
+        data, seq = buf.get(10)
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(data, b'\x00' * 10)
+        self.assertEqual(seq, 0)
+
+        # a segment spanning chunks
+        data, seq = buf.get(25)
+        self.assertEqual(data, b'\x01' * 10 + b'\x02' * 10 + b'\x03' * 5)
+        self.assertEqual(seq, 10)
+
+        # acknowledge into the middle of a chunk
+        buf.slide(15)
+        data, seq = buf.get_for_resend(10)
+        self.assertEqual(data, b'\x01' * 5 + b'\x02' * 5)
+        self.assertEqual(seq, 15)
+
+        # acknowledge most of the buffer, forcing old chunks to be compacted
+        while buf.bytes_not_yet_sent() > 0:
+            buf.get(100)
+        buf.slide(1995)
+        self.assertEqual(buf.buffer, bytes([199]) * 5)
+        data, seq = buf.get_for_resend(100)
+        self.assertEqual(data, bytes([199]) * 5)
+        self.assertEqual(seq, 1995)
+        self.assertEqual(buf.bytes_outstanding(), 5)
+
+        buf.put(b'abc')
+        self.assertEqual(buf.buffer, bytes([199]) * 5 + b'abc')
+        buf.slide(2003)
+        self.assertEqual(buf.buffer, b'')
+        self.assertEqual(buf.get(10), (b'', 2003))
+
     def test_receive_buffer(self):
         buf = TCPReceiveBuffer(2021)
 
@@ -151,5 +199,122 @@ class TestBuffer(unittest.TestCase):
         self.assertEqual(start, 2030)
         self.assertEqual(buf.base_seq, 2036)
 
+    def test_receive_buffer_reordering(self):
+        rand = random.Random(460)
+        payload = bytes(rand.randrange(256) for i in range(20000))
+        base = 50000
+
+        # overlapping segments of random sizes, each sent (up to) three times,
+        # delivered in random order
+        segments = []
+        for i in range(3):
+            seq = 0
+            while seq < len(payload):
+                size = rand.randint(1, 300)
+                segments.append((payload[seq:seq + size], base + seq))
+                seq += rand.randint(1, size)
+        rand.shuffle(segments)
+
+        buf = TCPReceiveBuffer(base)
+        received = b''
+        for n, (data, seq) in enumerate(segments):
+            buf.put(data, seq)
+            if n % 50 == 0:
+                # buffered segments never overlap and never precede base_seq
+                prev_end = buf.base_seq
+                for start in sorted(buf.buffer):
+                    self.assertGreaterEqual(start, prev_end)
+                    self.assertEqual(buf.buffer[start],
+                            payload[start - base:start - base + \
+                                len(buf.buffer[start])])
+                    prev_end = start + len(buf.buffer[start])
+            data, start = buf.get()
+            self.assertEqual(start, base + len(received))
+            received += data
+
+        self.assertEqual(received, payload)
+        self.assertEqual(buf.base_seq, base + len(payload))
+        self.assertEqual(buf.buffer, {})
+
+    def test_sack_blocks(self):
+        buf = TCPReceiveBuffer(1000)
+        self.assertEqual(buf.sack_blocks(4), [])
+
+        buf.put(b'x' * 100, 1100)
+        buf.put(b'x' * 100, 1200)
+        buf.put(b'x' * 100, 1500)
+        buf.put(b'x' * 100, 1800)
+        buf.put(b'x' * 100, 1400)
+
+        # the block with the most recent segment comes first
+        self.assertEqual(buf.sack_blocks(4),
+                [(1400, 1600), (1800, 1900), (1100, 1300)])
+        self.assertEqual(buf.sack_blocks(2), [(1400, 1600), (1800, 1900)])
+
+        buf.put(b'x' * 100, 1000)
+        data, start = buf.get()
+        self.assertEqual(len(data), 300)
+        self.assertEqual(buf.sack_blocks(4), [(1800, 1900), (1400, 1600)])
+
+    def test_scoreboard(self):
+        sb = TCPScoreboard()
+        sb.update([(3000, 4000), (5000, 6000)], 1000, 10000)
+        sb.update([(4000, 4500), (8000, 12000), (100, 900)], 1000, 10000)
+        self.assertEqual(len(sb), 3)
+        self.assertEqual(sb.sacked_bytes, 4500)
+        self.assertTrue(sb.is_sacked(4499))
+        self.assertFalse(sb.is_sacked(4500))
+        self.assertEqual(sb.sacked_between(4000, 9000), 2500)
+
+        # more than 2 * 1000 bytes are SACKed above 5000
+        self.assertEqual(sb.lost_boundary(1000), 5000)
+        # with a larger MSS, only the three discontiguous ranges above 3000
+        # are enough
+        self.assertEqual(sb.lost_boundary(2000), 3000)
+
+        self.assertEqual(sb.next_hole(1000, 10000), (1000, 3000))
+        self.assertEqual(sb.next_hole(3500, 10000), (4500, 5000))
+        self.assertEqual(sb.next_hole(6000, 7000), (6000, 7000))
+        self.assertIsNone(sb.next_hole(8000, 10000))
+
+        sb.slide(3500)
+        self.assertEqual(sb.sacked_bytes, 4000)
+        self.assertEqual(sb.next_hole(3500, 10000), (4500, 5000))
+        sb.slide(10000)
+        self.assertEqual(len(sb), 0)
+        self.assertEqual(sb.sacked_bytes, 0)
+        self.assertIsNone(sb.lost_boundary(1000))
+
+    def test_ready_buffer(self):
+        buf = TCPReadyBuffer()
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(buf.get(10), b'')
+
+        buf.put(b'abcdef')
+        buf.put(b'')
+        buf.put(b'ghi')
+        buf.put(b'jklmnop')
+        self.assertEqual(len(buf), 16)
+
+        # partial reads within and across chunks
+        self.assertEqual(buf.get(2), b'ab')
+        self.assertEqual(buf.get(6), b'cdefgh')
+        self.assertEqual(len(buf), 8)
+
+        # not enough data for an exact read
+        self.assertIsNone(buf.get_exactly(9))
+        self.assertEqual(len(buf), 8)
+        self.assertEqual(buf.get_exactly(3), b'ijk')
+
+        # read into a caller-supplied buffer
+        dst = bytearray(4)
+        self.assertEqual(buf.get_into(dst), 4)
+        self.assertEqual(dst, b'lmno')
+
+        buf.put(b'qrs')
+        self.assertEqual(buf.get_all(), [b'p', b'qrs'])
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(buf.get_into(dst, 2), 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+
+from buffer import TCPSendBuffer
+from congestion import create_congestion_control
+
+
+class FakeSocket(object):
+    def __init__(self, cwnd, ssthresh=64000, mss=1000):
+        self.cwnd = cwnd
+        self.cwnd_inc = 0
+        self.ssthresh = ssthresh
+        self.mss = mss
+        self.send_buffer = TCPSendBuffer(1)
+        self.retransmits = 0
+
+    def retransmit(self):
+        self.retransmits += 1
+
+    def send(self, num):
+        self.send_buffer.put(b'x' * num)
+        self.send_buffer.get(num)
+
+    def ack(self, cc, num):
+        self.send_buffer.slide(self.send_buffer.base_seq + num)
+        cc.on_ack(num, None)
+
+
+class TestCongestionControl(unittest.TestCase):
+
+    def test_unknown(self):
+        self.assertRaises(ValueError,
+                create_congestion_control, 'vegas', FakeSocket(1000))
+
+    def test_none(self):
+        sock = FakeSocket(10000)
+        cc = create_congestion_control('none', sock)
+        sock.send(10000)
+        sock.ack(cc, 10000)
+        cc.on_loss('dupack')
+        cc.on_timeout()
+        self.assertEqual(sock.cwnd, 10000)
+
+    def test_tahoe(self):
+        sock = FakeSocket(1000, ssthresh=4000)
+        cc = create_congestion_control('tahoe', sock)
+
+        # slow start
+        for cwnd in (2000, 3000, 4000):
+            sock.send(1000)
+            sock.ack(cc, 1000)
+            self.assertEqual(sock.cwnd, cwnd)
+
+        # additive increase: one MSS per window
+        for i in range(4):
+            sock.send(1000)
+            sock.ack(cc, 1000)
+        self.assertEqual(sock.cwnd, 5000)
+        self.assertEqual(sock.cwnd_inc, 0)
+
+        cc.on_loss('dupack')
+        self.assertEqual(sock.cwnd, 1000)
+        self.assertEqual(sock.ssthresh, 2500)
+
+    def test_reno(self):
+        sock = FakeSocket(10000)
+        cc = create_congestion_control('reno', sock)
+        sock.send(10000)
+
+        cc.on_loss('dupack')
+        self.assertTrue(cc.in_recovery)
+        self.assertEqual(sock.ssthresh, 5000)
+        self.assertEqual(sock.cwnd, 8000)
+        cc.on_dup_ack()
+        self.assertEqual(sock.cwnd, 9000)
+
+        # any new ACK ends recovery
+        sock.ack(cc, 1000)
+        self.assertFalse(cc.in_recovery)
+        self.assertEqual(sock.cwnd, 5000)
+
+        cc.on_timeout()
+        self.assertEqual(sock.cwnd, 1000)
+        self.assertEqual(sock.ssthresh, 4000)
+
+    def test_newreno(self):
+        sock = FakeSocket(10000)
+        cc = create_congestion_control('newreno', sock)
+        sock.send(10000)
+
+        cc.on_loss('dupack')
+        self.assertEqual(cc.recover, 10001)
+
+        # a partial ACK retransmits and stays in recovery
+        sock.ack(cc, 3000)
+        self.assertTrue(cc.in_recovery)
+        self.assertEqual(sock.retransmits, 1)
+        self.assertEqual(sock.cwnd, 6000)
+
+        # a full ACK ends recovery
+        sock.ack(cc, 7000)
+        self.assertFalse(cc.in_recovery)
+        self.assertEqual(sock.cwnd, 2000)
+
+    def test_cubic(self):
+        sock = FakeSocket(20000, ssthresh=1000)
+        cc = create_congestion_control('cubic', sock)
+        sock.send(20000)
+
+        cc.on_loss('dupack')
+        self.assertEqual(sock.ssthresh, 14000)
+        self.assertEqual(cc.w_max, 20)
+        sock.ack(cc, 20000)
+        self.assertFalse(cc.in_recovery)
+
+        # in congestion avoidance, K seconds after the loss, the window has
+        # grown back to w_max
+        sock.cwnd = sock.ssthresh
+        sock.send(1000)
+        sock.ack(cc, 1000)
+        self.assertAlmostEqual(cc.k, (6 / cc.C) ** (1 / 3))
+        cc.epoch_start -= cc.k
+        for i in range(100):
+            sock.send(1000)
+            sock.ack(cc, 1000)
+        self.assertEqual(sock.cwnd, 20000)
+
+if __name__ == '__main__':
+    unittest.main()
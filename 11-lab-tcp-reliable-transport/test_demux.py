@@ -0,0 +1,179 @@
+import asyncio
+import unittest
+
+from demux import TCPDemux
+from headers import IPv4Header, TCPHeader, IP_HEADER_LEN, TCP_HEADER_LEN
+from mysocket import TCPListenerSocket, TCPSocket, TCPTimeWait, \
+        TCP_FLAGS_ACK, TCP_FLAGS_SYN, TCP_STATE_CLOSED, \
+        TCP_STATE_ESTABLISHED, TCP_STATE_SYN_SENT, TCP_STATE_TIME_WAIT
+from timerwheel import TimerWheel
+
+
+def segment(src, sport, dst, dport, flags=TCP_FLAGS_ACK):
+    return TCPSocket.create_packet(src, sport, dst, dport, 0, 0, flags)
+
+
+class TestTCPDemux(unittest.TestCase):
+
+    def test_lookup(self):
+        demux = TCPDemux()
+        listener = object()
+        conn1 = object()
+        conn2 = object()
+        demux.add_listener('10.0.0.1', 80, listener)
+        demux.add_connection('10.0.0.1', 80, '10.0.0.2', 1234, conn1)
+        demux.add_connection('10.0.0.1', 80, '10.0.0.3', 1234, conn2)
+        self.assertEqual(len(demux), 2)
+
+        self.assertIs(demux.lookup(
+            segment('10.0.0.2', 1234, '10.0.0.1', 80)), conn1)
+        self.assertIs(demux.lookup(
+            segment('10.0.0.3', 1234, '10.0.0.1', 80)), conn2)
+
+        # unknown connection: falls back to the listener
+        self.assertIs(demux.lookup(
+            segment('10.0.0.2', 1235, '10.0.0.1', 80, TCP_FLAGS_SYN)),
+            listener)
+        self.assertIs(demux.lookup(
+            segment('10.0.0.4', 1234, '10.0.0.1', 80)), listener)
+
+        # no listener either
+        self.assertIsNone(demux.lookup(
+            segment('10.0.0.2', 1234, '10.0.0.1', 81)))
+        self.assertIsNone(demux.lookup(
+            segment('10.0.0.2', 1234, '10.0.0.5', 80)))
+
+    def test_lookup_ip_options(self):
+        demux = TCPDemux()
+        listener = object()
+        conn = object()
+        demux.add_listener('10.0.0.1', 80, listener)
+        demux.add_connection('10.0.0.1', 80, '10.0.0.2', 1234, conn)
+
+        for sport, expected in (1234, conn), (1235, listener):
+            ip_hdr = IPv4Header(IP_HEADER_LEN + 4 + TCP_HEADER_LEN, 64, 6, 0,
+                    '10.0.0.2', '10.0.0.1', options=b'\x01\x01\x01\x00')
+            tcp_hdr = TCPHeader(sport, 80, 0, 0, TCP_FLAGS_ACK, 0, 0)
+            pkt = ip_hdr.to_bytes() + tcp_hdr.to_bytes()
+            self.assertEqual(pkt[0] & 0x0f, 6)
+            self.assertIs(demux.lookup(pkt), expected)
+
+    def test_lookup_ipv6(self):
+        demux = TCPDemux()
+        listener = object()
+        conn = object()
+        demux.add_listener('2001:db8::1', 80, listener)
+        demux.add_connection('2001:db8::1', 80, '2001:db8::2', 1234, conn)
+
+        self.assertIs(demux.lookup(
+            segment('2001:db8::2', 1234, '2001:db8::1', 80)), conn)
+        self.assertIs(demux.lookup(
+            segment('2001:db8::2', 1235, '2001:db8::1', 80)), listener)
+        self.assertIsNone(demux.lookup(
+            segment('2001:db8::2', 1234, '2001:db8::3', 80)))
+
+    def test_release(self):
+        async def run():
+            demux = TCPDemux(TimerWheel(tick=0.01), time_wait_timeout=0.03)
+            listener = object()
+            demux.add_listener('10.0.0.1', 80, listener)
+            socks = []
+            for remote_port in 1234, 1235:
+                sock = TCPSocket('10.0.0.1', 80, '10.0.0.2', remote_port,
+                        TCP_STATE_ESTABLISHED, lambda pkt: None, lambda: None)
+                sock.bypass_handshake(100, 500)
+                sock.release_func = demux.release
+                demux.add_connection('10.0.0.1', 80, '10.0.0.2', remote_port,
+                        sock)
+                socks.append(sock)
+
+            # closed: gone; TIME_WAIT: replaced by a TCPTimeWait
+            socks[0].state = TCP_STATE_CLOSED
+            socks[0].release()
+            socks[1].state = TCP_STATE_TIME_WAIT
+            socks[1].release()
+            self.assertEqual(len(demux), 0)
+            self.assertEqual(len(demux.time_wait), 1)
+
+            self.assertIs(demux.lookup(
+                segment('10.0.0.2', 1234, '10.0.0.1', 80)), listener)
+            entry = demux.lookup(segment('10.0.0.2', 1235, '10.0.0.1', 80))
+            self.assertIsInstance(entry, TCPTimeWait)
+            # a SYN may start a new connection
+            self.assertIs(demux.lookup(
+                segment('10.0.0.2', 1235, '10.0.0.1', 80, TCP_FLAGS_SYN)),
+                listener)
+
+            await asyncio.sleep(0.06)
+            self.assertEqual(len(demux.time_wait), 0)
+            self.assertIs(demux.lookup(
+                segment('10.0.0.2', 1235, '10.0.0.1', 80)), listener)
+
+        asyncio.run(run())
+
+    def test_stats(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            demux = TCPDemux()
+            clients = []
+            sent = []
+
+            def to_server(pkt):
+                # lose the third data segment
+                if len(pkt) > IP_HEADER_LEN + TCP_HEADER_LEN and \
+                        not pkt[IP_HEADER_LEN + 13] & TCP_FLAGS_SYN:
+                    sent.append(pkt)
+                    if len(sent) == 3:
+                        return
+                loop.call_later(0.001, demux.lookup(pkt).handle_packet, pkt)
+
+            def to_client(pkt):
+                loop.call_later(0.001, clients[0].handle_packet, pkt)
+
+            def handle_new_client(local_addr, local_port, remote_addr,
+                    remote_port, sock):
+                demux.add_connection(local_addr, local_port,
+                        remote_addr, remote_port, sock)
+
+            listener = TCPListenerSocket('10.0.0.1', 80, handle_new_client,
+                    to_client, None)
+            demux.add_listener('10.0.0.1', 80, listener)
+            client = TCPSocket.connect('10.0.0.2', 1234, '10.0.0.1', 80,
+                    to_server, None, fast_retransmit=True, initial_cwnd=8000)
+            clients.append(client)
+            await asyncio.sleep(0.01)
+            client.send(b'x' * 8000)
+            await asyncio.sleep(0.05)
+
+            stats = client.stats()
+            self.assertEqual(stats['state'], TCP_STATE_ESTABLISHED)
+            self.assertEqual(stats['bytes_sent'], 8000)
+            self.assertEqual(stats['bytes_acked'], 8000)
+            self.assertEqual(stats['data_segments_sent'], 8)
+            self.assertEqual(stats['dup_acks_received'], 5)
+            self.assertEqual(stats['fast_retransmits'], 1)
+            self.assertEqual(stats['segments_retransmitted'], 1)
+            self.assertEqual(stats['bytes_retransmitted'], 1000)
+            self.assertEqual(stats['timeouts'], 0)
+            self.assertEqual(stats['send_buffered'], 0)
+            self.assertIsNotNone(stats['srtt'])
+            times = stats['state_times']
+            self.assertGreater(times[TCP_STATE_SYN_SENT], 0.0)
+            self.assertGreater(times[TCP_STATE_ESTABLISHED], 0.05)
+            self.assertAlmostEqual(sum(times.values()), 0.06, delta=0.03)
+
+            snapshot = demux.stats()
+            self.assertEqual(snapshot['time_wait'], 0)
+            listener_stats = snapshot['listeners'][('10.0.0.1', 80)]
+            self.assertEqual(listener_stats['syn_queue'], 0)
+            self.assertEqual(listener_stats['accept_queue_drops'], 0)
+            server = snapshot['connections'][
+                    ('10.0.0.1', 80, '10.0.0.2', 1234)]
+            self.assertEqual(server['bytes_received'], 8000)
+            self.assertEqual(server['ready'], 8000)
+            self.assertEqual(server['bytes_sent'], 0)
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
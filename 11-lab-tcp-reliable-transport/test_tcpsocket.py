@@ -0,0 +1,890 @@
+import asyncio
+import unittest
+
+from bench_transfer import VirtualTimeEventLoop
+from headers import IP_HEADER_LEN, TCP_HEADER_LEN, TCPHeader, TCPHeaderView
+from mysocket import TCPListenerSocket, TCPSocket, TCPTimeWait, \
+        TCP_STATE_ESTABLISHED, TCP_STATE_LISTEN, TCP_STATE_CLOSED, \
+        TCP_STATE_SYN_SENT, TCP_STATE_FIN_WAIT_1, TCP_STATE_FIN_WAIT_2, \
+        TCP_STATE_CLOSE_WAIT, TCP_STATE_CLOSING, TCP_STATE_LAST_ACK, \
+        TCP_STATE_TIME_WAIT, SHUT_WR, \
+        TCP_FLAGS_SYN, TCP_FLAGS_ACK, TCP_FLAGS_FIN, \
+        TCP_SYN_RETRIES, TCP_SYNACK_RETRIES, \
+        TCP_SYN_LOSS_RTO, TCP_INITIAL_RTO, TCP_MIN_RTO, TCP_MAX_RTO, \
+        TCP_DELAYED_ACK_TIMEOUT, TCP_PACING_SS_RATIO, TCP_PACING_CA_RATIO, \
+        TCP_FLAGS_RST, TCP_SYN_COOKIE_PERIOD
+
+
+def data_segments(pkts):
+    '''
+    Return the relative sequence number of each segment in pkts that carries
+    data (the client's base sequence number is 100).
+    '''
+
+    return [TCPHeaderView(pkt, IP_HEADER_LEN).seq - 101 for pkt in pkts
+            if len(pkt) > IP_HEADER_LEN + TCP_HEADER_LEN]
+
+
+def established_pair(drop=(), **socket_kwargs):
+    '''
+    Return a client and server TCPSocket, past the handshake and connected
+    by a link with a delay of a millisecond each way, along with the list of
+    segments sent by the client.  The client's data segments whose relative
+    sequence numbers are in drop are lost, the first time they are sent.
+    '''
+
+    loop = asyncio.get_running_loop()
+    socks = {}
+    sent = []
+    drop = set(drop)
+
+    def to_server(pkt):
+        sent.append(pkt)
+        seqs = data_segments([pkt])
+        if seqs and seqs[0] in drop:
+            drop.discard(seqs[0])
+            return
+        loop.call_later(0.001, socks['server'].handle_packet, pkt)
+
+    def to_client(pkt):
+        loop.call_later(0.001, socks['client'].handle_packet, pkt)
+
+    socks['client'] = TCPSocket('10.0.0.1', 1234, '10.0.0.2', 80,
+            TCP_STATE_ESTABLISHED, to_server, lambda: None, **socket_kwargs)
+    socks['client'].bypass_handshake(100, 500)
+    socks['server'] = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+            TCP_STATE_ESTABLISHED, to_client, lambda: None, **socket_kwargs)
+    socks['server'].bypass_handshake(500, 100)
+    return socks['client'], socks['server'], sent
+
+
+def received(sock):
+    return b''.join(sock.recv_all())
+
+
+def run_virtual(coro):
+    '''
+    Run coro on an event loop with a virtual clock, so that tests of the
+    handshake's (long) timeouts finish immediately.
+    '''
+
+    loop = VirtualTimeEventLoop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class TestTCPSocketSender(unittest.TestCase):
+
+    def test_window(self):
+        async def run():
+            client, server, sent = established_pair(initial_cwnd=3000)
+            client.send(b'x' * 10000)
+            # no more than cwnd is sent before the first ACK
+            self.assertEqual(data_segments(sent), [0, 1000, 2000])
+
+            await asyncio.sleep(0.1)
+            self.assertEqual(received(server), b'x' * 10000)
+            self.assertEqual(data_segments(sent), list(range(0, 10000, 1000)))
+            self.assertEqual(client.send_buffer.bytes_outstanding(), 0)
+            self.assertIsNone(client.timer)
+
+        asyncio.run(run())
+
+    def test_fast_retransmit(self):
+        async def run():
+            client, server, sent = established_pair(drop=[1000],
+                    initial_cwnd=5000, fast_retransmit=True)
+            payload = bytes(range(250)) * 40
+            client.send(payload)
+            await asyncio.sleep(0.1)
+
+            # the lost segment is resent after the third duplicate ACK,
+            # long before the retransmission timer would have expired
+            self.assertEqual(received(server), payload)
+            self.assertEqual(data_segments(sent).count(1000), 2)
+            self.assertEqual(len(data_segments(sent)), 11)
+
+        asyncio.run(run())
+
+    def test_timeout(self):
+        async def run():
+            client, server, sent = established_pair(drop=[0])
+            client.send(b'y' * 1000)
+            await asyncio.sleep(0.1)
+            self.assertEqual(received(server), b'')
+            self.assertIsNotNone(client.timer)
+
+            # resent once the retransmission timer expires
+            await asyncio.sleep(1.0)
+            self.assertEqual(received(server), b'y' * 1000)
+            self.assertEqual(data_segments(sent), [0, 0])
+
+        asyncio.run(run())
+
+    def test_nagle(self):
+        async def run():
+            client, server, sent = established_pair(nagle=True,
+                    initial_cwnd=10000)
+            for i in range(10):
+                client.send(b'z' * 350)
+            # writes in the same iteration of the event loop are coalesced,
+            # and the small segment that remains waits for the ACK
+            await asyncio.sleep(0)
+            self.assertEqual(data_segments(sent), [0, 1000, 2000])
+            await asyncio.sleep(0.05)
+            self.assertEqual(data_segments(sent), [0, 1000, 2000, 3000])
+            self.assertEqual(received(server), b'z' * 3500)
+            self.assertEqual(client.segments_saved, 6)
+
+        asyncio.run(run())
+
+    def test_cork(self):
+        async def run():
+            client, server, sent = established_pair(initial_cwnd=10000)
+            client.cork()
+            client.send(b'c' * 2500)
+            await asyncio.sleep(0.01)
+            self.assertEqual(data_segments(sent), [0, 1000])
+            client.uncork()
+            self.assertEqual(data_segments(sent), [0, 1000, 2000])
+
+        asyncio.run(run())
+
+    def send_times(self, ssthresh=64000, **socket_kwargs):
+        '''
+        Return the times at which 10 full-sized segments, written at once,
+        are sent, with an SRTT of 100 ms and a cwnd that allows all of them.
+        '''
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            times = []
+            # nothing is acknowledged, so cwnd and SRTT stay put
+            client = TCPSocket('10.0.0.1', 1234, '10.0.0.2', 80,
+                    TCP_STATE_ESTABLISHED,
+                    lambda pkt: times.append(loop.time()), None,
+                    initial_cwnd=10000, **socket_kwargs)
+            client.bypass_handshake(100, 500)
+            client.ssthresh = ssthresh
+            client.update_rto(0.1)
+            client.send(b'p' * 10000)
+            # (the RTO, 300 ms, is yet to expire)
+            await asyncio.sleep(0.2)
+            return times
+
+        return run_virtual(run())
+
+    def assert_gaps(self, times, gap):
+        self.assertEqual(len(times), 10)
+        self.assertEqual(times[0], 0)
+        for t0, t1 in zip(times, times[1:]):
+            self.assertAlmostEqual(t1 - t0, gap)
+
+    def test_pacing(self):
+        # one segment every MSS/rate seconds, where the rate is cwnd/SRTT
+        # scaled by TCP_PACING_SS_RATIO in slow start...
+        self.assert_gaps(self.send_times(pacing=True),
+                1000 / (TCP_PACING_SS_RATIO * 10000 / 0.1))
+        # ...and by TCP_PACING_CA_RATIO in congestion avoidance
+        self.assert_gaps(self.send_times(ssthresh=5000, pacing=True),
+                1000 / (TCP_PACING_CA_RATIO * 10000 / 0.1))
+
+    def test_no_pacing(self):
+        # without pacing, the whole window is sent at once
+        self.assertEqual(self.send_times(), [0] * 10)
+
+
+class TestTCPSocketWindow(unittest.TestCase):
+
+    def test_persist(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            client, server, sent = established_pair(initial_cwnd=10000,
+                    receive_window=4000)
+            client.send(b'w' * 10000)
+            await asyncio.sleep(0.1)
+            # the application is not reading, so the window closes, and no
+            # ACK is coming to open it, so the persist timer is armed
+            self.assertEqual(server.relative_seq_other(server.ack), 4001)
+            self.assertEqual(client.remote_window, 0)
+            self.assertIsNone(client.timer)
+            self.assertIsNotNone(client._persist_timer)
+            self.assertEqual(client.window_probes, 0)
+
+            # the probes back off, from the RTO to TCP_MAX_RTO
+            rto = client.timeout
+            probes = []
+            while loop.time() < 250:
+                await asyncio.sleep(0.1)
+                if client.window_probes > len(probes):
+                    probes.append(loop.time())
+                    self.assertEqual(client._persist_timeout,
+                            min(rto * 2 ** len(probes), TCP_MAX_RTO))
+            gaps = [round(t1 - t0, 1) for t0, t1 in zip(probes, probes[1:])]
+            self.assertEqual(gaps, [0.4, 0.8, 1.6, 3.2, 6.4, 12.8, 25.6,
+                    51.2, 60.0, 60.0])
+            # each probe is discarded, as it is beyond the window
+            self.assertEqual(server.relative_seq_other(server.ack), 4001)
+
+            # reading opens the window, and the window update resumes sending
+            data = b''
+            while len(data) < 10000 and loop.time() < 260:
+                data += received(server)
+                await asyncio.sleep(0.01)
+            self.assertEqual(data, b'w' * 10000)
+            self.assertIsNone(client._persist_timer)
+            self.assertIsNone(client._persist_timeout)
+            self.assertEqual(client.window_probes, len(probes))
+
+        run_virtual(run())
+
+    def test_silly_window(self):
+        async def run():
+            client, server, sent = established_pair(initial_cwnd=10000,
+                    receive_window=4000)
+            client.send(b'v' * 10000)
+            await asyncio.sleep(0.1)
+            self.assertEqual(server.relative_seq_other(server.ack), 4001)
+
+            # reading less than an MSS does not open the window...
+            self.assertEqual(len(server.recv(500)), 500)
+            await asyncio.sleep(0.1)
+            self.assertEqual(server.relative_seq_other(server.ack), 4001)
+            self.assertEqual(server.advertised_window(TCP_FLAGS_ACK), 0)
+
+            # ...until a full segment fits
+            self.assertEqual(len(server.recv(500)), 500)
+            await asyncio.sleep(0.1)
+            self.assertEqual(server.relative_seq_other(server.ack), 5001)
+            self.assertEqual(data_segments(sent)[-1], 4000)
+
+        run_virtual(run())
+
+
+class TestTCPSocketRTO(unittest.TestCase):
+
+    def test_estimator(self):
+        async def run():
+            sock = TCPSocket('10.0.0.1', 1234, '10.0.0.2', 80,
+                    TCP_STATE_ESTABLISHED, None, None)
+            self.assertEqual(sock.timeout, TCP_INITIAL_RTO)
+
+            # the first sample: SRTT = R, RTTVAR = R/2, RTO = SRTT + 4*RTTVAR
+            sock.update_rto(0.5)
+            self.assertEqual((sock.srtt, sock.rttvar), (0.5, 0.25))
+            self.assertAlmostEqual(sock.timeout, 1.5)
+
+            # later samples are smoothed, with alpha = 1/8 and beta = 1/4
+            sock.update_rto(1.0)
+            self.assertAlmostEqual(sock.rttvar, 0.3125)
+            self.assertAlmostEqual(sock.srtt, 0.5625)
+            self.assertAlmostEqual(sock.timeout, 1.8125)
+            self.assertEqual((sock.latest_rtt, sock.min_rtt), (1.0, 0.5))
+
+            # the RTO is never less than TCP_MIN_RTO
+            sock = TCPSocket('10.0.0.1', 1234, '10.0.0.2', 80,
+                    TCP_STATE_ESTABLISHED, None, None)
+            sock.update_rto(0.002)
+            self.assertEqual(sock.timeout, TCP_MIN_RTO)
+
+        run_virtual(run())
+
+    def test_sample(self):
+        async def run():
+            client, server, sent = established_pair()
+            client.send(b'r' * 1000)
+            await asyncio.sleep(0.1)
+            return client
+
+        client = run_virtual(run())
+        # a millisecond each way
+        self.assertAlmostEqual(client.srtt, 0.002)
+        self.assertAlmostEqual(client.rttvar, 0.001)
+        self.assertEqual(client.timeout, TCP_MIN_RTO)
+
+    def test_backoff(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            sent = []
+            # nothing sent is ever acknowledged
+            client = TCPSocket('10.0.0.1', 1234, '10.0.0.2', 80,
+                    TCP_STATE_ESTABLISHED,
+                    lambda pkt: sent.append(loop.time()), None)
+            client.bypass_handshake(100, 500)
+            client.send(b'b' * 1000)
+            await asyncio.sleep(200)
+            return client, sent
+
+        client, sent = run_virtual(run())
+        # the RTO doubles with every expiry, up to TCP_MAX_RTO
+        self.assertEqual([round(t) for t in sent],
+                [0, 1, 3, 7, 15, 31, 63, 123, 183])
+        self.assertEqual(client.timeout, TCP_MAX_RTO)
+        self.assertEqual(client.timeouts, 8)
+        self.assertIsNone(client.srtt)
+
+    def test_karn(self):
+        async def run():
+            client, server, sent = established_pair(drop=[0])
+            client.send(b'k' * 1000)
+            await asyncio.sleep(1.5)
+            # the segment was resent after the RTO expired, and the ACK of
+            # it is ambiguous, so it is not sampled, and the backed-off RTO
+            # is kept
+            self.assertEqual(data_segments(sent), [0, 0])
+            self.assertEqual(received(server), b'k' * 1000)
+            self.assertIsNone(client.srtt)
+            self.assertEqual(client.timeout, 2 * TCP_INITIAL_RTO)
+
+            # the ACK of a segment sent only once is sampled, which undoes
+            # the backoff
+            client.send(b'k' * 1000)
+            await asyncio.sleep(0.1)
+            self.assertEqual(data_segments(sent), [0, 0, 1000])
+            self.assertAlmostEqual(client.srtt, 0.002)
+            self.assertEqual(client.timeout, TCP_MIN_RTO)
+            self.assertIsNone(client.timer)
+
+        run_virtual(run())
+
+
+def delayed_ack_receiver():
+    '''
+    Return a TCPSocket, past the handshake, that delays its ACKs, along with
+    a list of the (time, ack number) of each ACK it sends.  The peer's base
+    sequence number is 100.
+    '''
+
+    loop = asyncio.get_running_loop()
+    acks = []
+    sock = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+            TCP_STATE_ESTABLISHED,
+            lambda pkt: acks.append(
+                (loop.time(), TCPHeaderView(pkt, IP_HEADER_LEN).ack)),
+            lambda: None, delayed_ack=True)
+    sock.bypass_handshake(500, 100)
+    return sock, acks
+
+
+def segment(seq, size=1000):
+    # a data segment from the peer, at relative sequence number seq
+    return TCPSocket.create_packet('10.0.0.1', 1234, '10.0.0.2', 80,
+            101 + seq, 501, TCP_FLAGS_ACK, b'd' * size)
+
+
+class TestTCPSocketDelayedAck(unittest.TestCase):
+
+    def test_timer(self):
+        async def run():
+            sock, acks = delayed_ack_receiver()
+            sock.handle_packet(segment(0))
+            # one in-order segment is not acknowledged right away
+            self.assertEqual(acks, [])
+            self.assertIsNotNone(sock._delayed_ack_timer)
+
+            await asyncio.sleep(1)
+            return sock, acks
+
+        sock, acks = run_virtual(run())
+        # just one ACK, once the timer expires
+        self.assertEqual(len(acks), 1)
+        self.assertAlmostEqual(acks[0][0], TCP_DELAYED_ACK_TIMEOUT)
+        self.assertEqual(acks[0][1], 1101)
+        self.assertIsNone(sock._delayed_ack_timer)
+
+    def test_second_segment(self):
+        async def run():
+            sock, acks = delayed_ack_receiver()
+            sock.handle_packet(segment(0))
+            sock.handle_packet(segment(1000))
+            # every second full-sized segment is acknowledged right away
+            self.assertEqual(acks, [(0, 2101)])
+            self.assertIsNone(sock._delayed_ack_timer)
+
+            await asyncio.sleep(1)
+            return acks
+
+        acks = run_virtual(run())
+        self.assertEqual(acks, [(0, 2101)])
+
+    def test_out_of_order(self):
+        async def run():
+            sock, acks = delayed_ack_receiver()
+            # out-of-order data is acknowledged right away (a duplicate ACK)
+            sock.handle_packet(segment(1000))
+            self.assertEqual(acks, [(0, 101)])
+
+            # as is the segment that fills the hole
+            sock.handle_packet(segment(0))
+            self.assertEqual(acks, [(0, 101), (0, 2101)])
+            self.assertIsNone(sock._delayed_ack_timer)
+
+            await asyncio.sleep(1)
+            return sock, acks
+
+        sock, acks = run_virtual(run())
+        self.assertEqual(len(acks), 2)
+        self.assertEqual(received(sock), b'd' * 2000)
+
+
+class TestTCPSocketClose(unittest.TestCase):
+
+    def test_active_close(self):
+        async def run():
+            client, server, sent = established_pair()
+            client.close()
+            self.assertEqual(client.state, TCP_STATE_FIN_WAIT_1)
+            self.assertEqual(TCPHeaderView(sent[-1], IP_HEADER_LEN).flags,
+                    TCP_FLAGS_FIN | TCP_FLAGS_ACK)
+
+            # our FIN is acknowledged
+            await asyncio.sleep(0.01)
+            self.assertEqual(client.state, TCP_STATE_FIN_WAIT_2)
+            self.assertIsNone(client.timer)
+
+            # and then the peer's FIN arrives
+            server.close()
+            await asyncio.sleep(0.01)
+            self.assertEqual(client.state, TCP_STATE_TIME_WAIT)
+            self.assertTrue(client.at_eof())
+            self.assertEqual(TCPHeaderView(sent[-1], IP_HEADER_LEN).ack,
+                    server.fin_seq + 1)
+
+        run_virtual(run())
+
+    def test_passive_close(self):
+        async def run():
+            client, server, sent = established_pair()
+            client.send(b'q' * 1500)
+            client.shutdown(SHUT_WR)
+            await asyncio.sleep(0.01)
+            # the peer's FIN follows all of its data
+            self.assertEqual(server.state, TCP_STATE_CLOSE_WAIT)
+            self.assertEqual(received(server), b'q' * 1500)
+            self.assertTrue(server.at_eof())
+
+            # we may still send, until we close in turn, and the peer, which
+            # only shut down writing, still receives
+            server.send(b'a' * 500)
+            server.close()
+            self.assertEqual(server.state, TCP_STATE_LAST_ACK)
+            await asyncio.sleep(0.01)
+            self.assertEqual(server.state, TCP_STATE_CLOSED)
+            self.assertEqual(received(client), b'a' * 500)
+            self.assertIsNone(server.timer)
+
+        run_virtual(run())
+
+    def test_simultaneous_close(self):
+        async def run():
+            client, server, sent = established_pair()
+            client.close()
+            server.close()
+            # each FIN arrives before the ACK of the other
+            await asyncio.sleep(0.0015)
+            self.assertEqual(client.state, TCP_STATE_CLOSING)
+            self.assertEqual(server.state, TCP_STATE_CLOSING)
+            await asyncio.sleep(0.01)
+            self.assertEqual(client.state, TCP_STATE_TIME_WAIT)
+            self.assertEqual(server.state, TCP_STATE_TIME_WAIT)
+            self.assertIsNone(client.timer)
+            self.assertIsNone(server.timer)
+
+        run_virtual(run())
+
+    def test_reset(self):
+        async def run():
+            client, server, sent = established_pair()
+            client.send(b'r' * 3000)
+            await asyncio.sleep(0.01)
+            self.assertEqual(received(server), b'r' * 3000)
+
+            # an RST outside the receive window is ignored
+            server.handle_packet(TCPSocket.create_packet('10.0.0.1', 1234,
+                    '10.0.0.2', 80, server.ack + server.receive_window, 0,
+                    TCP_FLAGS_RST))
+            self.assertEqual(server.state, TCP_STATE_ESTABLISHED)
+
+            client.abort()
+            self.assertEqual(client.state, TCP_STATE_CLOSED)
+            await asyncio.sleep(0.01)
+            self.assertEqual(server.state, TCP_STATE_CLOSED)
+            self.assertTrue(server.was_reset)
+            self.assertTrue(server.at_eof())
+
+        run_virtual(run())
+
+    def test_time_wait_ack(self):
+        async def run():
+            client, server, sent = established_pair()
+            client.close()
+            await asyncio.sleep(0.01)
+            server.close()
+            await asyncio.sleep(0.01)
+            self.assertEqual(client.state, TCP_STATE_TIME_WAIT)
+            self.assertEqual(server.state, TCP_STATE_CLOSED)
+
+            # the peer's FIN again, as if our ACK of it had been lost
+            fin = TCPSocket.create_packet('10.0.0.2', 80, '10.0.0.1', 1234,
+                    server.fin_seq, client.seq, TCP_FLAGS_FIN | TCP_FLAGS_ACK)
+            for sock in client, TCPTimeWait(client):
+                count = len(sent)
+                sock.handle_packet(fin)
+                self.assertEqual(len(sent), count + 1)
+                ack = TCPHeaderView(sent[-1], IP_HEADER_LEN)
+                self.assertEqual(ack.flags, TCP_FLAGS_ACK)
+                self.assertEqual(ack.ack, server.fin_seq + 1)
+
+        run_virtual(run())
+
+    def test_shutdown_with_data_queued(self):
+        async def run():
+            client, server, sent = established_pair(initial_cwnd=2000)
+            client.send(b's' * 5000)
+            client.shutdown(SHUT_WR)
+            self.assertRaises(BrokenPipeError, client.send, b's')
+            # the FIN waits for the data that the window holds back
+            self.assertEqual(data_segments(sent), [0, 1000])
+            self.assertIsNone(client.fin_seq)
+
+            await asyncio.sleep(0.1)
+            fin = TCPHeaderView(sent[-1], IP_HEADER_LEN)
+            self.assertTrue(fin.flags & TCP_FLAGS_FIN)
+            self.assertEqual(fin.seq - 101, 5000)
+            self.assertEqual(received(server), b's' * 5000)
+            self.assertEqual(server.state, TCP_STATE_CLOSE_WAIT)
+            self.assertEqual(client.state, TCP_STATE_FIN_WAIT_2)
+
+        run_virtual(run())
+
+
+class TestTCPSocketHandshake(unittest.TestCase):
+
+    def test_syn_retransmit(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            syn_times = []
+            notified = []
+            client = TCPSocket.connect('10.0.0.1', 1234, '10.0.0.2', 80,
+                    lambda pkt: syn_times.append(loop.time()),
+                    lambda: notified.append(loop.time()))
+            await asyncio.sleep(300)
+            return client, syn_times, notified
+
+        client, syn_times, notified = run_virtual(run())
+        # the SYN is resent with the timeout doubled each time (up to
+        # TCP_MAX_RTO), then the connection is given up on
+        self.assertEqual(len(syn_times), TCP_SYN_RETRIES + 1)
+        self.assertEqual([round(t) for t in syn_times],
+                [0, 1, 3, 7, 15, 31, 63])
+        self.assertEqual(client.state, TCP_STATE_CLOSED)
+        self.assertTrue(client.timed_out)
+        self.assertTrue(client.at_eof())
+        self.assertIsNone(client.timer)
+        self.assertEqual([round(t) for t in notified], [123])
+
+    def test_syn_lost(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+            syns = []
+
+            def to_server(pkt):
+                syns.append(pkt)
+                # the first SYN is lost
+                if len(syns) > 1:
+                    loop.call_later(0.05, socks['server'].handle_packet, pkt)
+
+            def to_client(pkt):
+                loop.call_later(0.05, socks['client'].handle_packet, pkt)
+
+            socks['server'] = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+                    TCP_STATE_LISTEN, to_client, lambda: None)
+            socks['client'] = TCPSocket.connect('10.0.0.1', 1234,
+                    '10.0.0.2', 80, to_server, lambda: None)
+            await asyncio.sleep(2)
+            return socks['client'], socks['server']
+
+        client, server = run_virtual(run())
+        self.assertEqual(client.state, TCP_STATE_ESTABLISHED)
+        self.assertEqual(server.state, TCP_STATE_ESTABLISHED)
+        self.assertIsNone(client.timer)
+        # the SYNACK answers a retransmitted SYN, so it is not an RTT sample
+        # (Karn's algorithm), and the timeout is no less than 3 seconds
+        self.assertIsNone(client.srtt)
+        self.assertEqual(client.timeout, TCP_SYN_LOSS_RTO)
+        # the server's RTT sample, from its SYNACK, is valid
+        self.assertAlmostEqual(server.srtt, 0.1)
+
+    def test_synack_retransmit(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            synack_times = []
+
+            def send(pkt):
+                flags = TCPHeaderView(pkt, IP_HEADER_LEN).flags
+                self.assertEqual(flags, TCP_FLAGS_SYN | TCP_FLAGS_ACK)
+                synack_times.append(loop.time())
+
+            listener = TCPListenerSocket('10.0.0.2', 80, None, send, None)
+            listener.handle_packet(TCPSocket.create_packet('10.0.0.1', 1234,
+                    '10.0.0.2', 80, 100, 0, TCP_FLAGS_SYN, mss=1000))
+            self.assertEqual(len(listener.syn_queue), 1)
+            await asyncio.sleep(300)
+            return listener, synack_times
+
+        listener, synack_times = run_virtual(run())
+        # the SYNACK is resent with the timeout doubled each time, until the
+        # half-open connection is dropped
+        self.assertEqual(len(synack_times), TCP_SYNACK_RETRIES + 1)
+        self.assertEqual([round(t) for t in synack_times],
+                [0, 1, 3, 7, 15, 31])
+        self.assertEqual(len(listener.syn_queue), 0)
+        self.assertEqual(listener.stats()['syn_queue_timeouts'], 1)
+
+    def test_synack_lost(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+            synacks = []
+
+            def to_client(pkt):
+                synacks.append(pkt)
+                # the first SYNACK is lost
+                if len(synacks) > 1:
+                    loop.call_later(0.05, socks['client'].handle_packet, pkt)
+
+            def to_server(pkt):
+                loop.call_later(0.05, listener.handle_packet, pkt)
+
+            def handle_new_client(*args):
+                socks['server'] = args[-1]
+
+            listener = TCPListenerSocket('10.0.0.2', 80, handle_new_client,
+                    to_client, None)
+            socks['client'] = TCPSocket.connect('10.0.0.1', 1234,
+                    '10.0.0.2', 80, to_server, lambda: None)
+            await asyncio.sleep(2)
+            return socks, listener
+
+        socks, listener = run_virtual(run())
+        self.assertEqual(socks['client'].state, TCP_STATE_ESTABLISHED)
+        self.assertEqual(socks['server'].state, TCP_STATE_ESTABLISHED)
+        self.assertEqual(len(listener.syn_queue), 0)
+        # the ACK answers a retransmitted SYNACK, so it is not an RTT sample
+        self.assertIsNone(socks['server'].srtt)
+
+    def test_negotiate_options(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+
+            def to_client(pkt):
+                loop.call_later(0.001, socks['client'].handle_packet, pkt)
+
+            def to_server(pkt):
+                loop.call_later(0.001, listener.handle_packet, pkt)
+
+            def handle_new_client(*args):
+                socks['server'] = args[-1]
+
+            listener = TCPListenerSocket('10.0.0.2', 80, handle_new_client,
+                    to_client, None, mss=536, receive_window=1 << 20)
+            socks['client'] = TCPSocket.connect('10.0.0.1', 1234,
+                    '10.0.0.2', 80, to_server, None, mss=1460,
+                    receive_window=1 << 18)
+            await asyncio.sleep(0.05)
+            return socks['client'], socks['server']
+
+        client, server = asyncio.run(run())
+        # the smaller MSS is used both ways, and each side scales the window
+        # it advertises by its own shift
+        self.assertEqual((client.mss, server.mss), (536, 536))
+        self.assertEqual((client.rcv_wscale, client.snd_wscale), (3, 5))
+        self.assertEqual((server.rcv_wscale, server.snd_wscale), (5, 3))
+        # the client's window, scaled in its final ACK of the handshake
+        self.assertEqual(server.remote_window, 1 << 18)
+
+    def test_no_window_scaling(self):
+        sent = []
+        socks = []
+        listener = TCPListenerSocket('10.0.0.2', 80,
+                lambda *args: socks.append(args[-1]), sent.append, None,
+                receive_window=1 << 20)
+
+        async def run():
+            # a SYN with an MSS but no window scale option
+            listener.handle_packet(TCPSocket.create_packet('10.0.0.1', 1234,
+                    '10.0.0.2', 80, 100, 0, TCP_FLAGS_SYN, mss=1200))
+            synack = TCPHeader.unpack_from(sent[0], IP_HEADER_LEN)
+            listener.handle_packet(TCPSocket.create_packet('10.0.0.1', 1234,
+                    '10.0.0.2', 80, 101, synack.seq + 1, TCP_FLAGS_ACK))
+            return synack
+
+        synack = asyncio.run(run())
+        # window scaling is not offered in return, so it is not used
+        self.assertIsNone(synack.wscale)
+        self.assertEqual(synack.mss, 1000)
+        self.assertEqual((socks[0].rcv_wscale, socks[0].snd_wscale), (0, 0))
+        self.assertEqual(socks[0].mss, 1000)
+
+    def test_state_times(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+
+            def to_server(pkt):
+                loop.call_later(0.05, socks['server'].handle_packet, pkt)
+
+            def to_client(pkt):
+                loop.call_later(0.05, socks['client'].handle_packet, pkt)
+
+            socks['server'] = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+                    TCP_STATE_LISTEN, to_client, lambda: None)
+            client = TCPSocket.connect('10.0.0.1', 1234, '10.0.0.2', 80,
+                    to_server, lambda: None)
+            socks['client'] = client
+            await asyncio.sleep(1)
+            # the handshake is timed without allocating per-state accounting
+            self.assertIsNone(client._state_times)
+            times = client.state_times()
+            self.assertEqual(sorted(times), [TCP_STATE_SYN_SENT,
+                    TCP_STATE_ESTABLISHED])
+            self.assertAlmostEqual(times[TCP_STATE_SYN_SENT], 0.1)
+            self.assertAlmostEqual(times[TCP_STATE_ESTABLISHED], 0.9)
+
+            # which it is once the connection leaves ESTABLISHED
+            client.close()
+            await asyncio.sleep(1)
+            times = client.state_times()
+            self.assertAlmostEqual(times[TCP_STATE_SYN_SENT], 0.1)
+            self.assertAlmostEqual(times[TCP_STATE_ESTABLISHED], 0.9)
+            self.assertAlmostEqual(times[TCP_STATE_FIN_WAIT_1], 0.1)
+            self.assertAlmostEqual(sum(times.values()), 2)
+
+        run_virtual(run())
+
+    def test_send_before_established(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+            sent = []
+
+            def to_server(pkt):
+                sent.append(pkt)
+                loop.call_later(0.001, socks['server'].handle_packet, pkt)
+
+            def to_client(pkt):
+                loop.call_later(0.001, socks['client'].handle_packet, pkt)
+
+            socks['server'] = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+                    TCP_STATE_LISTEN, to_client, lambda: None)
+            client = TCPSocket.connect('10.0.0.1', 1234, '10.0.0.2', 80,
+                    to_server, lambda: None)
+            socks['client'] = client
+
+            # buffered, not sent, while the SYN is outstanding
+            client.send(b'h' * 2500)
+            self.assertEqual(len(sent), 1)
+            self.assertEqual(client.send_buffer.bytes_not_yet_sent(), 2500)
+
+            await asyncio.sleep(0.05)
+            self.assertEqual(client.state, TCP_STATE_ESTABLISHED)
+            self.assertEqual(received(socks['server']), b'h' * 2500)
+            self.assertEqual(client.send_buffer.bytes_outstanding(), 0)
+
+        asyncio.run(run())
+
+
+def client_segment(sport, seq, ack, flags, **options):
+    # a segment to port 80 of 10.0.0.2, from port sport of 10.0.0.1
+    return TCPSocket.create_packet('10.0.0.1', sport, '10.0.0.2', 80,
+            seq, ack, flags, **options)
+
+
+class TestTCPListenerSynCookies(unittest.TestCase):
+
+    def cookie_listener(self):
+        '''
+        Return a listener with room for one half-open connection, which is
+        taken, along with the lists of the segments it sends and of the
+        sockets it creates.
+        '''
+
+        sent = []
+        socks = []
+        listener = TCPListenerSocket('10.0.0.2', 80,
+                lambda *args: socks.append(args[-1]), sent.append, None,
+                mss=1460, syn_backlog=1)
+        listener.handle_packet(client_segment(1000, 100, 0, TCP_FLAGS_SYN))
+        self.assertEqual(listener.stats()['syn_cookies_sent'], 0)
+        return listener, sent, socks
+
+    def send_syn(self, listener, sent):
+        # a SYN, from another port, that gets a cookie; return its SYNACK
+        listener.handle_packet(client_segment(1234, 100, 0, TCP_FLAGS_SYN,
+                mss=1300, wscale=2))
+        self.assertEqual(len(listener.syn_queue), 1)
+        self.assertEqual(listener.stats()['syn_cookies_sent'], 1)
+        return TCPHeader.unpack_from(sent[-1], IP_HEADER_LEN)
+
+    def test_cookie(self):
+        async def run():
+            listener, sent, socks = self.cookie_listener()
+            synack = self.send_syn(listener, sent)
+            # the cookie encodes the largest MSS in the table that fits, and
+            # leaves no room for window scaling
+            self.assertEqual(synack.flags, TCP_FLAGS_SYN | TCP_FLAGS_ACK)
+            self.assertEqual(synack.mss, 1220)
+            self.assertIsNone(synack.wscale)
+
+            # the cookie is still good in the next period
+            await asyncio.sleep(TCP_SYN_COOKIE_PERIOD)
+            listener.handle_packet(client_segment(1234, 101, synack.seq + 1,
+                    TCP_FLAGS_ACK))
+            return listener, socks
+
+        listener, socks = run_virtual(run())
+        self.assertEqual(listener.stats()['syn_cookies_accepted'], 1)
+        self.assertEqual(len(socks), 1)
+        self.assertEqual(socks[0].state, TCP_STATE_ESTABLISHED)
+        self.assertEqual(socks[0].mss, 1220)
+        self.assertEqual((socks[0].rcv_wscale, socks[0].snd_wscale), (0, 0))
+        self.assertEqual(socks[0].relative_seq_other(socks[0].ack), 1)
+
+    def assert_rejected(self, listener, sent, socks, ack_pkt):
+        listener.handle_packet(ack_pkt)
+        self.assertEqual(TCPHeaderView(sent[-1], IP_HEADER_LEN).flags,
+                TCP_FLAGS_RST)
+        self.assertEqual(socks, [])
+        self.assertEqual(listener.stats()['syn_cookies_accepted'], 0)
+
+    def test_forged_cookie(self):
+        async def run():
+            listener, sent, socks = self.cookie_listener()
+            synack = self.send_syn(listener, sent)
+            # an ACK of some other sequence number, or from another port
+            self.assert_rejected(listener, sent, socks,
+                    client_segment(1234, 101, synack.seq + 2, TCP_FLAGS_ACK))
+            self.assert_rejected(listener, sent, socks,
+                    client_segment(1235, 101, synack.seq + 1, TCP_FLAGS_ACK))
+            # or with another sequence number than the SYN's
+            self.assert_rejected(listener, sent, socks,
+                    client_segment(1234, 201, synack.seq + 1, TCP_FLAGS_ACK))
+
+        run_virtual(run())
+
+    def test_stale_cookie(self):
+        async def run():
+            listener, sent, socks = self.cookie_listener()
+            synack = self.send_syn(listener, sent)
+            await asyncio.sleep(2 * TCP_SYN_COOKIE_PERIOD)
+            self.assert_rejected(listener, sent, socks,
+                    client_segment(1234, 101, synack.seq + 1, TCP_FLAGS_ACK))
+
+        run_virtual(run())
+
+if __name__ == '__main__':
+    unittest.main()
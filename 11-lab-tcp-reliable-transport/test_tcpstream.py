@@ -0,0 +1,141 @@
+import asyncio
+import unittest
+
+from mysocket import TCPSocket, TCP_STATE_ESTABLISHED, TCP_STATE_LISTEN, \
+        TCP_STATE_CLOSE_WAIT
+from tcpstream import open_tcp_stream
+
+
+async def connected_pair(**socket_kwargs):
+    '''
+    Return a client and server TCPSocket, connected by a link with a delay of
+    a millisecond each way, once the handshake has completed.
+    '''
+
+    loop = asyncio.get_running_loop()
+    socks = {}
+
+    def link(dst):
+        def send(pkt):
+            loop.call_later(0.001, socks[dst].handle_packet, pkt)
+        return send
+
+    socks['server'] = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+            TCP_STATE_LISTEN, link('client'), None, **socket_kwargs)
+    socks['client'] = TCPSocket.connect('10.0.0.1', 1234, '10.0.0.2', 80,
+            link('server'), None, **socket_kwargs)
+    while socks['server'].state != TCP_STATE_ESTABLISHED:
+        await asyncio.sleep(0.001)
+    return socks['client'], socks['server']
+
+
+class TestTCPStream(unittest.TestCase):
+
+    def test_echo(self):
+        async def run():
+            client, server = await connected_pair()
+            # data that arrives before the server's stream is opened
+            client.send(b'early ')
+
+            async def echo(reader, writer):
+                while data := await reader.read(1000):
+                    writer.write(data)
+                    await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+
+            reader, writer = open_tcp_stream(client)
+            task = asyncio.create_task(echo(*open_tcp_stream(server)))
+            writer.write(b'hello\n')
+            self.assertEqual(await reader.readline(), b'early hello\n')
+
+            payload = bytes(range(256)) * 200
+            writer.write(payload)
+            writer.write_eof()
+            self.assertEqual(await reader.readexactly(len(payload)), payload)
+            self.assertEqual(await reader.read(), b'')
+            await task
+            writer.close()
+            await writer.wait_closed()
+
+        asyncio.run(run())
+
+    def test_write_before_established(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+
+            def link(dst):
+                def send(pkt):
+                    loop.call_later(0.001, socks[dst].handle_packet, pkt)
+                return send
+
+            socks['server'] = TCPSocket('10.0.0.2', 80, '10.0.0.1', 1234,
+                    TCP_STATE_LISTEN, link('client'), None)
+            socks['client'] = TCPSocket.connect('10.0.0.1', 1234,
+                    '10.0.0.2', 80, link('server'), None)
+
+            # written, and shut down, while the SYN is outstanding
+            reader, writer = open_tcp_stream(socks['client'])
+            writer.write(b'hello, ')
+            writer.write(b'world\n')
+            writer.write_eof()
+            await writer.drain()
+
+            await asyncio.sleep(0.05)
+            self.assertEqual(socks['server'].state, TCP_STATE_CLOSE_WAIT)
+            server_reader, server_writer = open_tcp_stream(socks['server'])
+            self.assertEqual(await server_reader.read(), b'hello, world\n')
+
+            writer.close()
+            await writer.wait_closed()
+
+        asyncio.run(run())
+
+    def test_drain(self):
+        async def run():
+            client, server = await connected_pair(initial_cwnd=2000)
+            reader, writer = open_tcp_stream(client)
+            writer.transport.set_write_buffer_limits(high=4000)
+            self.assertEqual(writer.transport.get_write_buffer_limits(),
+                    (1000, 4000))
+
+            writer.write(b'x' * 10000)
+            self.assertEqual(writer.transport.get_write_buffer_size(), 10000)
+            await writer.drain()
+            # drain() returns once no more than the low-water mark is waiting
+            # to be acknowledged
+            self.assertLessEqual(writer.transport.get_write_buffer_size(),
+                    1000)
+
+        asyncio.run(run())
+
+    def test_pause_reading(self):
+        async def run():
+            client, server = await connected_pair(receive_window=4000)
+            reader, writer = open_tcp_stream(server)
+            writer.transport.pause_reading()
+            client.send(b'y' * 20000)
+            await asyncio.sleep(0.05)
+            # the data stays in the socket, which closes its window
+            self.assertEqual(len(server.ready_buffer), 4000)
+            self.assertEqual(client.remote_window, 0)
+
+            writer.transport.resume_reading()
+            self.assertEqual(await reader.readexactly(20000), b'y' * 20000)
+
+        asyncio.run(run())
+
+    def test_reset(self):
+        async def run():
+            client, server = await connected_pair()
+            reader, writer = open_tcp_stream(server)
+            client.abort()
+            with self.assertRaises(ConnectionResetError):
+                await reader.read(100)
+            self.assertTrue(writer.is_closing())
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import csv
+import io
+import json
+import unittest
+
+from mysocket import TCPSocket, TCP_STATE_ESTABLISHED
+from tcptrace import TCPTracer, export_csv, export_json, \
+        TCP_TRACE_SEND, TCP_TRACE_ACK, TCP_TRACE_TIMEOUT
+
+
+class TestTCPTracer(unittest.TestCase):
+
+    def test_ring(self):
+        tracer = TCPTracer(3)
+        self.assertEqual(tracer.samples(), [])
+        tracer.record(1.0, 1000, 0, 0.0, TCP_TRACE_SEND)
+        tracer.record(2.0, 2000, 1000, 0.5, TCP_TRACE_ACK)
+        self.assertEqual(len(tracer), 2)
+        self.assertEqual(tracer.samples(), [
+            (1.0, 1000, 0, 0.0, 'send'),
+            (2.0, 2000, 1000, 0.5, 'ack')])
+
+        # the oldest samples are overwritten
+        tracer.record(3.0, 3000, 2000, 0.5, TCP_TRACE_ACK)
+        tracer.record(4.0, 1000, 0, 0.5, TCP_TRACE_TIMEOUT)
+        tracer.record(5.0, 2000, 1000, 0.5, TCP_TRACE_SEND)
+        self.assertEqual(len(tracer), 3)
+        self.assertEqual(tracer.dropped(), 2)
+        self.assertEqual([s[0] for s in tracer.samples()], [3.0, 4.0, 5.0])
+        self.assertEqual(tracer.samples()[1][4], 'timeout')
+
+        tracer.clear()
+        self.assertEqual(tracer.samples(), [])
+
+    def test_export(self):
+        tracer = TCPTracer(2)
+        tracer.record(1.0, 1000, 0, 0.0, TCP_TRACE_SEND)
+        tracer.record(2.0, 2000, 1000, 0.5, TCP_TRACE_ACK)
+        conn = ('10.0.0.1', 1234, '10.0.0.2', 80)
+
+        f = io.StringIO()
+        export_csv({conn: tracer}, f)
+        rows = list(csv.reader(io.StringIO(f.getvalue())))
+        self.assertEqual(rows[0], ['local_addr', 'local_port', 'remote_addr',
+            'remote_port', 'time', 'cwnd', 'inflight', 'srtt', 'event'])
+        self.assertEqual(rows[2],
+                ['10.0.0.1', '1234', '10.0.0.2', '80', '2.0', '2000',
+                    '1000', '0.5', 'ack'])
+
+        f = io.StringIO()
+        export_json({conn: tracer, ('10.0.0.1', 1235, '10.0.0.2', 80):
+            TCPTracer()}, f)
+        conns = json.loads(f.getvalue())
+        self.assertEqual(len(conns), 2)
+        self.assertEqual(conns[0]['local_port'], 1234)
+        self.assertEqual(conns[0]['cwnd'], [1000, 2000])
+        self.assertEqual(conns[0]['event'], ['send', 'ack'])
+        self.assertEqual(conns[1]['time'], [])
+
+    def test_socket(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            socks = {}
+
+            def link(dst):
+                def send(pkt):
+                    loop.call_later(0.001, socks[dst].handle_packet, pkt)
+                return send
+
+            for name, peer, addrs, seqs in \
+                    ('a', 'b', ('10.0.0.1', 1234, '10.0.0.2', 80),
+                        (100, 500)), \
+                    ('b', 'a', ('10.0.0.2', 80, '10.0.0.1', 1234),
+                        (500, 100)):
+                socks[name] = TCPSocket(*addrs, TCP_STATE_ESTABLISHED,
+                        link(peer), None, congestion_control='reno')
+                socks[name].bypass_handshake(*seqs)
+            socks['a'].tracer = TCPTracer()
+            socks['a'].send(b'x' * 5000)
+            await asyncio.sleep(0.05)
+            return socks['a'].tracer.samples()
+
+        samples = asyncio.run(run())
+        events = [s[4] for s in samples]
+        self.assertEqual(events.count('send'), 5)
+        self.assertEqual(events.count('ack'), 5)
+        # slow start: cwnd grows with every ACK, and all is acknowledged
+        acks = [s for s in samples if s[4] == 'ack']
+        self.assertEqual([s[1] for s in acks], [2000, 3000, 4000, 5000, 6000])
+        self.assertEqual(acks[-1][2], 0)
+        self.assertGreater(acks[-1][3], 0.0)
+        times = [s[0] for s in samples]
+        self.assertEqual(times, sorted(times))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+
+from timerwheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_expire(self):
+        async def run():
+            wheel = TimerWheel(tick=0.01)
+            fired = []
+            wheel.schedule(0.02, fired.append, 'a')
+            wheel.schedule(0.05, fired.append, 'b')
+            cancelled = wheel.schedule(0.03, fired.append, 'c')
+            cancelled.cancel()
+            self.assertTrue(cancelled.cancelled())
+            self.assertEqual(len(wheel), 2)
+
+            await asyncio.sleep(0.035)
+            self.assertEqual(fired, ['a'])
+            await asyncio.sleep(0.05)
+            self.assertEqual(fired, ['a', 'b'])
+            self.assertEqual(len(wheel), 0)
+            return wheel.stats()
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats['scheduled'], 3)
+        self.assertEqual(stats['cancels'], 1)
+        self.assertEqual(stats['expirations'], 2)
+
+    def test_reset(self):
+        async def run():
+            wheel = TimerWheel(tick=0.01)
+            fired = []
+            timer = wheel.schedule(0.03, fired.append, 'a')
+
+            # later: stays in its slot and is moved when the slot comes up
+            await asyncio.sleep(0.015)
+            timer.reset(0.05)
+            await asyncio.sleep(0.03)
+            self.assertEqual(fired, [])
+            await asyncio.sleep(0.04)
+            self.assertEqual(fired, ['a'])
+
+            # re-arm after expiring
+            timer.reset(0.01)
+            self.assertFalse(timer.cancelled())
+
+            # earlier: moved immediately
+            timer.reset(0.5)
+            timer.reset(0.01)
+            await asyncio.sleep(0.04)
+            self.assertEqual(fired, ['a', 'a'])
+            self.assertEqual(len(wheel), 0)
+
+        asyncio.run(run())
+
+    def test_callback_error(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            errors = []
+            loop.set_exception_handler(lambda loop, context:
+                    errors.append(context['exception']))
+            wheel = TimerWheel(tick=0.01)
+            fired = []
+
+            def fail():
+                raise ValueError('oops')
+
+            # in the same slot as the failing timer, and in a later one
+            wheel.schedule(0.02, fail)
+            wheel.schedule(0.02, fired.append, 'a')
+            wheel.schedule(0.05, fired.append, 'b')
+            await asyncio.sleep(0.08)
+            self.assertEqual(fired, ['a', 'b'])
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0], ValueError)
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
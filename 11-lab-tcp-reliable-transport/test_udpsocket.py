@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+
+from mysocket import UDPSocket
+
+
+def datagram(i):
+    return UDPSocket.create_packet('10.0.0.1', 1234, '10.0.0.2', 5016,
+            b'msg%d' % i)
+
+
+class TestUDPSocket(unittest.TestCase):
+
+    def test_burst(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            received = []
+
+            def read_one():
+                # one datagram per notification, as the lab applications do
+                received.append(sock.recvfrom()[0])
+
+            # the whole burst arrives before the application gets to run
+            sock = UDPSocket('10.0.0.2', 5016, None,
+                    lambda: loop.call_soon(read_one))
+            for i in range(10):
+                sock.handle_packet(datagram(i))
+            await asyncio.sleep(0)
+            self.assertIsNone(sock.recvfrom())
+            return received
+
+        received = asyncio.run(run())
+        self.assertEqual(received, [b'msg%d' % i for i in range(10)])
+
+    def test_burst_edge_triggered(self):
+        notifications = []
+        sock = UDPSocket('10.0.0.2', 5016, None,
+                lambda: notifications.append(len(sock.buffer)),
+                edge_triggered=True)
+        for i in range(10):
+            sock.handle_packet(datagram(i))
+        # notified only when the first datagram arrives to the empty queue;
+        # the reader drains it, in batches, later
+        self.assertEqual(notifications, [1])
+        received = []
+        while sock.buffer:
+            received.extend(data for data, addr, port in
+                    sock.recvfrom_many(4))
+        self.assertEqual(received, [b'msg%d' % i for i in range(10)])
+
+        sock.handle_packet(datagram(10))
+        self.assertEqual(notifications, [1, 1])
+
+    def test_queue_full(self):
+        sock = UDPSocket('10.0.0.2', 5016, None, lambda: None, queue_len=4)
+        for i in range(6):
+            sock.handle_packet(datagram(i))
+        self.assertEqual(sock.datagrams_received, 6)
+        self.assertEqual(sock.datagrams_dropped, 2)
+        self.assertEqual([data for data, addr, port in sock.recvfrom_many(10)],
+                [b'msg%d' % i for i in range(4)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,34 +1,51 @@
-import struct
-
 from cougarnet.util import \
-        ip_str_to_binary, ip_binary_to_str
+        ip_str_to_binary
 
 from headers import IPv4Header, UDPHeader, TCPHeader, \
-        IP_HEADER_LEN, UDP_HEADER_LEN, TCP_HEADER_LEN, \
-        TCPIP_HEADER_LEN, UDPIP_HEADER_LEN
+        UDP_HEADER_LEN, TCP_HEADER_LEN, UDPIP_HEADER_LEN, \
+        ip_header_view
+from demux import TCPDemux
 from host import Host
-from mysocket import UDPSocket, TCPSocketBase
+from mysocket import UDPSocket, TCPSocket, TCPSocketBase
+from tcptrace import TCPTracer, TCP_TRACE_DEFAULT_CAPACITY
+from timerwheel import TimerWheel
 
 class TransportHost(Host):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.socket_mapping_udp = {}
-        self.socket_mapping_tcp = {}
 
-    def handle_tcp(self, pkt: bytes) -> None:
-        ip_hdr = pkt[:IP_HEADER_LEN]
-        src_ip = ip_binary_to_str(ip_hdr[12:16])
-        dst_ip = ip_binary_to_str(ip_hdr[16:20])
+        # A single timer wheel for the timers of all TCP sockets on the host
+        self.timer_wheel = TimerWheel()
+
+        # TCP sockets, by connection and by listening address and port, and
+        # connections in TIME_WAIT
+        self.tcp_demux = TCPDemux(self.timer_wheel)
 
-        tcp_hdr = pkt[IP_HEADER_LEN:TCPIP_HEADER_LEN]
-        src_port, = struct.unpack('!H', tcp_hdr[:2])
-        dst_port, = struct.unpack('!H', tcp_hdr[2:4])
-        sock = self.socket_mapping_tcp[(dst_ip, dst_port, src_ip, src_port)]
-        sock.handle_packet(pkt)
+        # The tracers of the TCP connections installed since trace_tcp() was
+        # called, by local address, local port, remote address, and remote
+        # port (kept after the connections are released, to be exported;
+        # see tcptrace.py), and the number of samples each one holds (None
+        # while connections are not traced)
+        self.tcp_tracers = {}
+        self.tcp_trace_capacity = None
+
+    def handle_tcp(self, pkt: bytes) -> None:
+        sock = self.tcp_demux.lookup(pkt)
+        if sock is None:
+            self.no_socket_tcp(pkt)
+        else:
+            sock.handle_packet(pkt)
 
     def handle_udp(self, pkt: bytes) -> None:
-        pass
+        ip_hdr = ip_header_view(pkt)
+        udp_hdr = UDPHeader.unpack_from(pkt, ip_hdr.header_len)
+        sock = self.socket_mapping_udp.get((ip_hdr.dst, udp_hdr.dport))
+        if sock is None:
+            self.no_socket_udp(pkt)
+        else:
+            sock.handle_packet(pkt)
 
     def install_socket_udp(self, local_addr: str, local_port: int,
             sock: UDPSocket) -> None:
@@ -36,15 +53,41 @@ class TransportHost(Host):
 
     def install_listener_tcp(self, local_addr: str, local_port: int,
             sock: TCPSocketBase) -> None:
-        self.socket_mapping_tcp[(local_addr, local_port, None, None)] = sock
+        self.tcp_demux.add_listener(local_addr, local_port, sock)
+        sock.use_timer_wheel(self.timer_wheel)
 
     def install_socket_tcp(self, local_addr: str, local_port: int,
             remote_addr: str, remote_port: int, sock: TCPSocketBase) -> None:
-        self.socket_mapping_tcp[(local_addr, local_port, \
-                remote_addr, remote_port)] = sock
+        self.tcp_demux.add_connection(local_addr, local_port,
+                remote_addr, remote_port, sock)
+        sock.use_timer_wheel(self.timer_wheel)
+        sock.release_func = self.tcp_demux.release
+        if self.tcp_trace_capacity is not None:
+            sock.tracer = TCPTracer(self.tcp_trace_capacity)
+            self.tcp_tracers[(local_addr, local_port,
+                remote_addr, remote_port)] = sock.tracer
+
+    def trace_tcp(self, capacity: int=TCP_TRACE_DEFAULT_CAPACITY) -> None:
+        '''
+        Trace every TCP connection installed from now on, keeping the last
+        capacity samples of each in tcp_tracers.
+        '''
+
+        self.tcp_trace_capacity = capacity
+
+    def tcp_stats(self) -> dict:
+        '''
+        Return a snapshot of all TCP connections and listeners on the host
+        (see TCPDemux.stats()).
+        '''
+
+        return self.tcp_demux.stats()
 
     def no_socket_udp(self, pkt: bytes) -> None:
         pass
 
     def no_socket_tcp(self, pkt: bytes) -> None:
-        pass
+        # refuse the connection, or whatever else the segment was for
+        rst = TCPSocket.create_reset(pkt)
+        if rst is not None:
+            self.send_packet(rst)
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import asyncio
+
+
+class CongestionControl(object):
+    '''
+    The interface between a TCPSocket and its congestion control algorithm.
+    The socket reports events by calling the on_*() hooks, and the algorithm
+    responds by adjusting the cwnd, cwnd_inc, and ssthresh instance variables
+    of the socket.
+
+    This base class is used for congestion_control='none': the congestion
+    window stays fixed at its initial value.
+    '''
+
+    # There is one instance per connection, so none of them needs a __dict__.
+    __slots__ = ('sock', 'in_recovery')
+
+    name = 'none'
+
+    # Whether a triple-duplicate ACK is treated as a loss event even if the
+    # socket was not created with fast_retransmit=True
+    FAST_RETRANSMIT = False
+
+    def __init__(self, sock: TCPSocket) -> CongestionControl:
+        self.sock = sock
+
+        # Whether the socket is in fast recovery, i.e., between a
+        # triple-duplicate ACK and the acknowledgment of the data that was
+        # outstanding when it arrived
+        self.in_recovery = False
+
+    def on_ack(self, acked_bytes: int, rtt: float) -> None:
+        '''
+        Called when an ACK acknowledges new data.
+
+        acked_bytes: The number of bytes newly acknowledged.
+        rtt: An RTT sample (seconds) taken from this ACK, or None.
+        '''
+
+        pass
+
+    def on_dup_ack(self) -> None:
+        '''
+        Called for each duplicate ACK received while in fast recovery.
+        '''
+
+        pass
+
+    def on_loss(self, kind: str) -> None:
+        '''
+        Called when a loss is detected without a timeout, just before the
+        lost segment is retransmitted.
+
+        kind: How the loss was detected: 'dupack' for a triple-duplicate ACK,
+            or 'sack' at the start of SACK-based loss recovery, which the
+            socket conducts itself, limited by cwnd, so cwnd is not inflated.
+        '''
+
+        pass
+
+    def on_timeout(self) -> None:
+        '''
+        Called when the retransmission timer expires, just before the oldest
+        unacknowledged segment is retransmitted.
+        '''
+
+        pass
+
+
+class Tahoe(CongestionControl):
+    '''
+    TCP Tahoe: slow start and additive increase, and a congestion window of
+    one MSS after any loss event.
+    '''
+
+    __slots__ = ()
+
+    name = 'tahoe'
+
+    def increase(self, inc: float) -> None:
+        '''
+        Add inc bytes to the congestion window, keeping cwnd a multiple of
+        MSS by accumulating increments smaller than MSS in cwnd_inc.
+        '''
+
+        sock = self.sock
+        sock.cwnd_inc += inc
+        while sock.cwnd_inc >= sock.mss:
+            sock.cwnd += sock.mss
+            sock.cwnd_inc -= sock.mss
+
+    def congestion_avoidance(self, acked_bytes: int, rtt: float) -> None:
+        self.increase(acked_bytes * self.sock.mss / self.sock.cwnd)
+
+    def on_ack(self, acked_bytes: int, rtt: float) -> None:
+        if self.sock.cwnd < self.sock.ssthresh:
+            # slow start
+            self.increase(acked_bytes)
+        else:
+            self.congestion_avoidance(acked_bytes, rtt)
+
+    def on_loss(self, kind: str) -> None:
+        sock = self.sock
+        sock.ssthresh = max(sock.cwnd // 2, sock.mss)
+        sock.cwnd = sock.mss
+        sock.cwnd_inc = 0
+
+    def on_timeout(self) -> None:
+        self.on_loss('timeout')
+
+
+class Reno(Tahoe):
+    '''
+    TCP Reno (RFC 5681): Tahoe plus fast retransmit and fast recovery, in
+    which a triple-duplicate ACK halves the congestion window instead of
+    collapsing it to one MSS.
+    '''
+
+    __slots__ = ('recover',)
+
+    name = 'reno'
+    FAST_RETRANSMIT = True
+
+    def __init__(self, sock: TCPSocket) -> Reno:
+        super().__init__(sock)
+
+        # The highest sequence number sent when recovery was entered
+        self.recover = None
+
+    def reduced_ssthresh(self) -> int:
+        '''
+        Return the slow start threshold to use after a loss event.
+        '''
+
+        sock = self.sock
+        flight = sock.send_buffer.bytes_outstanding()
+        return max(flight // 2 // sock.mss * sock.mss, 2 * sock.mss)
+
+    def on_loss(self, kind: str) -> None:
+        sock = self.sock
+        sock.ssthresh = self.reduced_ssthresh()
+        sock.cwnd_inc = 0
+        if kind == 'sack':
+            sock.cwnd = sock.ssthresh
+            return
+
+        # account for the three segments that have left the network
+        sock.cwnd = sock.ssthresh + 3 * sock.mss
+        self.in_recovery = True
+        self.recover = sock.send_buffer.next_seq
+
+    def on_dup_ack(self) -> None:
+        if self.in_recovery:
+            self.sock.cwnd += self.sock.mss
+
+    def exit_recovery(self) -> None:
+        self.sock.cwnd = self.sock.ssthresh
+        self.sock.cwnd_inc = 0
+        self.in_recovery = False
+
+    def on_ack(self, acked_bytes: int, rtt: float) -> None:
+        if self.in_recovery:
+            self.exit_recovery()
+        else:
+            super().on_ack(acked_bytes, rtt)
+
+    def on_timeout(self) -> None:
+        sock = self.sock
+        sock.ssthresh = self.reduced_ssthresh()
+        sock.cwnd = sock.mss
+        sock.cwnd_inc = 0
+        self.in_recovery = False
+
+
+class NewReno(Reno):
+    '''
+    TCP NewReno (RFC 6582): Reno, except that a partial ACK during fast
+    recovery retransmits the next unacknowledged segment and keeps the socket
+    in recovery, so that several losses in one window are repaired without
+    waiting for a timeout.
+    '''
+
+    __slots__ = ()
+
+    name = 'newreno'
+
+    def exit_recovery(self) -> None:
+        sock = self.sock
+        sock.cwnd = min(sock.ssthresh,
+                max(sock.send_buffer.bytes_outstanding(), sock.mss) + sock.mss)
+        sock.cwnd_inc = 0
+        self.in_recovery = False
+
+    def on_ack(self, acked_bytes: int, rtt: float) -> None:
+        sock = self.sock
+        if self.in_recovery and sock.send_buffer.base_seq < self.recover:
+            # partial ACK: deflate by the amount acknowledged, and add back
+            # one MSS if at least one MSS was acknowledged
+            sock.cwnd = max(sock.cwnd - acked_bytes, sock.mss)
+            if acked_bytes >= sock.mss:
+                sock.cwnd += sock.mss
+            sock.retransmit()
+        else:
+            super().on_ack(acked_bytes, rtt)
+
+
+class Cubic(NewReno):
+    '''
+    CUBIC (RFC 9438): after a loss, the congestion window grows as a cubic
+    function of the time since the loss, centered on the window at which the
+    loss occurred, so that the window is regained quickly on paths with a
+    large bandwidth-delay product.  Loss recovery is NewReno.
+    '''
+
+    __slots__ = ('w_max', 'w_last_max', 'w_est', 'origin', 'k',
+            'epoch_start', 'min_rtt')
+
+    name = 'cubic'
+
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, sock: TCPSocket) -> Cubic:
+        super().__init__(sock)
+
+        # All of the following are in units of MSS
+        self.w_max = 0.0
+        self.w_last_max = 0.0
+        self.w_est = 0.0
+        self.origin = 0.0
+        self.k = 0.0
+        self.epoch_start = None
+        self.min_rtt = None
+
+    def reduced_ssthresh(self) -> int:
+        sock = self.sock
+        cwnd = sock.cwnd / sock.mss
+
+        # fast convergence: release bandwidth if the window is shrinking
+        if cwnd < self.w_last_max:
+            self.w_max = cwnd * (1 + self.BETA) / 2
+        else:
+            self.w_max = cwnd
+        self.w_last_max = cwnd
+        self.epoch_start = None
+
+        return max(int(cwnd * self.BETA) * sock.mss, 2 * sock.mss)
+
+    def congestion_avoidance(self, acked_bytes: int, rtt: float) -> None:
+        sock = self.sock
+        if rtt is not None and (self.min_rtt is None or rtt < self.min_rtt):
+            self.min_rtt = rtt
+
+        now = asyncio.get_event_loop().time()
+        cwnd = sock.cwnd / sock.mss
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if cwnd < self.w_max:
+                self.k = ((self.w_max - cwnd) / self.C) ** (1 / 3)
+                self.origin = self.w_max
+            else:
+                self.k = 0.0
+                self.origin = cwnd
+            self.w_est = cwnd
+
+        t = now - self.epoch_start + (self.min_rtt or 0.0)
+        target = self.origin + self.C * (t - self.k) ** 3
+        target = min(target, 1.5 * cwnd)
+
+        # the window standard (Reno-like) TCP would have by now
+        alpha = 3 * (1 - self.BETA) / (1 + self.BETA)
+        self.w_est += alpha * acked_bytes / sock.mss / cwnd
+        target = max(target, self.w_est)
+
+        if target > cwnd:
+            inc = (target - cwnd) / cwnd
+        else:
+            inc = 0.01 / cwnd
+        self.increase(inc * acked_bytes)
+
+    def on_timeout(self) -> None:
+        super().on_timeout()
+        self.w_est = 0.0
+
+
+CONGESTION_CONTROL = {
+        cls.name: cls for cls in (CongestionControl, Tahoe, Reno, NewReno, Cubic)
+}
+
+def create_congestion_control(name: str, sock: TCPSocket) -> CongestionControl:
+    '''
+    Return an instance of the congestion control algorithm with the specified
+    name, for use by the specified socket.
+    '''
+
+    try:
+        cls = CONGESTION_CONTROL[name]
+    except KeyError:
+        raise ValueError(f'Unknown congestion control algorithm: {name}')
+    return cls(sock)
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
 import asyncio
+import functools
 import json
 import socket
 
 NEIGHBOR_CHECK_INTERVAL = 3
 DV_TABLE_SEND_INTERVAL = 1
 DV_PORT = 5016
+# The most DV messages read from a socket at once
+DV_RECV_BATCH = 32
 
 from cougarnet.sim.host import BaseHost
 
@@ -40,7 +43,9 @@ class DVRouter(TransportHost):
             sock = UDPSocket(
                     self.ipv4_address_single(intf),
                     DV_PORT,
-                    self.send_packet, self._handle_msg)
+                    self.send_packet,
+                    functools.partial(self._handle_msg, intf),
+                    edge_triggered=True)
             self._dv_socks[intf] = sock
             self.install_socket_udp(
                     self.ipv4_address_single(intf),
@@ -63,15 +68,15 @@ class DVRouter(TransportHost):
         loop.call_later(DV_TABLE_SEND_INTERVAL - DV_TABLE_SEND_INTERVAL / 2,
                 self.update_dv_next)
 
-    def _handle_msg(self) -> None:
-        ''' Receive and handle a message received on the UDP socket that is
-        being used for DV messages.
+    def _handle_msg(self, intf: str) -> None:
+        ''' Receive and handle the messages received on the UDP socket that is
+        being used for DV messages on interface intf, which has just become
+        ready.
         '''
 
-        for intf in self._dv_socks:
-            #XXX This check for non-zero buffer should go in recvfrom()
-            if self._dv_socks[intf].buffer:
-                data, addr, port = self._dv_socks[intf].recvfrom()
+        sock = self._dv_socks[intf]
+        while sock.buffer:
+            for data, addr, port in sock.recvfrom_many(DV_RECV_BATCH):
                 self.handle_dv_message(data)
 
     def _send_msg(self, msg: bytes, dst: str) -> None:
@@ -1,31 +1,40 @@
+import asyncio
+
 from mysocket import TCPListenerSocket
+from tcpstream import open_tcp_stream
 
 class EchoServerTCP:
     def __init__(self, local_addr, local_port, install_client_sock,
             send_ip_packet_func, **socket_kwargs):
 
-        #XXX hack to override native _notify_on_data() for socket multiplexing
-        def do_nothing():
-            pass
-
+        # Each connection is read through its own stream (see
+        # handle_client()), so the sockets need no notification function.
         self.sock = TCPListenerSocket(local_addr, local_port,
-                self.handle_new_client, send_ip_packet_func,
-                do_nothing, **socket_kwargs)
-
-        self._install_client_sock = install_client_sock
-
-    def handle_new_client(self, local_addr, local_port,
-            remote_addr, remote_port, sock):
-
-        self._install_client_sock(local_addr, local_port,
-                remote_addr, remote_port, sock)
-
-        #XXX hack to override native _notify_on_data() for socket multiplexing
-        def _notify_on_data():
-            self.handle_data(sock)
-        sock._notify_on_data = _notify_on_data
-
-    def handle_data(self, sock):
-        data = sock.recv(65536)
-        if data:
-            sock.send(data)
+                install_client_sock, send_ip_packet_func,
+                None, notify_on_accept_func=self.accept_clients,
+                **socket_kwargs)
+
+        # the tasks handling the clients, which must be referenced until done
+        self.tasks = set()
+
+    def accept_clients(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            sock = self.sock.accept()
+            if sock is None:
+                break
+            task = loop.create_task(self.handle_client(*open_tcp_stream(sock)))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def handle_client(self, reader, writer):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            # wait until the client has acknowledged most of it, rather
+            # than buffering without bound for a client that does not read
+            await writer.drain()
+        # the client is done; the socket is released once it is closed
+        writer.close()
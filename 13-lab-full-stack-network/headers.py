@@ -6,7 +6,11 @@ from cougarnet.util import \
         ip_str_to_binary, ip_binary_to_str
 
 
+#From /usr/include/linux/in.h:
+IPPROTO_UDP = 17 # User Datagram Protocol
+
 IP_HEADER_LEN = 20
+IPV6_HEADER_LEN = 40
 UDP_HEADER_LEN = 8
 TCP_HEADER_LEN = 20
 TCPIP_HEADER_LEN = IP_HEADER_LEN + TCP_HEADER_LEN
@@ -14,22 +18,250 @@ UDPIP_HEADER_LEN = IP_HEADER_LEN + UDP_HEADER_LEN
 
 TCP_RECEIVE_WINDOW = 64
 
+# IPv4 header length is given by the IHL field, in 4-byte words, so options
+# may extend it to at most 60 bytes.
+IP_MAX_HEADER_LEN = 60
+
+# TCP header length is given by the data offset field, in 4-byte words, so
+# options may extend it to at most 60 bytes.
+TCP_MAX_HEADER_LEN = 60
+
+# TCP option kinds
+# (https://www.iana.org/assignments/tcp-parameters/tcp-parameters.xhtml)
+TCP_OPT_EOL = 0
+TCP_OPT_NOP = 1
+TCP_OPT_MSS = 2
+TCP_OPT_WSCALE = 3
+TCP_OPT_SACK_PERMITTED = 4
+TCP_OPT_SACK = 5
+TCP_OPT_TIMESTAMP = 8
+
+# The largest window scale shift allowed (RFC 7323, Section 2.3)
+TCP_MAX_WINDOW_SCALE = 14
+
+# The most bytes of TCP options, and the most SACK blocks that fit in them,
+# with and without the timestamp option (RFC 2018, Section 3)
+TCP_MAX_OPTIONS_LEN = 40
+TCP_MAX_SACK_BLOCKS = 4
+TCP_MAX_SACK_BLOCKS_WITH_TIMESTAMP = 3
+
+# Precompiled header layouts.  Each is parsed with unpack_from() and written
+# with pack_into(), so headers can be read from (or written into) a larger
+# buffer at any offset, without slicing it first.
+#
+# IPv4: version/IHL, DS, total length, identification, flags/fragment offset,
+# TTL, protocol, header checksum, source address, destination address
+IPV4_HEADER_STRUCT = struct.Struct('!BBHHHBBH4s4s')
+# IPv6: version/traffic class/flow label, payload length, next header,
+# hop limit, source address, destination address
+IPV6_HEADER_STRUCT = struct.Struct('!IHBB16s16s')
+# UDP: source port, destination port, length, checksum
+UDP_HEADER_STRUCT = struct.Struct('!HHHH')
+# TCP: source port, destination port, sequence, acknowledgment,
+# data offset/reserved, flags, window, checksum, urgent pointer
+TCP_HEADER_STRUCT = struct.Struct('!HHIIBBHHH')
+
+# TCP options, each preceded by enough NOPs to keep it 4-byte aligned
+TCP_OPT_MSS_STRUCT = struct.Struct('!BBH')
+TCP_OPT_WSCALE_STRUCT = struct.Struct('!BBBB')
+TCP_OPT_SACK_PERMITTED_STRUCT = struct.Struct('!BBBB')
+TCP_OPT_TIMESTAMP_STRUCT = struct.Struct('!BBBBII')
+# TSval, TSecr
+TCP_TIMESTAMP_STRUCT = struct.Struct('!II')
+# NOP, NOP, kind, and length, followed by the blocks
+TCP_OPT_SACK_STRUCT = struct.Struct('!BBBB')
+# left edge, right edge
+TCP_SACK_BLOCK_STRUCT = struct.Struct('!II')
+
+# Pseudo-headers for the TCP and UDP checksums.  IPv4 (RFC 793): source
+# address, destination address, zero, protocol, TCP/UDP length.  IPv6 (RFC
+# 8200, Section 8.1): source address, destination address, upper-layer
+# packet length, zero, next header.
+IPV4_PSEUDO_HEADER_STRUCT = struct.Struct('!4s4sBBH')
+IPV6_PSEUDO_HEADER_STRUCT = struct.Struct('!16s16sI3xB')
+CHECKSUM_STRUCT = struct.Struct('!H')
+
+# offset of the checksum field within the TCP and UDP headers
+TCP_CHECKSUM_OFFSET = 16
+UDP_CHECKSUM_OFFSET = 6
+
+IPV6_VERSION = 6 << 28
+
+
+def checksum(data: bytes, initial: int=0) -> int:
+    '''
+    Return the Internet checksum (RFC 1071) of the specified data, optionally
+    continuing from the (unfolded) sum of a pseudo-header.
+    '''
+
+    if len(data) & 1:
+        data = bytes(data) + b'\x00'
+    total = initial + sum(struct.unpack(f'!{len(data) >> 1}H', data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
 class IPv4Header:
     def __init__(self, length: int, ttl: int, protocol: int, checksum: int,
-            src: str, dst: str) -> IPv4Header:
+            src: str, dst: str, options: bytes=b'') -> IPv4Header:
         self.length = length
         self.ttl = ttl
         self.protocol = protocol
         self.checksum = checksum
         self.src = src
         self.dst = dst
+        self.options = options
 
     @classmethod
     def from_bytes(cls, hdr: bytes) -> IPv4Header:
-        return cls(0, 0, 0, 0, '0.0.0.0', '0.0.0.0')
+        return cls.unpack_from(hdr)
+
+    @classmethod
+    def unpack_from(cls, buf: bytes, offset: int=0) -> IPv4Header:
+        version_ihl, _, length, _, _, ttl, protocol, checksum, src, dst = \
+                IPV4_HEADER_STRUCT.unpack_from(buf, offset)
+
+        header_len = (version_ihl & 0x0f) << 2
+        if header_len < IP_HEADER_LEN:
+            raise ValueError(f'Invalid IPv4 header length: {header_len}')
+        if len(buf) < offset + header_len:
+            raise ValueError('IPv4 options truncated')
+        options = bytes(buf[offset + IP_HEADER_LEN:offset + header_len])
+
+        return cls(length, ttl, protocol, checksum,
+                ip_binary_to_str(src), ip_binary_to_str(dst), options)
+
+    @property
+    def header_len(self) -> int:
+        # options are padded to a multiple of 4 bytes
+        return IP_HEADER_LEN + ((len(self.options) + 3) & ~3)
 
     def to_bytes(self) -> bytes:
-        return b''
+        buf = bytearray(self.header_len)
+        self.pack_into(buf)
+        return bytes(buf)
+
+    def pack_into(self, buf: bytearray, offset: int=0) -> None:
+        header_len = self.header_len
+        IPV4_HEADER_STRUCT.pack_into(buf, offset,
+                (4 << 4) | (header_len >> 2), 0,
+                self.length, 0, 0, self.ttl, self.protocol, self.checksum,
+                ip_str_to_binary(self.src), ip_str_to_binary(self.dst))
+        if self.options:
+            start = offset + IP_HEADER_LEN
+            buf[start:offset + header_len] = \
+                    self.options.ljust(header_len - IP_HEADER_LEN, b'\x00')
+
+    def pseudo_header_sum(self, length: int) -> int:
+        '''
+        Return the (unfolded) sum of the pseudo-header for a TCP or UDP
+        checksum, where length is the length of the TCP or UDP segment.
+        '''
+
+        pseudo = IPV4_PSEUDO_HEADER_STRUCT.pack(ip_str_to_binary(self.src),
+                ip_str_to_binary(self.dst), 0, self.protocol, length)
+        return sum(struct.unpack('!6H', pseudo))
+
+
+class IPv6Header:
+    def __init__(self, payload_length: int, hop_limit: int, next_header: int,
+            src: str, dst: str) -> IPv6Header:
+        self.payload_length = payload_length
+        self.hop_limit = hop_limit
+        self.next_header = next_header
+        self.src = src
+        self.dst = dst
+
+    # The following allow the same code to handle either an IPv4Header or an
+    # IPv6Header.  Extension headers are not supported, so the next header is
+    # always the transport protocol.
+    header_len = IPV6_HEADER_LEN
+
+    @property
+    def protocol(self) -> int:
+        return self.next_header
+
+    @property
+    def ttl(self) -> int:
+        return self.hop_limit
+
+    @property
+    def length(self) -> int:
+        return IPV6_HEADER_LEN + self.payload_length
+
+    @classmethod
+    def from_bytes(cls, hdr: bytes) -> IPv6Header:
+        return cls.unpack_from(hdr)
+
+    @classmethod
+    def unpack_from(cls, buf: bytes, offset: int=0) -> IPv6Header:
+        _, payload_length, next_header, hop_limit, src, dst = \
+                IPV6_HEADER_STRUCT.unpack_from(buf, offset)
+        return cls(payload_length, hop_limit, next_header,
+                ip_binary_to_str(src), ip_binary_to_str(dst))
+
+    def to_bytes(self) -> bytes:
+        return IPV6_HEADER_STRUCT.pack(IPV6_VERSION, self.payload_length,
+                self.next_header, self.hop_limit,
+                ip_str_to_binary(self.src), ip_str_to_binary(self.dst))
+
+    def pack_into(self, buf: bytearray, offset: int=0) -> None:
+        IPV6_HEADER_STRUCT.pack_into(buf, offset, IPV6_VERSION,
+                self.payload_length, self.next_header, self.hop_limit,
+                ip_str_to_binary(self.src), ip_str_to_binary(self.dst))
+
+    def pseudo_header_sum(self, length: int) -> int:
+        '''
+        Return the (unfolded) sum of the pseudo-header for a TCP or UDP
+        checksum, where length is the length of the TCP or UDP segment.
+        '''
+
+        pseudo = IPV6_PSEUDO_HEADER_STRUCT.pack(ip_str_to_binary(self.src),
+                ip_str_to_binary(self.dst), length, self.next_header)
+        return sum(struct.unpack('!20H', pseudo))
+
+
+def create_ip_header(src: str, dst: str, protocol: int, payload_length: int,
+        ttl: int) -> IPv4Header | IPv6Header:
+    '''
+    Return an IPv4Header or IPv6Header, depending on the family of the
+    addresses, for a packet carrying payload_length bytes of the specified
+    protocol.
+    '''
+
+    if ':' in src:
+        return IPv6Header(payload_length, ttl, protocol, src, dst)
+    return IPv4Header(IP_HEADER_LEN + payload_length, ttl, protocol, 0,
+            src, dst)
+
+
+def ip_header_len(pkt: bytes) -> int:
+    '''
+    Return the length of the IPv4 or IPv6 header at the start of the packet,
+    i.e., the offset of the transport-layer header.
+    '''
+
+    if pkt[0] >> 4 == 6:
+        return IPV6_HEADER_LEN
+    return (pkt[0] & 0x0f) << 2
+
+
+def fill_transport_checksum(pkt: bytearray, ip_hdr: IPv4Header | IPv6Header,
+        checksum_offset: int) -> None:
+    '''
+    Compute the TCP or UDP checksum over the pseudo-header and the segment
+    following ip_hdr in pkt, and write it at checksum_offset within the
+    segment.  The checksum field must be zero beforehand.
+    '''
+
+    start = ip_hdr.header_len
+    segment = memoryview(pkt)[start:]
+    value = checksum(segment, ip_hdr.pseudo_header_sum(len(segment)))
+    if value == 0 and ip_hdr.protocol == IPPROTO_UDP:
+        # a computed UDP checksum of zero is transmitted as all ones, as zero
+        # means "no checksum" (RFC 768)
+        value = 0xffff
+    CHECKSUM_STRUCT.pack_into(pkt, start + checksum_offset, value)
 
 
 class UDPHeader:
@@ -42,34 +274,355 @@ class UDPHeader:
 
     @classmethod
     def from_bytes(cls, hdr: bytes) -> UDPHeader:
-        sport, = struct.unpack('!H', hdr[:2])
-        dport, = struct.unpack('!H', hdr[2:4])
-        length, = struct.unpack('!H', hdr[4:6])
-        checksum, = struct.unpack('!H', hdr[6:8])
-        return cls(sport, dport, length, checksum)
+        return cls.unpack_from(hdr)
+
+    @classmethod
+    def unpack_from(cls, buf: bytes, offset: int=0) -> UDPHeader:
+        return cls(*UDP_HEADER_STRUCT.unpack_from(buf, offset))
 
     def to_bytes(self) -> bytes:
-        hdr = b''
-        hdr += struct.pack('!H', self.sport)
-        hdr += struct.pack('!H', self.dport)
-        hdr += struct.pack('!H', self.length)
-        hdr += struct.pack('!H', self.checksum)
-        return hdr
+        return UDP_HEADER_STRUCT.pack(self.sport, self.dport,
+                self.length, self.checksum)
+
+    def pack_into(self, buf: bytearray, offset: int=0) -> None:
+        UDP_HEADER_STRUCT.pack_into(buf, offset, self.sport, self.dport,
+                self.length, self.checksum)
 
 
 class TCPHeader:
     def __init__(self, sport: int, dport: int, seq: int, ack: int,
-            flags: int, checksum: int) -> TCPHeader:
+            flags: int, checksum: int, window: int=TCP_RECEIVE_WINDOW,
+            mss: int=None, wscale: int=None, sack_permitted: bool=False,
+            timestamp: tuple[int, int]=None,
+            sack_blocks: list[tuple[int, int]]=None) -> TCPHeader:
         self.sport = sport
         self.dport = dport
         self.seq = seq
         self.ack = ack
         self.flags = flags
         self.checksum = checksum
+        self.window = window
+
+        # Options; None (or False) means that the option is not present.
+        # timestamp is a (TSval, TSecr) tuple, and sack_blocks is a list of
+        # (left edge, right edge) tuples.
+        self.mss = mss
+        self.wscale = wscale
+        self.sack_permitted = sack_permitted
+        self.timestamp = timestamp
+        self.sack_blocks = sack_blocks
 
     @classmethod
     def from_bytes(cls, hdr: bytes) -> TCPHeader:
-        return cls(0, 0, 0, 0, 0, 0)
+        return cls.unpack_from(hdr)
+
+    @classmethod
+    def unpack_from(cls, buf: bytes, offset: int=0) -> TCPHeader:
+        sport, dport, seq, ack, data_offset, flags, window, checksum, _ = \
+                TCP_HEADER_STRUCT.unpack_from(buf, offset)
+        hdr = cls(sport, dport, seq, ack, flags, checksum, window)
+
+        header_len = (data_offset >> 4) << 2
+        if header_len < TCP_HEADER_LEN:
+            raise ValueError(f'Invalid TCP data offset: {header_len}')
+        if len(buf) < offset + header_len:
+            raise ValueError('TCP options truncated')
+        if header_len > TCP_HEADER_LEN:
+            hdr.parse_options(buf, offset + TCP_HEADER_LEN,
+                    offset + header_len)
+        return hdr
+
+    def parse_options(self, buf: bytes, start: int, end: int) -> None:
+        i = start
+        while i < end:
+            kind = buf[i]
+            if kind == TCP_OPT_EOL:
+                break
+            if kind == TCP_OPT_NOP:
+                i += 1
+                continue
+
+            # all other options have a length byte, which includes the kind
+            # and length bytes themselves.  Stop at the first malformed
+            # option, rather than guessing where the next one begins.
+            if i + 1 >= end:
+                break
+            length = buf[i + 1]
+            if length < 2 or i + length > end:
+                break
+
+            if kind == TCP_OPT_MSS and length == 4:
+                _, _, self.mss = TCP_OPT_MSS_STRUCT.unpack_from(buf, i)
+            elif kind == TCP_OPT_WSCALE and length == 3:
+                self.wscale = min(buf[i + 2], TCP_MAX_WINDOW_SCALE)
+            elif kind == TCP_OPT_SACK_PERMITTED and length == 2:
+                self.sack_permitted = True
+            elif kind == TCP_OPT_TIMESTAMP and length == 10:
+                self.timestamp = TCP_TIMESTAMP_STRUCT.unpack_from(buf, i + 2)
+            elif kind == TCP_OPT_SACK and length % 8 == 2:
+                self.sack_blocks = [TCP_SACK_BLOCK_STRUCT.unpack_from(buf, j)
+                        for j in range(i + 2, i + length, 8)]
+            i += length
+
+    def options_to_bytes(self) -> bytes:
+        '''
+        Return the options, serialized.  SACK blocks beyond those that fit in
+        the option space left by the other options are left out.
+        '''
+
+        opts = b''
+        if self.mss is not None:
+            opts += TCP_OPT_MSS_STRUCT.pack(TCP_OPT_MSS, 4, self.mss)
+        if self.wscale is not None:
+            opts += TCP_OPT_WSCALE_STRUCT.pack(TCP_OPT_NOP,
+                    TCP_OPT_WSCALE, 3, self.wscale)
+        if self.sack_permitted:
+            opts += TCP_OPT_SACK_PERMITTED_STRUCT.pack(TCP_OPT_NOP,
+                    TCP_OPT_NOP, TCP_OPT_SACK_PERMITTED, 2)
+        if self.timestamp is not None:
+            opts += TCP_OPT_TIMESTAMP_STRUCT.pack(TCP_OPT_NOP, TCP_OPT_NOP,
+                    TCP_OPT_TIMESTAMP, 10, *self.timestamp)
+        if self.sack_blocks:
+            space = TCP_MAX_OPTIONS_LEN - len(opts) - TCP_OPT_SACK_STRUCT.size
+            blocks = self.sack_blocks[:space // TCP_SACK_BLOCK_STRUCT.size]
+            if blocks:
+                opts += TCP_OPT_SACK_STRUCT.pack(TCP_OPT_NOP, TCP_OPT_NOP,
+                        TCP_OPT_SACK, 2 + 8 * len(blocks))
+                for left, right in blocks:
+                    opts += TCP_SACK_BLOCK_STRUCT.pack(left, right)
+        return opts
+
+    @property
+    def header_len(self) -> int:
+        return TCP_HEADER_LEN + len(self.options_to_bytes())
 
     def to_bytes(self) -> bytes:
-        return b''
+        opts = self.options_to_bytes()
+        data_offset = ((TCP_HEADER_LEN + len(opts)) >> 2) << 4
+        return TCP_HEADER_STRUCT.pack(self.sport, self.dport,
+                self.seq, self.ack, data_offset, self.flags,
+                self.window, self.checksum, 0) + opts
+
+    def pack_into(self, buf: bytearray, offset: int=0,
+            opts: bytes=None) -> None:
+        '''
+        Write the header into buf at offset.  opts is the options, if they
+        have already been serialized with options_to_bytes() (e.g., to size
+        buf), so that they need not be serialized again.
+        '''
+
+        if opts is None:
+            opts = self.options_to_bytes()
+        data_offset = ((TCP_HEADER_LEN + len(opts)) >> 2) << 4
+        TCP_HEADER_STRUCT.pack_into(buf, offset, self.sport, self.dport,
+                self.seq, self.ack, data_offset, self.flags,
+                self.window, self.checksum, 0)
+        start = offset + TCP_HEADER_LEN
+        buf[start:start + len(opts)] = opts
+
+
+class IPv4HeaderView:
+    '''
+    A read-only, lazily-decoded view of an IPv4 header within a larger
+    buffer (e.g., a received packet).  Nothing is copied or decoded when the
+    view is created; the fixed fields are unpacked on first access, and the
+    addresses stay in their packed (binary) form unless requested as
+    strings, via src and dst.
+    '''
+
+    __slots__ = ('_buf', '_offset', '_fields', '_src', '_dst')
+
+    def __init__(self, buf: bytes, offset: int=0) -> IPv4HeaderView:
+        self._buf = memoryview(buf)
+        self._offset = offset
+        self._fields = None
+        self._src = None
+        self._dst = None
+
+    def _decode(self) -> tuple:
+        if self._fields is None:
+            self._fields = IPV4_HEADER_STRUCT.unpack_from(self._buf,
+                    self._offset)
+        return self._fields
+
+    @property
+    def header_len(self) -> int:
+        return (self._decode()[0] & 0x0f) << 2
+
+    @property
+    def length(self) -> int:
+        return self._decode()[2]
+
+    @property
+    def ttl(self) -> int:
+        return self._decode()[5]
+
+    @property
+    def protocol(self) -> int:
+        return self._decode()[6]
+
+    @property
+    def checksum(self) -> int:
+        return self._decode()[7]
+
+    @property
+    def src_bin(self) -> bytes:
+        return self._decode()[8]
+
+    @property
+    def dst_bin(self) -> bytes:
+        return self._decode()[9]
+
+    @property
+    def src(self) -> str:
+        if self._src is None:
+            self._src = ip_binary_to_str(self.src_bin)
+        return self._src
+
+    @property
+    def dst(self) -> str:
+        if self._dst is None:
+            self._dst = ip_binary_to_str(self.dst_bin)
+        return self._dst
+
+    def to_header(self) -> IPv4Header:
+        return IPv4Header.unpack_from(self._buf, self._offset)
+
+
+class IPv6HeaderView:
+    '''
+    A read-only, lazily-decoded view of an IPv6 header within a larger
+    buffer, with the same interface as IPv4HeaderView.
+    '''
+
+    __slots__ = ('_buf', '_offset', '_fields', '_src', '_dst')
+
+    header_len = IPV6_HEADER_LEN
+
+    def __init__(self, buf: bytes, offset: int=0) -> IPv6HeaderView:
+        self._buf = memoryview(buf)
+        self._offset = offset
+        self._fields = None
+        self._src = None
+        self._dst = None
+
+    def _decode(self) -> tuple:
+        if self._fields is None:
+            self._fields = IPV6_HEADER_STRUCT.unpack_from(self._buf,
+                    self._offset)
+        return self._fields
+
+    @property
+    def payload_length(self) -> int:
+        return self._decode()[1]
+
+    @property
+    def length(self) -> int:
+        return IPV6_HEADER_LEN + self._decode()[1]
+
+    @property
+    def protocol(self) -> int:
+        return self._decode()[2]
+
+    next_header = protocol
+
+    @property
+    def ttl(self) -> int:
+        return self._decode()[3]
+
+    hop_limit = ttl
+
+    @property
+    def src_bin(self) -> bytes:
+        return self._decode()[4]
+
+    @property
+    def dst_bin(self) -> bytes:
+        return self._decode()[5]
+
+    @property
+    def src(self) -> str:
+        if self._src is None:
+            self._src = ip_binary_to_str(self.src_bin)
+        return self._src
+
+    @property
+    def dst(self) -> str:
+        if self._dst is None:
+            self._dst = ip_binary_to_str(self.dst_bin)
+        return self._dst
+
+    def to_header(self) -> IPv6Header:
+        return IPv6Header.unpack_from(self._buf, self._offset)
+
+
+def ip_header_view(buf: bytes,
+        offset: int=0) -> IPv4HeaderView | IPv6HeaderView:
+    '''
+    Return a view of the IPv4 or IPv6 header at the specified offset,
+    according to its version field.
+    '''
+
+    if buf[offset] >> 4 == 6:
+        return IPv6HeaderView(buf, offset)
+    return IPv4HeaderView(buf, offset)
+
+
+class TCPHeaderView:
+    '''
+    A read-only, lazily-decoded view of a TCP header within a larger buffer
+    (e.g., a received packet).  Nothing is copied or decoded when the view
+    is created; the fixed fields are unpacked on first access, and options
+    are only parsed by to_header().
+    '''
+
+    __slots__ = ('_buf', '_offset', '_fields')
+
+    def __init__(self, buf: bytes, offset: int=0) -> TCPHeaderView:
+        self._buf = memoryview(buf)
+        self._offset = offset
+        self._fields = None
+
+    def _decode(self) -> tuple:
+        if self._fields is None:
+            self._fields = TCP_HEADER_STRUCT.unpack_from(self._buf,
+                    self._offset)
+        return self._fields
+
+    @property
+    def sport(self) -> int:
+        return self._decode()[0]
+
+    @property
+    def dport(self) -> int:
+        return self._decode()[1]
+
+    @property
+    def seq(self) -> int:
+        return self._decode()[2]
+
+    @property
+    def ack(self) -> int:
+        return self._decode()[3]
+
+    @property
+    def header_len(self) -> int:
+        return (self._decode()[4] >> 4) << 2
+
+    @property
+    def flags(self) -> int:
+        return self._decode()[5]
+
+    @property
+    def window(self) -> int:
+        return self._decode()[6]
+
+    @property
+    def checksum(self) -> int:
+        return self._decode()[7]
+
+    def to_header(self) -> TCPHeader:
+        '''
+        Return a fully-decoded TCPHeader, including options.
+        '''
+        return TCPHeader.unpack_from(self._buf, self._offset)
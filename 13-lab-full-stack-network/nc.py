@@ -1,6 +1,8 @@
+import asyncio
 import sys
 
 from mysocket import TCPSocket
+from tcpstream import open_tcp_stream
 
 class NetcatTCP:
     def __init__(self, local_addr, local_port,
@@ -12,14 +14,19 @@ class NetcatTCP:
         self.output = output
         self.sock = socket_cls.connect(local_addr, local_port,
                 remote_addr, remote_port,
-                send_ip_packet_func, self.handle_data)
+                send_ip_packet_func, None)
+        self.reader, self.writer = open_tcp_stream(self.sock)
+        self.task = asyncio.get_event_loop().create_task(self.handle_data())
 
     def send(self, msg):
         msg = msg.encode('utf-8')
-        self.sock.send(msg)
+        self.writer.write(msg)
 
-    def handle_data(self):
-        msg = self.sock.recv(65536)
-        msg = msg.decode('utf-8')
-        self.output.write(msg)
-        self.output.flush()
+    async def handle_data(self):
+        while True:
+            msg = await self.reader.read(65536)
+            if not msg:
+                break
+            msg = msg.decode('utf-8')
+            self.output.write(msg)
+            self.output.flush()
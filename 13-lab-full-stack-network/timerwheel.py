@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+
+# The granularity of a TimerWheel, in seconds, and its number of slots.  Timers
+# further in the future than TIMER_WHEEL_TICK * TIMER_WHEEL_SLOTS simply wait
+# for the wheel to come around again.
+TIMER_WHEEL_TICK = 0.01
+TIMER_WHEEL_SLOTS = 512
+
+
+class WheelTimer(object):
+    '''
+    A timer scheduled on a TimerWheel.  Like asyncio.TimerHandle, it can be
+    cancelled; unlike it, it can also be re-armed with reset().
+    '''
+
+    __slots__ = ('_wheel', '_callback', '_args', 'deadline', '_tick')
+
+    def __init__(self, wheel: TimerWheel, callback: callable,
+            args: tuple) -> WheelTimer:
+        self._wheel = wheel
+        self._callback = callback
+        self._args = args
+
+        # The time (loop.time()) at which the timer expires, and the tick of
+        # the slot it is in (None if it is not scheduled)
+        self.deadline = None
+        self._tick = None
+
+    def cancel(self) -> None:
+        self._wheel.cancel(self)
+
+    def cancelled(self) -> bool:
+        return self._tick is None
+
+    def reset(self, delay: float) -> None:
+        '''
+        Re-arm the timer to expire delay seconds from now, whether or not it
+        is still scheduled.
+        '''
+
+        self._wheel.reset(self, delay)
+
+
+class TimerWheel(object):
+    '''
+    A hashed timer wheel, shared by all of the sockets on a host, for timers
+    that are frequently re-armed or cancelled (e.g., retransmission timers).
+    Timers are kept in a ring of slots, one per tick, and the wheel advances
+    with a single asyncio callback per tick, only while any timer is
+    scheduled.
+
+    Scheduling and cancelling are O(1).  Re-arming a timer to a later deadline
+    (the common case, e.g., when an ACK arrives) only updates its deadline;
+    when its original slot comes up, it is moved to the slot for the new
+    deadline.
+    '''
+
+    def __init__(self, tick: float=TIMER_WHEEL_TICK,
+            slots: int=TIMER_WHEEL_SLOTS) -> TimerWheel:
+        self.tick = tick
+        self._slots = [set() for i in range(slots)]
+        self._count = 0
+
+        # The next tick to be processed, and the asyncio handle for the
+        # callback that processes it
+        self._next_tick = None
+        self._handle = None
+
+        # Operation counters, for stats()
+        self.scheduled = 0
+        self.resets = 0
+        self.cancels = 0
+        self.expirations = 0
+        self._start_time = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _now(self) -> float:
+        return asyncio.get_event_loop().time()
+
+    def _insert(self, timer: WheelTimer) -> None:
+        if self._next_tick is None:
+            self._next_tick = math.floor(self._now() / self.tick)
+        tick = max(math.ceil(timer.deadline / self.tick), self._next_tick)
+        timer._tick = tick
+        self._slots[tick % len(self._slots)].add(timer)
+        self._count += 1
+        if self._handle is None:
+            self._handle = asyncio.get_event_loop().call_later(self.tick,
+                    self._advance)
+
+    def _remove(self, timer: WheelTimer) -> None:
+        self._slots[timer._tick % len(self._slots)].discard(timer)
+        timer._tick = None
+        self._count -= 1
+
+    def schedule(self, delay: float, callback: callable,
+            *args) -> WheelTimer:
+        '''
+        Call callback(*args) delay seconds from now, rounded up to the next
+        tick, and return the WheelTimer.
+        '''
+
+        timer = WheelTimer(self, callback, args)
+        timer.deadline = self._now() + delay
+        self._insert(timer)
+        self.scheduled += 1
+        return timer
+
+    def reset(self, timer: WheelTimer, delay: float) -> None:
+        timer.deadline = self._now() + delay
+        self.resets += 1
+        if timer._tick is None:
+            self._insert(timer)
+        elif math.ceil(timer.deadline / self.tick) < timer._tick:
+            # earlier than its slot; move it
+            self._remove(timer)
+            self._insert(timer)
+
+    def cancel(self, timer: WheelTimer) -> None:
+        if timer._tick is not None:
+            self._remove(timer)
+            self.cancels += 1
+
+    def _advance(self) -> None:
+        self._handle = None
+        loop = asyncio.get_event_loop()
+        now = self._now()
+        last_tick = math.floor(now / self.tick)
+        num_slots = len(self._slots)
+
+        # visit each slot (at most once) up to the current tick.  Timers
+        # scheduled by the callbacks go in later slots.
+        ticks = range(max(self._next_tick, last_tick - num_slots + 1),
+                last_tick + 1)
+        self._next_tick = last_tick + 1
+        try:
+            for tick in ticks:
+                slot = self._slots[tick % num_slots]
+                for timer in [t for t in slot if t._tick <= tick]:
+                    if timer._tick is None:
+                        # cancelled by an earlier callback
+                        continue
+                    self._remove(timer)
+                    if timer.deadline > now:
+                        # re-armed since it was put in this slot
+                        self._insert(timer)
+                        continue
+                    self.expirations += 1
+                    try:
+                        timer._callback(*timer._args)
+                    except Exception as exc:
+                        # as asyncio does for its own callbacks, report the
+                        # error and carry on with the other timers
+                        loop.call_exception_handler({
+                            'message': 'Exception in timer wheel callback '
+                                    f'{timer._callback!r}',
+                            'exception': exc,
+                            'timer': timer,
+                        })
+                if not slot:
+                    # a set never shrinks, so replace an empty slot (which
+                    # may have been emptied by cancellations) rather than keep
+                    # the space that its busiest tick needed
+                    self._slots[tick % num_slots] = set()
+        finally:
+            if self._count > 0 and self._handle is None:
+                self._handle = loop.call_later(self.tick, self._advance)
+
+    def stats(self) -> dict:
+        '''
+        Return the operation counts since the wheel was created, along with
+        the overall rate of operations per second.
+        '''
+
+        ops = self.scheduled + self.resets + self.cancels + self.expirations
+        elapsed = time.monotonic() - self._start_time
+        return {
+                'scheduled': self.scheduled,
+                'resets': self.resets,
+                'cancels': self.cancels,
+                'expirations': self.expirations,
+                'pending': self._count,
+                'ops': ops,
+                'ops_per_sec': ops / elapsed if elapsed > 0 else 0.0,
+        }